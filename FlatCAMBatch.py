@@ -0,0 +1,364 @@
+############################################################
+# FlatCAM: 2D Post-processing for Manufacturing            #
+# http://flatcam.org                                       #
+# Author: Juan Pablo Caram (c)                             #
+# Date: 2/5/2014                                           #
+# MIT Licence                                              #
+############################################################
+
+"""
+Runs Tcl scripts without the GUI::
+
+    flatcam --headless [--json] [--verbose] [--no-defaults] script.tcl
+
+Only QtCore is used, for signals and the worker threads. No window,
+QApplication or Matplotlib is created, so no display is needed.
+Nothing is plotted.
+
+The exit code is 0 if the script ran, 1 if it failed and 2 for bad
+arguments or a missing script. With --json a single JSON object
+is written to stdout::
+
+    {"status": "ok" | "error",
+     "result": result of the script,
+     "error": error message or null,
+     "output": lines written with puts,
+     "messages": [{"level": ..., "text": ...}, ...],
+     "objects": [{"name": ..., "kind": ...}, ...],
+     "elapsed": seconds}
+"""
+
+import sys
+import re
+import time
+import getopt
+import logging
+import tkinter
+import multiprocessing
+import simplejson as json
+
+from PyQt4 import QtCore
+
+import FlatCAMVersion
+import FlatCAMParallel
+from FlatCAMCore import AppCore
+from FlatCAMProcess import FCProcessContainer
+
+log = logging.getLogger('base')
+
+usage = "flatcam --headless [--json] [--verbose] [--no-defaults] <script.tcl | --shellfile=script.tcl>"
+
+
+class BatchCollection(object):
+    """
+    Objects of a BatchApp. Same interface as ObjectCollection,
+    without the list view. The selection is a list of names.
+    """
+
+    def __init__(self):
+        self.object_list = []
+        self.selected = []
+
+        # See ObjectCollection.promise()
+        self.promises = set()
+
+    def promise(self, obj_name):
+        log.debug("Object %s has been promised." % obj_name)
+        self.promises.add(obj_name)
+
+    def has_promises(self):
+        return len(self.promises) > 0
+
+    def append(self, obj, active=False):
+        name = obj.options["name"]
+
+        # Check promises and clear if exists
+        self.promises.discard(name)
+
+        # Prevent same name. See ObjectCollection.append()
+        while name in self.get_names():
+            match = re.search(r'(.*[^\d])?(\d+)$', name)
+            if match:
+                name = (match.group(1) or '') + str(int(match.group(2)) + 1)
+            else:
+                name += "_1"
+        obj.options["name"] = name
+
+        self.object_list.append(obj)
+
+    def get_names(self):
+        """
+        :return: List of the names of all objects.
+        """
+        return [x.options['name'] for x in self.object_list]
+
+    def get_bounds(self):
+        """
+        :return: [xmin, ymin, xmax, ymax] of all objects.
+        """
+        xmin = ymin = float('inf')
+        xmax = ymax = float('-inf')
+
+        for obj in self.object_list:
+            try:
+                gxmin, gymin, gxmax, gymax = obj.bounds()
+                xmin = min(xmin, gxmin)
+                ymin = min(ymin, gymin)
+                xmax = max(xmax, gxmax)
+                ymax = max(ymax, gymax)
+            except:
+                log.warning("DEV WARNING: Tried to get bounds of empty geometry.")
+
+        return [xmin, ymin, xmax, ymax]
+
+    def get_by_name(self, name):
+        """
+        :param name: The name of the object.
+        :return: The FlatCAMObj or None if no such object.
+        """
+        for obj in self.object_list:
+            if obj.options['name'] == name:
+                return obj
+        return None
+
+    def get_list(self):
+        return self.object_list
+
+    def get_selected(self):
+        """
+        :return: List of selected objects, in order of selection.
+        """
+        return [obj for obj in map(self.get_by_name, self.selected) if obj is not None]
+
+    def get_active(self):
+        """
+        :return: The first selected object or None.
+        """
+        selected = self.get_selected()
+        return selected[0] if selected else None
+
+    def set_active(self, name):
+        if name in self.get_names() and name not in self.selected:
+            self.selected.append(name)
+
+    def set_inactive(self, name):
+        if name in self.selected:
+            self.selected.remove(name)
+
+    def set_all_inactive(self):
+        self.selected = []
+
+    def delete_active(self):
+        obj = self.get_active()
+        if obj is None:
+            return
+
+        self.object_list.remove(obj)
+        self.selected.remove(obj.options['name'])
+
+    def delete_all(self):
+        self.object_list = []
+        self.selected = []
+
+
+class BatchApp(AppCore):
+    """
+    The application without its GUI. See module docstring.
+    """
+
+    def __init__(self, user_defaults=True, verbose=False):
+        """
+        :param user_defaults: Load the user's defaults.json.
+        :param verbose: Log everything to stderr. Otherwise only
+            warnings and errors.
+        """
+        FlatCAMVersion.setup(self)
+
+        level = logging.DEBUG if verbose else logging.WARNING
+        logging.getLogger('base').setLevel(level)
+        logging.getLogger('base2').setLevel(level)
+
+        AppCore.__init__(self)
+
+        self.setup_folders()
+        self.setup_defaults()
+        if user_defaults:
+            self.load_defaults()
+        self.propagate_defaults()
+        self.setup_options()
+
+        self.collection = BatchCollection()
+        self.proc_container = FCProcessContainer()
+
+        self.setup_obj_classes()
+        self.start_worker()
+
+        # Messages to the user, lines written with puts and
+        # exceptions in worker tasks. Appended from any thread.
+        self.messages = []
+        self.output = []
+        self.errors = []
+
+        self.object_created.connect(self.on_object_created)
+        self.inform.connect(self.messages.append, QtCore.Qt.DirectConnection)
+        self.message.connect(lambda title, text, kind: self.messages.append("[%s] %s" % (kind, text)),
+                             QtCore.Qt.DirectConnection)
+        self.thread_exception.connect(lambda e: self.errors.append(str(e)), QtCore.Qt.DirectConnection)
+
+        self.init_tcl()
+
+        # puts with one argument writes to the output instead of
+        # returning its argument. See setup_shell().
+        self.tcl.createcommand("batch_output", self.output.append)
+        self.tcl.eval('''
+            proc puts {args} {
+                if {[llength $args] == 1} {
+                    batch_output [lindex $args 0]
+                } else {
+                    eval original_puts $args
+                }
+            }
+            ''')
+
+    def run_script(self, text):
+        """
+        Runs a Tcl script and waits for the tasks it started.
+
+        :param text: The script.
+        :return: The script's result.
+        :raise: tkinter.TclError if the script or a task failed.
+        """
+        try:
+            result = self.tcl.eval(text)
+        except tkinter.TclError:
+            raise tkinter.TclError(self.tcl.eval('set errorInfo'))
+
+        self.wait_tasks()
+
+        if self.errors:
+            raise tkinter.TclError(self.errors[0])
+
+        # Jobs run with -async and never waited for.
+        for job in self.tcl_jobs.values():
+            if job.error is not None:
+                raise tkinter.TclError("%s failed: %s" % (job.command, str(job.error)))
+
+        return result
+
+    def wait_tasks(self):
+        """
+        Processes events until all worker tasks and promised
+        objects are done, or defaults["background_timeout"].
+
+        :return: None
+        :raise: tkinter.TclError on timeout.
+        """
+        qapp = QtCore.QCoreApplication.instance()
+        deadline = time.time() + self.defaults["background_timeout"] / 1000.0
+
+        while self.worker.pending() > 0 or self.collection.has_promises():
+            if time.time() > deadline:
+                raise tkinter.TclError("Timed out waiting for background tasks. "
+                                       "Consider increasing 'set_sys background_timeout <miliseconds>'.")
+            qapp.processEvents(QtCore.QEventLoop.AllEvents, 50)
+            time.sleep(0.01)
+
+        # Signals from tasks that just finished.
+        qapp.processEvents()
+
+    def shutdown(self):
+        """
+        Stops the worker threads and processes.
+
+        :return: None
+        """
+        self.worker.stop()
+        self.worker.wait(self.defaults["background_timeout"])
+        FlatCAMParallel.shutdown()
+
+    def get_messages(self):
+        """
+        :return: List of {"level": ..., "text": ...}. See App.info().
+        """
+        messages = []
+        for msg in self.messages:
+            match = re.search(r"\[([^\]]+)\](.*)", msg)
+            if match:
+                messages.append({"level": match.group(1), "text": match.group(2).strip()})
+            else:
+                messages.append({"level": "info", "text": msg})
+        return messages
+
+
+def main(argv):
+    """
+    Command line entry point. See module docstring.
+
+    :param argv: Arguments, without the program name.
+    :return: Exit code.
+    """
+    try:
+        opts, args = getopt.getopt(argv, "h", ["headless", "json", "verbose", "no-defaults",
+                                               "shellfile=", "help"])
+    except getopt.GetoptError as e:
+        sys.stderr.write("%s\n%s\n" % (str(e), usage))
+        return 2
+
+    opts = dict(opts)
+    if "-h" in opts or "--help" in opts:
+        print(usage)
+        return 0
+
+    filename = opts.get("--shellfile") or (args[0] if len(args) == 1 else None)
+    if filename is None:
+        sys.stderr.write(usage + "\n")
+        return 2
+
+    try:
+        with open(filename, "r") as f:
+            script = f.read()
+    except (IOError, OSError) as e:
+        sys.stderr.write("Cannot read script: %s\n" % str(e))
+        return 2
+
+    # Needed for signals and threads, kept until the end.
+    _ = QtCore.QCoreApplication([sys.argv[0]])
+
+    t0 = time.time()
+    app = BatchApp(user_defaults="--no-defaults" not in opts, verbose="--verbose" in opts)
+
+    result = None
+    error = None
+    try:
+        result = app.run_script(script)
+    except tkinter.TclError as e:
+        error = str(e)
+    finally:
+        app.shutdown()
+
+    if "--json" in opts:
+        json.dump({"status": "ok" if error is None else "error",
+                   "result": result,
+                   "error": error,
+                   "output": app.output,
+                   "messages": app.get_messages(),
+                   "objects": [{"name": obj.options["name"], "kind": obj.kind}
+                               for obj in app.collection.get_list()],
+                   "elapsed": time.time() - t0},
+                  sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for line in app.output:
+            print(line)
+        if result:
+            print(result)
+        if error is not None:
+            sys.stderr.write(error + "\n")
+
+    return 0 if error is None else 1
+
+
+if __name__ == '__main__':
+    # Worker processes (see FlatCAMParallel) import this module.
+    multiprocessing.freeze_support()
+    sys.exit(main(sys.argv[1:]))
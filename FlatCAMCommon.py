@@ -6,6 +6,11 @@
 # MIT Licence                                              #
 ############################################################
 
+import bisect
+import itertools
+import threading
+
+
 class LoudDict(dict):
     """
     A Dictionary with a callback for
@@ -46,3 +51,188 @@ class LoudDict(dict):
 
         self.callback = callback
 
+
+
+class TaskCancelled(Exception):
+    """
+    Raised in a task that has been cancelled.
+    """
+    pass
+
+
+class CancellationToken(object):
+    """
+    Lets a task know that it should stop. The task must
+    call check() periodically.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        """
+        Requests the task to stop.
+
+        :return: None
+        """
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def check(self):
+        """
+        Raises TaskCancelled if the task has been cancelled.
+
+        :return: None
+        """
+        if self.event.is_set():
+            raise TaskCancelled()
+
+
+# Token of the task running in each thread. See check_cancelled().
+_current = threading.local()
+
+
+def get_current_token():
+    """
+    :return: CancellationToken of the task running in this thread or None.
+    """
+    return getattr(_current, 'token', None)
+
+
+def set_current_token(token):
+    """
+    Sets the CancellationToken of the task running in this thread.
+
+    :param token: CancellationToken or None.
+    :return: The previous token, to restore it when done.
+    """
+    previous = getattr(_current, 'token', None)
+    _current.token = token
+    return previous
+
+
+def check_cancelled():
+    """
+    Raises TaskCancelled if the task running in this thread has
+    been cancelled. Cheap enough to call in every iteration of
+    long loops.
+
+    :return: None
+    """
+    token = getattr(_current, 'token', None)
+    if token is not None and token.event.is_set():
+        raise TaskCancelled()
+
+
+class TaskQueue(object):
+    """
+    Thread safe queue of tasks for a pool of threads. Tasks are
+    dictionaries as emitted on App.worker_task:
+
+    * 'fcn': Function to run.
+    * 'params': List of arguments for fcn.
+    * 'priority': Optional. Tasks with higher priority run first,
+      default 0. Same priority run in the order they were added.
+    * 'lock': Optional. Tasks with the same lock, i.e. the uid of
+      the object they modify, never run at the same time.
+    * 'token': Optional CancellationToken. Set by put() if missing.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+
+        # Sorted list of (-priority, sequence, task)
+        self.tasks = []
+        self.sequence = itertools.count()
+
+        # Locks of running tasks
+        self.locked = set()
+
+        # Tokens of queued and running tasks
+        self.tokens = set()
+
+        self.closed = False
+
+    def __len__(self):
+        with self.condition:
+            return len(self.tasks)
+
+    def pending(self):
+        """
+        :return: Number of queued and running tasks.
+        """
+        with self.condition:
+            return len(self.tokens)
+
+    def put(self, task):
+        """
+        Adds a task to the queue.
+
+        :param task: Task dictionary.
+        :return: The task's CancellationToken.
+        """
+        token = task.setdefault('token', CancellationToken())
+
+        with self.condition:
+            bisect.insort(self.tasks, (-task.get('priority', 0), next(self.sequence), task))
+            self.tokens.add(token)
+            self.condition.notify()
+
+        return token
+
+    def get(self):
+        """
+        Blocks until a task can run and returns it. Must be
+        followed by done(task) when the task finishes.
+
+        :return: The next task or None if the queue was closed.
+        """
+        with self.condition:
+            while not self.closed:
+                for i, (_, _, task) in enumerate(self.tasks):
+                    lock = task.get('lock')
+                    if lock is None or lock not in self.locked:
+                        del self.tasks[i]
+                        if lock is not None:
+                            self.locked.add(lock)
+                        return task
+                self.condition.wait()
+            return None
+
+    def done(self, task):
+        """
+        Marks a task returned by get() as finished.
+
+        :param task: The task.
+        :return: None
+        """
+        with self.condition:
+            self.tokens.discard(task.get('token'))
+            lock = task.get('lock')
+            if lock is not None:
+                self.locked.discard(lock)
+                # Tasks waiting for this lock can run now.
+                self.condition.notify_all()
+
+    def cancel_all(self):
+        """
+        Cancels all queued and running tasks.
+
+        :return: None
+        """
+        with self.condition:
+            for token in self.tokens:
+                token.cancel()
+
+    def close(self):
+        """
+        Wakes up all threads in get() and makes them return None.
+
+        :return: None
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
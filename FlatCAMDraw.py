@@ -10,6 +10,11 @@ from PyQt4 import QtGui, QtCore, Qt
 import FlatCAMApp
 from camlib import *
 from FlatCAMTool import FlatCAMTool
+from FlatCAMPlot import PlotData, set_collection_paths
+from FlatCAMSnap import SnapIndex
+from FlatCAMDrawStorage import DrawStorage
+from FlatCAMCommon import CancellationToken, check_cancelled
+import FlatCAMParallel
 from ObjectUI import LengthEntry, RadioSet
 
 from shapely.geometry import Polygon, LineString, Point, LinearRing
@@ -21,6 +26,7 @@ from shapely.wkt import loads as sloads
 from shapely.wkt import dumps as sdumps
 from shapely.geometry.base import BaseGeometry
 
+import numpy as np
 from numpy import arctan2, Inf, array, sqrt, pi, ceil, sin, cos, sign, dot
 from numpy.linalg import solve
 
@@ -154,7 +160,7 @@ class PaintOptionsTool(FlatCAMTool):
 
         tooldia = self.painttooldia_entry.get_value()
         overlap = self.paintoverlap_entry.get_value()
-        margin = self.paintoverlap_entry.get_value()
+        margin = self.paintmargin_entry.get_value()
         method = self.paintmethod_combo.get_value()
 
         self.fcdraw.paint(tooldia, overlap, margin, method)
@@ -587,16 +593,15 @@ class FCPath(FCPolygon):
 class FCSelect(DrawTool):
     def __init__(self, draw_app):
         DrawTool.__init__(self, draw_app)
-        self.storage = self.draw_app.storage
         #self.shape_buffer = self.draw_app.shape_buffer
         self.selected = self.draw_app.selected
         self.start_msg = "Click on geometry to select"
 
     def click(self, point):
-        try:
-            _, closest_shape = self.storage.nearest(point)
-        except StopIteration:
+        nearest = self.draw_app.snap_index.nearest(point)
+        if len(nearest) == 0:
             return ""
+        _, _, closest_shape = nearest[0]
 
         if self.draw_app.key != 'control':
             self.draw_app.selected = []
@@ -681,6 +686,10 @@ class FCCopy(FCMove):
 ### Main Application ###
 ########################
 class FlatCAMDraw(QtCore.QObject):
+
+    # Emitted from the worker with (token, painted geometry or None)
+    # when paint() is done.
+    paint_done = QtCore.pyqtSignal(object, object)
     def __init__(self, app, disabled=False):
         assert isinstance(app, FlatCAMApp.App), \
             "Expected the app to be a FlatCAMApp.App, got %s" % type(app)
@@ -689,7 +698,13 @@ class FlatCAMDraw(QtCore.QObject):
 
         self.app = app
         self.canvas = app.plotcanvas
-        self.axes = self.canvas.new_axes("draw")
+
+        # Axes and artists, made by setup_axes().
+        self.axes = None
+
+        # CancellationToken of the paint() running, if any.
+        self.paint_token = None
+        self.paint_done.connect(self.on_paint_done)
 
         ### Drawing Toolbar ###
         self.drawing_toolbar = QtGui.QToolBar("Draw Toolbar")
@@ -734,6 +749,10 @@ class FlatCAMDraw(QtCore.QObject):
 
 
         self.corner_snap_btn = self.snap_toolbar.addAction(QtGui.QIcon('share/corner32.png'), 'Snap to corner')
+        self.midpoint_snap_btn = self.snap_toolbar.addAction('Mid')
+        self.midpoint_snap_btn.setToolTip('Snap to midpoint')
+        self.edge_snap_btn = self.snap_toolbar.addAction('Edge')
+        self.edge_snap_btn.setToolTip('Snap to edge')
         self.snap_max_dist_entry = FCEntry()
 
         self.snap_max_dist_entry.setMaximumWidth(70)
@@ -778,6 +797,7 @@ class FlatCAMDraw(QtCore.QObject):
         self.cid_canvas_move = None
         self.cid_canvas_key = None
         self.cid_canvas_key_release = None
+        self.cid_canvas_draw = None
 
         # Connect the canvas
         #self.connect_canvas_event_handlers()
@@ -814,6 +834,16 @@ class FlatCAMDraw(QtCore.QObject):
         self.storage = FlatCAMDraw.make_storage()
         self.utility = []
 
+        # {shape: shape_plot(shape.geo)} for the shapes in storage.
+        self.shape_plots = {}
+
+        # Vertices and segments of the shapes in storage.
+        self.snap_index = SnapIndex()
+
+        # Object being edited and its revision when loaded.
+        self.edited = None
+        self.edited_revision = None
+
         ## List of selected shapes.
         self.selected = []
 
@@ -838,6 +868,10 @@ class FlatCAMDraw(QtCore.QObject):
         self.grid_snap_btn.triggered.connect(lambda: self.toolbar_tool_toggle("grid_snap"))
         self.corner_snap_btn.setCheckable(True)
         self.corner_snap_btn.triggered.connect(lambda: self.toolbar_tool_toggle("corner_snap"))
+        self.midpoint_snap_btn.setCheckable(True)
+        self.midpoint_snap_btn.triggered.connect(lambda: self.toolbar_tool_toggle("midpoint_snap"))
+        self.edge_snap_btn.setCheckable(True)
+        self.edge_snap_btn.triggered.connect(lambda: self.toolbar_tool_toggle("edge_snap"))
 
         self.options = {
             "snap-x": 0.1,
@@ -845,6 +879,8 @@ class FlatCAMDraw(QtCore.QObject):
             "snap_max": 0.05,
             "grid_snap": False,
             "corner_snap": False,
+            "midpoint_snap": False,
+            "edge_snap": False,
         }
 
         self.grid_gap_x_entry.setText(str(self.options["snap-x"]))
@@ -872,12 +908,14 @@ class FlatCAMDraw(QtCore.QObject):
         self.cid_canvas_move = self.canvas.mpl_connect('motion_notify_event', self.on_canvas_move)
         self.cid_canvas_key = self.canvas.mpl_connect('key_press_event', self.on_canvas_key)
         self.cid_canvas_key_release = self.canvas.mpl_connect('key_release_event', self.on_canvas_key_release)
+        self.cid_canvas_draw = self.canvas.mpl_connect('draw_event', self.on_canvas_draw)
 
     def disconnect_canvas_event_handlers(self):
         self.canvas.mpl_disconnect(self.cid_canvas_click)
         self.canvas.mpl_disconnect(self.cid_canvas_move)
         self.canvas.mpl_disconnect(self.cid_canvas_key)
         self.canvas.mpl_disconnect(self.cid_canvas_key_release)
+        self.canvas.mpl_disconnect(self.cid_canvas_draw)
 
     def add_shape(self, shape):
         """
@@ -908,6 +946,20 @@ class FlatCAMDraw(QtCore.QObject):
             self.utility.append(shape)
         else:
             self.storage.insert(shape)
+            self.index_shapes([shape])
+
+    def index_shapes(self, shapes):
+        """
+        Makes what plots shapes just inserted in the storage and
+        adds them to the snap index.
+
+        :param shapes: List of DrawToolShape.
+        :return: None
+        """
+        coords = [shape_coords(shape.geo) for shape in shapes]
+        self.shape_plots.update(zip(shapes, shape_plots(coords)))
+        self.snap_index.add_many(shapes, [rings + [np.array([pt]) for pt in points]
+                                          for rings, points in coords])
 
     def deactivate(self):
         self.disconnect_canvas_event_handlers()
@@ -944,10 +996,15 @@ class FlatCAMDraw(QtCore.QObject):
         self.options[key] = self.sender().isChecked()
 
     def clear(self):
+        self.cancel_paint()
         self.active_tool = None
         #self.shape_buffer = []
         self.selected = []
         self.storage = FlatCAMDraw.make_storage()
+        self.shape_plots = {}
+        self.snap_index.clear()
+        self.edited = None
+        self.edited_revision = None
         self.replot()
 
     def edit_fcgeometry(self, fcgeometry):
@@ -966,10 +1023,14 @@ class FlatCAMDraw(QtCore.QObject):
         self.connect_canvas_event_handlers()
         self.select_tool("select")
 
-        # Link shapes into editor.
-        for shape in fcgeometry.flatten():
-            if shape is not None:  # TODO: Make flatten never create a None
-                self.add_shape(DrawToolShape(shape))
+        # Link shapes into editor. Copies of an instanced object
+        # are edited one by one, see update_fcgeometry().
+        shapes = [DrawToolShape(geo) for geo in fcgeometry.flatten()]
+        self.storage.load(shapes)
+        self.index_shapes(shapes)
+
+        self.edited = fcgeometry
+        self.edited_revision = getattr(fcgeometry, 'revision', None)
 
         self.replot()
         self.drawing_toolbar.setDisabled(False)
@@ -1085,7 +1146,6 @@ class FlatCAMDraw(QtCore.QObject):
         x, y = self.snap(x, y)
 
         ### Utility geometry (animated)
-        self.canvas.canvas.restore_region(self.canvas.background)
         geo = self.active_tool.utility_geometry(data=(x, y))
 
         if isinstance(geo, DrawToolShape) and geo.geo is not None:
@@ -1096,24 +1156,40 @@ class FlatCAMDraw(QtCore.QObject):
             # Add the new utility shape
             self.add_shape(geo)
 
-            # Efficient plotting for fast animation
-
-            #self.canvas.canvas.restore_region(self.canvas.background)
-            elements = self.plot_shape(geometry=geo.geo,
-                                       linespec="b--",
-                                       linewidth=1,
-                                       animated=True)
-            for el in elements:
-                self.axes.draw_artist(el)
-            #self.canvas.canvas.blit(self.axes.bbox)
+            set_collection_paths(self.utility_artist, shape_plot(geo.geo)[0])
+        else:
+            set_collection_paths(self.utility_artist, [])
 
         # Pointer (snapped)
-        elements = self.axes.plot(x, y, 'bo', animated=True)
-        for el in elements:
-                self.axes.draw_artist(el)
+        self.pointer_artist.set_data([x], [y])
 
+        # Over the last full draw of the canvas.
+        self.canvas.canvas.restore_region(self.canvas.background)
+        self.draw_utility()
         self.canvas.canvas.blit(self.axes.bbox)
 
+    def on_canvas_draw(self, event):
+        """
+        The canvas was drawn, without the animated artists.
+
+        :param event: Event object dispatched by Matplotlib
+        :return: None
+        """
+        self.draw_utility()
+
+    def draw_utility(self):
+        """
+        Draws the utility geometry and the pointer, which are
+        animated, i.e. not drawn with the rest of the canvas.
+
+        :return: None
+        """
+        if self.axes is None:
+            return
+
+        self.axes.draw_artist(self.utility_artist)
+        self.axes.draw_artist(self.pointer_artist)
+
     def on_canvas_key(self, event):
         """
         event.key has the key.
@@ -1138,7 +1214,10 @@ class FlatCAMDraw(QtCore.QObject):
         if event.key == 'escape':
             # TODO: ...?
             #self.on_tool_select("select")
-            self.app.inform.emit("Cancelled.")
+            if self.cancel_paint():
+                self.app.inform.emit("Painting cancelled.")
+            else:
+                self.app.inform.emit("Cancelled.")
 
             self.delete_utility_geometry()
 
@@ -1167,6 +1246,14 @@ class FlatCAMDraw(QtCore.QObject):
             self.active_tool.set_origin(self.snap(event.xdata, event.ydata))
             self.app.inform.emit("Click on target point.")
 
+        ### Undo and redo
+        if event.key == 'ctrl+z':
+            self.undo()
+            return
+        if event.key == 'ctrl+y':
+            self.redo()
+            return
+
         ### Snap
         if event.key == 'g':
             self.grid_snap_btn.trigger()
@@ -1207,88 +1294,76 @@ class FlatCAMDraw(QtCore.QObject):
 
         self.selected = []
 
-    def plot_shape(self, geometry=None, linespec='b-', linewidth=1, animated=False):
+    def setup_axes(self):
         """
-        Plots a geometric object or list of objects without rendering. Plotted objects
-        are returned as a list. This allows for efficient/animated rendering.
-
-        :param geometry: Geometry to be plotted (Any Shapely.geom kind or list of such)
-        :param linespec: Matplotlib linespec string.
-        :param linewidth: Width of lines in # of pixels.
-        :param animated: If geometry is to be animated. (See MPL plot())
-        :return: List of plotted elements.
+        Makes the axes of the editor and its artists, unless they
+        are in the canvas already. The axes are gone after
+        PlotCanvas.clear().
+
+        :return: Whether they were made.
+        :rtype: bool
         """
-        plot_elements = []
+        if self.axes is not None and self.axes in self.canvas.figure.axes:
+            return False
 
-        if geometry is None:
-            geometry = self.active_tool.geometry
+        from matplotlib.collections import LineCollection
 
-        try:
-            for geo in geometry:
-                plot_elements += self.plot_shape(geometry=geo,
-                                                 linespec=linespec,
-                                                 linewidth=linewidth,
-                                                 animated=animated)
+        self.axes = self.canvas.new_axes("draw")
 
-        ## Non-iterable
-        except TypeError:
+        # Shapes in storage.
+        self.shapes_artist = LineCollection([], colors='b', linewidths=1)
+        self.axes.add_collection(self.shapes_artist, autolim=False)
+        self.selected_artist = LineCollection([], colors='k', linewidths=2)
+        self.axes.add_collection(self.selected_artist, autolim=False)
+        self.points_artist, = self.axes.plot([], [], 'bo')
 
-            ## DrawToolShape
-            if isinstance(geometry, DrawToolShape):
-                plot_elements += self.plot_shape(geometry=geometry.geo,
-                                                 linespec=linespec,
-                                                 linewidth=linewidth,
-                                                 animated=animated)
-
-            ## Polygon: Dscend into exterior and each interior.
-            if type(geometry) == Polygon:
-                plot_elements += self.plot_shape(geometry=geometry.exterior,
-                                                 linespec=linespec,
-                                                 linewidth=linewidth,
-                                                 animated=animated)
-                plot_elements += self.plot_shape(geometry=geometry.interiors,
-                                                 linespec=linespec,
-                                                 linewidth=linewidth,
-                                                 animated=animated)
-
-            if type(geometry) == LineString or type(geometry) == LinearRing:
-                x, y = geometry.coords.xy
-                element, = self.axes.plot(x, y, linespec, linewidth=linewidth, animated=animated)
-                plot_elements.append(element)
-
-            if type(geometry) == Point:
-                x, y = geometry.coords.xy
-                element, = self.axes.plot(x, y, 'bo', linewidth=linewidth, animated=animated)
-                plot_elements.append(element)
-
-        return plot_elements
+        # Drawn over the canvas by draw_utility().
+        self.utility_artist = LineCollection([], colors='b', linestyles='dashed', linewidths=1,
+                                             animated=True)
+        self.axes.add_collection(self.utility_artist, autolim=False)
+        self.pointer_artist, = self.axes.plot([], [], 'bo', animated=True)
+
+        return True
 
     def plot_all(self):
         """
-        Plots all shapes in the editor.
-        Clears the axes, plots, and call self.canvas.auto_adjust_axes.
+        Plots all shapes in the editor. Shapes are plotted as
+        the paths made when they were added, see shape_plot(),
+        in a collection for all of them and one for the
+        selected ones.
 
         :return: None
         :rtype: None
         """
         self.app.log.debug("plot_all()")
-        self.axes.cla()
+        made = self.setup_axes()
+
+        selected = set(self.selected)
+        paths = []
+        selected_paths = []
+        points = []
 
         for shape in self.storage.get_objects():
             if shape.geo is None:  # TODO: This shouldn't have happened
                 continue
 
-            if shape in self.selected:
-                self.plot_shape(geometry=shape.geo, linespec='k-', linewidth=2)
-                continue
+            shape_paths, shape_points = self.shape_plots[shape]
 
-            self.plot_shape(geometry=shape.geo)
+            if shape in selected:
+                selected_paths += shape_paths
+            else:
+                paths += shape_paths
+            points += shape_points
 
-        for shape in self.utility:
-            self.plot_shape(geometry=shape.geo, linespec='k--', linewidth=1)
-            continue
+        set_collection_paths(self.shapes_artist, paths)
+        set_collection_paths(self.selected_artist, selected_paths)
+        self.points_artist.set_data([pt[0] for pt in points], [pt[1] for pt in points])
 
-        self.canvas.auto_adjust_axes()
+        self.canvas.invalidate(self.axes)
+        if made:
+            self.canvas.auto_adjust_axes()
+        else:
+            self.canvas.update_screen()
 
     def on_shape_complete(self):
         self.app.log.debug("on_shape_complete()")
@@ -1310,22 +1385,61 @@ class FlatCAMDraw(QtCore.QObject):
             return
 
         self.storage.remove(shape)
+        self.shape_plots.pop(shape, None)
+        self.snap_index.remove(shape)
 
         if shape in self.selected:
             self.selected.remove(shape)
 
     def replot(self):
-        self.axes = self.canvas.new_axes("draw")
+        # Edits end with a replot. Those since the last are
+        # undone together.
+        self.storage.end_change()
         self.plot_all()
 
+    def undo(self):
+        """
+        Reverses the last edit.
+
+        :return: None
+        """
+        self.apply_change(self.storage.undo(), "Nothing to undo.")
+
+    def redo(self):
+        """
+        Replays the last edit undone.
+
+        :return: None
+        """
+        self.apply_change(self.storage.redo(), "Nothing to redo.")
+
+    def apply_change(self, change, nothing_msg):
+        """
+        Updates the editor after shapes are removed and inserted
+        in the storage by undo() or redo().
+
+        :param change: (removed, inserted) shapes or None.
+        :param nothing_msg: Message shown if change is None.
+        :return: None
+        """
+        if change is None:
+            self.app.inform.emit(nothing_msg)
+            return
+
+        removed, inserted = change
+        for shape in removed:
+            self.shape_plots.pop(shape, None)
+            self.snap_index.remove(shape)
+            self.set_unselected(shape)
+        self.index_shapes(inserted)
+
+        self.replot()
+
     @staticmethod
     def make_storage():
 
         ## Shape storage.
-        storage = FlatCAMRTreeStorage()
-        storage.get_points = DrawToolShape.get_pts
-
-        return storage
+        return DrawStorage()
 
     def select_tool(self, toolname):
         """
@@ -1361,19 +1475,14 @@ class FlatCAMDraw(QtCore.QObject):
         snap_x, snap_y = (x, y)
         snap_distance = Inf
 
-        ### Object (corner?) snap
-        ### No need for the objects, just the coordinates
-        ### in the index.
-        if self.options["corner_snap"]:
-            try:
-                nearest_pt, shape = self.storage.nearest((x, y))
-
-                nearest_pt_distance = distance((x, y), nearest_pt)
-                if nearest_pt_distance <= self.options["snap_max"]:
-                    snap_distance = nearest_pt_distance
-                    snap_x, snap_y = nearest_pt
-            except (StopIteration, AssertionError):
-                pass
+        ### Object snap: corners, midpoints and edges.
+        if self.options["corner_snap"] or self.options["midpoint_snap"] or self.options["edge_snap"]:
+            nearest = self.snap_index.snap((x, y), self.options["snap_max"],
+                                           vertices=self.options["corner_snap"],
+                                           midpoints=self.options["midpoint_snap"],
+                                           edges=self.options["edge_snap"])
+            if nearest is not None:
+                snap_distance, (snap_x, snap_y), _ = nearest
 
         ### Grid snap
         if self.options["grid_snap"]:
@@ -1397,13 +1506,28 @@ class FlatCAMDraw(QtCore.QObject):
         Transfers the drawing tool shape buffer to the selected geometry
         object. The geometry already in the object are removed.
 
+        Nothing is done if it is the object being edited, it has not
+        changed since and neither have the shapes in the editor.
+        Otherwise the shapes loaded and not removed keep their
+        geometry and order, followed by those added.
+
         :param fcgeometry: FlatCAMGeometry
-        :return: None
+        :return: Whether the object changed.
+        :rtype: bool
         """
-        fcgeometry.solid_geometry = []
-        #for shape in self.shape_buffer:
-        for shape in self.storage.get_objects():
-            fcgeometry.solid_geometry.append(shape.geo)
+        if fcgeometry is self.edited and \
+                getattr(fcgeometry, 'revision', None) == self.edited_revision and \
+                not self.storage.is_modified():
+            return False
+
+        fcgeometry.solid_geometry = [shape.geo for shape in self.storage.get_merged()]
+
+        # The shapes are all the copies. Instances are dropped
+        # only now, so an edit with no changes keeps them.
+        if getattr(fcgeometry, 'instances', None) is not None:
+            fcgeometry.instances = None
+
+        return True
 
     def union(self):
         """
@@ -1482,59 +1606,155 @@ class FlatCAMDraw(QtCore.QObject):
         self.replot()
 
     def paint(self, tooldia, overlap, margin, method):
+        """
+        Paints the selected polygons in the background. Polygons
+        are painted in parallel in the process pool, if enabled.
+        The paths are added as a single shape by on_paint_done().
+
+        :param tooldia: Tool diameter.
+        :param overlap: Overlap between passes, fraction of tooldia.
+        :param margin: Distance from the edges of the polygons.
+        :param method: "standard", "seed" or "lines".
+        :return: None
+        """
         selected = self.get_selected()
 
         if len(selected) == 0:
             self.app.inform.emit("[warning] Nothing selected for painting.")
             return
 
-        for param in [tooldia, overlap, margin]:
+        for param_name, param in [("tool diameter", tooldia), ("overlap", overlap), ("margin", margin)]:
             if not isinstance(param, float):
-                param_name = [k for k, v in list(locals().items()) if v is param][0]
-                self.app.inform.emit("[warning] Invalid value for {}".format())
+                self.app.inform.emit("[warning] Invalid value for {}".format(param_name))
+                return
 
-        # Todo: Check for valid method.
+        if self.paint_token is not None and not self.paint_token.cancelled:
+            self.app.inform.emit("[warning] Painting already in progress.")
+            return
 
-        # Todo: This is the 3rd implementation on painting polys... try to consolidate
+        polygons = [geo for geo in flatten_iter([shape.geo for shape in selected])
+                    if isinstance(geo, Polygon)]
+        if len(polygons) == 0:
+            self.app.inform.emit("[warning] No polygons selected for painting.")
+            return
 
-        results = []
+        token = CancellationToken()
+        self.paint_token = token
 
-        def recurse(geo):
+        def job_thread(app_obj):
+            result = None
             try:
-                for subg in geo:
-                    for subsubg in recurse(subg):
-                        yield subsubg
-            except TypeError:
-                if isinstance(geo, Polygon):
-                    yield geo
+                with app_obj.proc_container.new("Painting in the editor."):
+                    # One job per polygon, so the pool stays busy
+                    # and progress moves.
+                    paths = FlatCAMParallel.paint_geometry(
+                        polygons, tooldia, overlap, method=method, margin=margin,
+                        njobs=len(polygons),
+                        progress=lambda done: app_obj.progress.emit(int(100 * done)))
+                    check_cancelled()
+
+                    # Once, for all the polygons.
+                    result = unary_union(paths)
+            finally:
+                app_obj.progress.emit(0)
+                self.paint_done.emit(token, result)
+
+        self.app.inform.emit("Painting started ...")
+
+        # Background
+        self.app.worker_task.emit({'fcn': job_thread, 'params': [self.app], 'token': token})
+
+    def on_paint_done(self, token, result):
+        """
+        Adds the geometry painted by paint(). Runs in the GUI thread.
 
-            raise StopIteration
+        :param token: CancellationToken of the paint.
+        :param result: Painted geometry, None if it failed or
+            was cancelled.
+        :return: None
+        """
+        # Cancelled or from an edit that is over.
+        if token is not self.paint_token:
+            return
+        self.paint_token = None
 
-        for geo in selected:
+        if result is None:
+            if token.cancelled:
+                self.app.inform.emit("Painting cancelled.")
+            else:
+                self.app.inform.emit("[error] Painting failed.")
+            return
 
-            local_results = []
-            for poly in recurse(geo.geo):
+        if not result.is_empty:
+            self.add_shape(DrawToolShape(result))
+        self.replot()
+        self.app.inform.emit("Done.")
 
-                if method == "seed":
-                    # Type(cp) == FlatCAMRTreeStorage | None
-                    cp = Geometry.clear_polygon2(poly.buffer(-margin),
-                                             tooldia, overlap=overlap)
+    def cancel_paint(self):
+        """
+        Cancels the paint() running, if any. Its result is dropped.
 
-                else:
-                    # Type(cp) == FlatCAMRTreeStorage | None
-                    cp = Geometry.clear_polygon(poly.buffer(-margin),
-                                            tooldia, overlap=overlap)
+        :return: Whether a paint was running.
+        """
+        if self.paint_token is None:
+            return False
 
-                if cp is not None:
-                    local_results += list(cp.get_objects())
+        self.paint_token.cancel()
+        self.paint_token = None
+        return True
 
-                results.append(cascaded_union(local_results))
 
-        # This is a dirty patch:
-        for r in results:
-            self.add_shape(DrawToolShape(r))
+def shape_coords(geo):
+    """
+    Coordinates of a shape.
 
-        self.replot()
+    :param geo: Shapely object or list of them.
+    :return: (list of arrays (n, 2) of the linear parts, polygons
+        as their exterior and interiors, list of (x, y) of the points)
+    """
+    rings = []
+    points = []
+    for part in flatten_iter(geo, pathonly=True):
+        coords = np.asarray(part.coords)
+        if len(coords) == 0:
+            continue
+        if isinstance(part, Point):
+            points.append(tuple(coords[0, :2]))
+        else:
+            rings.append(coords[:, :2])
+    return rings, points
+
+
+def shape_plot(geo):
+    """
+    What plots a shape in the editor.
+
+    :param geo: Shapely object or list of them.
+    :return: (list of Matplotlib Paths of the linear parts, list
+        of (x, y) of the points)
+    """
+    return shape_plots([shape_coords(geo)])[0]
+
+
+def shape_plots(coords):
+    """
+    What plots shapes in the editor, see shape_plot(). The paths
+    of all are made at once, a single one for each shape.
+
+    :param coords: List of shape_coords() of each shape.
+    :return: List of (paths, points) for each.
+    """
+    paths = PlotData([rings for rings, _ in coords if len(rings) > 0]).get_paths()
+
+    plots = []
+    i = 0
+    for rings, points in coords:
+        if len(rings) > 0:
+            plots.append(([paths[i]], points))
+            i += 1
+        else:
+            plots.append(([], points))
+    return plots
 
 
 def distance(pt1, pt2):
@@ -0,0 +1,205 @@
+############################################################
+# FlatCAM: 2D Post-processing for Manufacturing            #
+# http://flatcam.org                                       #
+# Author: Juan Pablo Caram (c)                             #
+# Date: 2/5/2014                                           #
+# MIT Licence                                              #
+############################################################
+
+"""
+Storage of the shapes in the geometry editor.
+
+Shapes are kept in the order they were inserted. Inserting and
+removing many at once costs about the same as one at a time, there
+is no spatial index to update. See FlatCAMSnap for that.
+
+Every insert and remove is logged. Those until end_change() are a
+single change, which undo() and redo() reverse and replay. The log
+also tells whether the shapes differ from those loaded, so the
+edited object is only written back if they do.
+"""
+
+from collections import OrderedDict
+
+
+class DrawStorage(object):
+    """
+    Shapes being edited. Shapes are any hashable objects, compared
+    by identity.
+    """
+
+    # Changes kept for undo().
+    max_changes = 100
+
+    def __init__(self):
+
+        # {shape: None}, an ordered set.
+        self.shapes = OrderedDict()
+
+        # Shapes given to load(), an ordered set too.
+        self.loaded = OrderedDict()
+
+        # How many of self.loaded are in self.shapes.
+        self.loaded_present = 0
+
+        # Changes, oldest first. Each is (added, removed), lists
+        # of shapes.
+        self.changes = []
+
+        # Changes undone, last undone last.
+        self.undone = []
+
+        # Change being recorded.
+        self.added = []
+        self.removed = []
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __contains__(self, shape):
+        return shape in self.shapes
+
+    def get_objects(self):
+        """
+        :return: Iterator over the shapes, in order.
+        """
+        return iter(self.shapes)
+
+    def load(self, shapes):
+        """
+        Replaces all shapes with those of the object being edited.
+        The log is cleared.
+
+        :param shapes: List of shapes.
+        :return: None
+        """
+        self.shapes = OrderedDict.fromkeys(shapes)
+        self.loaded = OrderedDict.fromkeys(self.shapes)
+        self.loaded_present = len(self.loaded)
+
+        self.changes = []
+        self.undone = []
+        self.added = []
+        self.removed = []
+
+    def insert(self, shape):
+        self.insert_many([shape])
+
+    def insert_many(self, shapes):
+        """
+        Inserts shapes not in the storage yet, at the end.
+
+        :param shapes: List of shapes.
+        :return: None
+        """
+        added = self._insert(shapes)
+        self.added.extend(added)
+        if added:
+            self.undone = []
+
+    def remove(self, shape):
+        self.remove_many([shape])
+
+    def remove_many(self, shapes):
+        """
+        Removes shapes. Those not in the storage are ignored.
+
+        :param shapes: List of shapes.
+        :return: None
+        """
+        removed = self._remove(shapes)
+        self.removed.extend(removed)
+        if removed:
+            self.undone = []
+
+    def _insert(self, shapes):
+        added = []
+        for shape in shapes:
+            if shape in self.shapes:
+                continue
+            self.shapes[shape] = None
+            if shape in self.loaded:
+                self.loaded_present += 1
+            added.append(shape)
+        return added
+
+    def _remove(self, shapes):
+        removed = []
+        for shape in shapes:
+            if shape not in self.shapes:
+                continue
+            del self.shapes[shape]
+            if shape in self.loaded:
+                self.loaded_present -= 1
+            removed.append(shape)
+        return removed
+
+    def end_change(self):
+        """
+        Ends the change being recorded. The inserts and removes
+        since the last call are undone together.
+
+        :return: None
+        """
+        if not self.added and not self.removed:
+            return
+
+        self.changes.append((self.added, self.removed))
+        del self.changes[:-self.max_changes]
+        self.added = []
+        self.removed = []
+
+    def undo(self):
+        """
+        Reverses the last change.
+
+        :return: (removed, inserted) shapes, or None if there
+            was nothing to undo.
+        """
+        self.end_change()
+        if not self.changes:
+            return None
+
+        added, removed = self.changes.pop()
+        self.undone.append((added, removed))
+        return self._remove(added), self._insert(removed)
+
+    def redo(self):
+        """
+        Replays the last change undone.
+
+        :return: (removed, inserted) shapes, or None if there
+            was nothing to redo.
+        """
+        self.end_change()
+        if not self.undone:
+            return None
+
+        added, removed = self.undone.pop()
+        self.changes.append((added, removed))
+        return self._remove(removed), self._insert(added)
+
+    def is_modified(self):
+        """
+        :return: Whether the shapes are not those loaded.
+        """
+        return self.loaded_present != len(self.loaded) or len(self.shapes) != len(self.loaded)
+
+    def get_removed(self):
+        """
+        :return: Loaded shapes no longer in the storage, in order.
+        """
+        return [shape for shape in self.loaded if shape not in self.shapes]
+
+    def get_merged(self):
+        """
+        :return: Shapes in the storage, those loaded first and in
+            their original order, then those added.
+        """
+        return [shape for shape in self.loaded if shape in self.shapes] + self.get_added()
+
+    def get_added(self):
+        """
+        :return: Shapes in the storage that were not loaded, in order.
+        """
+        return [shape for shape in self.shapes if shape not in self.loaded]
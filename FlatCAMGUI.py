@@ -300,6 +300,9 @@ class FlatCAMGUI(QtGui.QMainWindow):
 
 class FlatCAMActivityView(QtGui.QWidget):
 
+    # The user wants to stop what is running.
+    cancel_clicked = QtCore.pyqtSignal()
+
     def __init__(self, parent=None):
         super(FlatCAMActivityView, self).__init__(parent=parent)
 
@@ -322,13 +325,23 @@ class FlatCAMActivityView(QtGui.QWidget):
 
         layout.addWidget(self.text)
 
+        self.cancel_button = QtGui.QToolButton(self)
+        self.cancel_button.setIcon(QtGui.QIcon('share/cancel_edit16.png'))
+        self.cancel_button.setToolTip("Cancel running processes.")
+        self.cancel_button.setAutoRaise(True)
+        self.cancel_button.clicked.connect(self.cancel_clicked.emit)
+        self.cancel_button.hide()
+        layout.addWidget(self.cancel_button)
+
     def set_idle(self):
         self.movie.stop()
         self.text.setText("Idle.")
+        self.cancel_button.hide()
 
     def set_busy(self, msg):
         self.movie.start()
         self.text.setText(msg)
+        self.cancel_button.show()
 
 
 class FlatCAMInfoBar(QtGui.QWidget):
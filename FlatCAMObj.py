@@ -10,11 +10,17 @@ from io import StringIO
 from PyQt4 import QtCore
 from copy import copy
 from ObjectUI import *
-import FlatCAMApp
 import inspect  # TODO: For debugging only.
+import threading
+import uuid
 from camlib import *
-from FlatCAMCommon import LoudDict
-from FlatCAMDraw import FlatCAMDraw
+from FlatCAMCommon import LoudDict, check_cancelled
+import FlatCAMParallel
+import FlatCAMProfile
+from FlatCAMPlot import polygon_data, line_data
+
+# Same as App.log, without importing the GUI.
+log = logging.getLogger('base')
 
 
 ########################################
@@ -53,8 +59,24 @@ class FlatCAMObj(QtCore.QObject):
         self.axes = None  # Matplotlib axes
         self.kind = None  # Override with proper name
 
+        # (revision, options, plot_items()) from prepare_plot(),
+        # for the next plot().
+        self.prepared_plot = None
+
         self.muted_ui = False
 
+        # Attributes not loaded yet. See set_lazy().
+        self.lazy_attrs = []
+        self.lazy_loader = None
+        self.lazy_bounds = None
+        self.lazy_lock = threading.RLock()
+
+        # Change tracking for saving projects. The revision
+        # increases when any of self.ser_attrs is set.
+        self.uid = uuid.uuid4().hex
+        self.revision = 0
+        self.saved_as = None
+
         # assert isinstance(self.ui, ObjectUI)
         # self.ui.name_entry.returnPressed.connect(self.on_name_activate)
         # self.ui.offset_button.clicked.connect(self.on_offset_button_click)
@@ -77,8 +99,131 @@ class FlatCAMObj(QtCore.QObject):
 
             if attr == 'options':
                 self.options.update(d[attr])
-            else:
+            elif attr in d:
                 setattr(self, attr, d[attr])
+            # Else saved before the attribute existed.
+            # Keep the value from the constructor.
+
+    def set_lazy(self, d, loader, bounds=None):
+        """
+        Like from_dict(), but only the attributes in ``d`` are set
+        now. The rest of the attributes in ``self.ser_attrs`` are
+        read with ``loader()`` the first time any of them is used.
+
+        :param d: Dictionary with some of the attributes, at least 'options'.
+        :param loader: Function returning the dictionary with all
+            the attributes, as for from_dict().
+        :param bounds: Bounds of the object to report until it
+            is loaded, or None to load it when asked for the bounds.
+        :return: None
+        """
+        with self.lazy_lock:
+            for attr in self.ser_attrs:
+                if attr not in d:
+                    continue
+                if attr == 'options':
+                    self.options.update(d[attr])
+                else:
+                    setattr(self, attr, d[attr])
+
+            self.lazy_loader = loader
+            self.lazy_bounds = bounds
+            self.lazy_attrs = [attr for attr in self.ser_attrs if attr not in d]
+
+            # Remove the values set by the constructor so
+            # that __getattr__() gets called.
+            for attr in self.lazy_attrs:
+                self.__dict__.pop(attr, None)
+
+    def is_loaded(self):
+        """
+        :return: False if some of the attributes have not been loaded yet.
+        :rtype: bool
+        """
+        return len(self.__dict__.get('lazy_attrs', ())) == 0
+
+    def load_lazy(self):
+        """
+        Loads the attributes pending since set_lazy(). Thread safe.
+        Attributes set since set_lazy() are not overwritten.
+
+        :return: None
+        """
+        with self.lazy_lock:
+            if self.is_loaded():
+                return
+
+            log.debug("Loading %s" % self.options["name"])
+            d = self.lazy_loader()
+
+            # Set directly in __dict__ to bypass __setattr__().
+            # Values must be in place before the list is emptied,
+            # other threads only take the lock if it's not empty.
+            # Attributes missing in older projects are None.
+            for attr in self.lazy_attrs:
+                self.__dict__[attr] = d.get(attr)
+            self.lazy_attrs = []
+            self.lazy_loader = None
+            self.lazy_bounds = None
+
+    def __getattr__(self, name):
+        # Only called if the attribute was not found.
+        if name in self.__dict__.get('lazy_attrs', ()):
+            self.load_lazy()
+            return self.__dict__[name]
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+    def __setattr__(self, name, value):
+        # Setting a pending attribute would be overwritten
+        # when loading the rest.
+        if name in self.__dict__.get('lazy_attrs', ()):
+            self.load_lazy()
+        if name in self.__dict__.get('ser_attrs', ()):
+            self.__dict__['revision'] = self.__dict__.get('revision', 0) + 1
+        super(FlatCAMObj, self).__setattr__(name, value)
+
+    def mark_changed(self):
+        """
+        Call after modifying any of ``self.ser_attrs`` in place.
+        Setting them is tracked automatically.
+
+        :return: None
+        """
+        self.revision += 1
+
+    def set_saved(self, filename, entry, revision):
+        """
+        Records that the object was saved to or loaded from a project.
+
+        :param filename: The project file.
+        :param entry: The object's manifest entry in the project.
+        :param revision: self.revision when it was saved or loaded.
+        :return: None
+        """
+        self.saved_as = (filename, entry, revision)
+
+    def get_saved(self):
+        """
+        :return: (filename, manifest entry) of the project the object
+            was last saved to or loaded from, if it has not changed
+            since. None otherwise.
+        :rtype: tuple
+        """
+        saved = self.saved_as
+        if saved is None or saved[2] != self.revision:
+            return None
+        return saved[0], saved[1]
+
+    def bounds(self):
+        """
+        Returns coordinates of rectangular bounds
+        of the object: (xmin, ymin, xmax, ymax). Does not
+        load the object if the bounds are known from set_lazy().
+        """
+        lazy_bounds = self.lazy_bounds
+        if not self.is_loaded() and lazy_bounds is not None:
+            return tuple(lazy_bounds)
+        return super(FlatCAMObj, self).bounds()
 
     def on_options_change(self, key):
         #self.emit(QtCore.SIGNAL("optionChanged()"), key)
@@ -111,7 +256,7 @@ class FlatCAMObj(QtCore.QObject):
         self.read_form()
         vect = self.ui.offsetvector_entry.get_value()
         self.offset(vect)
-        self.plot()
+        self.app.replot([self])
     
     def on_auto_offset_button_click(self):
         self.app.report_usage("obj_on_auto_offset_button")
@@ -120,14 +265,14 @@ class FlatCAMObj(QtCore.QObject):
         vect = (-minx, -miny)
         self.ui.offsetvector_entry.set_value(vect)
         self.offset(vect)
-        self.plot()
+        self.app.replot([self])
 
     def on_scale_button_click(self):
         self.app.report_usage("obj_on_scale_button")
         self.read_form()
         factor = self.ui.scale_entry.get_value()
         self.scale(factor)
-        self.plot()
+        self.app.replot([self])
 
     def on_mirror_button_click(self):
         self.app.report_usage("obj_on_mirror_button")
@@ -144,7 +289,7 @@ class FlatCAMObj(QtCore.QObject):
           vect = ((maxx + minx)/2, 0)
         
         self.mirror(axis, vect)
-        self.plot()
+        self.app.replot([self])
 
     def setup_axes(self, figure):
         """
@@ -159,15 +304,15 @@ class FlatCAMObj(QtCore.QObject):
         """
 
         if self.axes is None:
-            FlatCAMApp.App.log.debug("setup_axes(): New axes")
+            log.debug("setup_axes(): New axes")
             self.axes = figure.add_axes([0.05, 0.05, 0.9, 0.9],
                                         label=self.options["name"])
         elif self.axes not in figure.axes:
-            FlatCAMApp.App.log.debug("setup_axes(): Clearing and attaching axes")
+            log.debug("setup_axes(): Clearing and attaching axes")
             self.axes.cla()
             figure.add_axes(self.axes)
         else:
-            FlatCAMApp.App.log.debug("setup_axes(): Clearing Axes")
+            log.debug("setup_axes(): Clearing Axes")
             self.axes.cla()
 
         # Remove all decoration. The app's axes will have
@@ -184,7 +329,7 @@ class FlatCAMObj(QtCore.QObject):
 
         :return: None
         """
-        FlatCAMApp.App.log.debug(str(inspect.stack()[1][3]) + "--> FlatCAMObj.to_form()")
+        log.debug(str(inspect.stack()[1][3]) + "--> FlatCAMObj.to_form()")
         for option in self.options:
             try:
                 self.set_form_item(option)
@@ -198,7 +343,7 @@ class FlatCAMObj(QtCore.QObject):
         :return: None
         :rtype: None
         """
-        FlatCAMApp.App.log.debug(str(inspect.stack()[1][3]) + "--> FlatCAMObj.read_form()")
+        log.debug(str(inspect.stack()[1][3]) + "--> FlatCAMObj.read_form()")
         for option in self.options:
             try:
                 self.read_form_item(option)
@@ -215,7 +360,7 @@ class FlatCAMObj(QtCore.QObject):
         """
 
         self.muted_ui = True
-        FlatCAMApp.App.log.debug(str(inspect.stack()[1][3]) + "--> FlatCAMObj.build_ui()")
+        log.debug(str(inspect.stack()[1][3]) + "--> FlatCAMObj.build_ui()")
 
         # Remove anything else in the box
         # box_children = self.app.ui.notebook.selected_contents.get_children()
@@ -285,13 +430,21 @@ class FlatCAMObj(QtCore.QObject):
         :return: Whether to continue plotting or not depending on the "plot" option.
         :rtype: bool
         """
-        FlatCAMApp.App.log.debug(str(inspect.stack()[1][3]) + " --> FlatCAMObj.plot()")
+        log.debug(str(inspect.stack()[1][3]) + " --> FlatCAMObj.plot()")
+
+        # No canvas without the GUI, i.e. in batch mode.
+        if self.app.plotcanvas is None:
+            return False
 
         # Axes must exist and be attached to canvas.
         if self.axes is None or self.axes not in self.app.plotcanvas.figure.axes:
             self.axes = self.app.plotcanvas.new_axes(self.options['name'])
 
+        # Cached bitmaps of the old plot are no longer valid.
+        self.app.plotcanvas.invalidate(self.axes)
+
         if not self.options["plot"]:
+            self.prepared_plot = None
             self.axes.cla()
             self.app.plotcanvas.auto_adjust_axes()
             return False
@@ -300,6 +453,50 @@ class FlatCAMObj(QtCore.QObject):
         self.axes.cla()  # TODO: Thread safe?
         return True
 
+    def plot_items(self):
+        """
+        The collections plotted by plot(), as data. Override in
+        descendants plotting with add_plot_items(). Must not use
+        the canvas, it is called outside of the main thread.
+
+        :return: List of (Matplotlib Collection class, properties,
+            PlotData, (dx, dy) offset to translate it by)
+        """
+        return []
+
+    def prepare_plot(self):
+        """
+        Makes the plot_items() the next plot() will add, so that
+        it does not have to. Can be called from any thread. Not
+        used if the object changes in the meantime.
+
+        :return: None
+        """
+        if self.options["plot"]:
+            revision, options = self.revision, dict(self.options)
+            self.prepared_plot = (revision, options, self.plot_items())
+
+    def add_plot_items(self):
+        """
+        Adds the collections of plot_items() to the axes. Uses
+        the ones from prepare_plot() if any.
+
+        :return: None
+        """
+        from matplotlib.transforms import Affine2D
+
+        prepared = self.prepared_plot
+        self.prepared_plot = None
+        if prepared is not None and prepared[0] == self.revision and prepared[1] == dict(self.options):
+            items = prepared[2]
+        else:
+            items = self.plot_items()
+
+        for cls, props, data, (dx, dy) in items:
+            if dx != 0 or dy != 0:
+                props = dict(props, transform=Affine2D().translate(dx, dy) + self.axes.transData)
+            self.app.plotcanvas.add_collection(self.axes, cls([], **props), data, offset=(dx, dy))
+
     def serialize(self):
         """
         Returns a representation of the object as a dictionary so
@@ -379,7 +576,7 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
         """
         FlatCAMObj.set_ui(self, ui)
 
-        FlatCAMApp.App.log.debug("FlatCAMGerber.set_ui()")
+        log.debug("FlatCAMGerber.set_ui()")
 
         self.form_fields.update({
             "plot": self.ui.plot_cb,
@@ -537,6 +734,7 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
             # the first pass is the one cutting all of the features, so it needs to be reversed
             # the other passes overlap preceding ones and cut the left over copper. It is better for them
             # to cut on the right side of the left over copper i.e on the left side of the features. 
+            check_cancelled()
             geom = self.isolation_geometry(offset)
             if invert:
                 if type(geom) is MultiPolygon:
@@ -590,19 +788,19 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
         if self.muted_ui:
             return
         self.read_form_item('plot')
-        self.plot()
+        self.app.replot([self])
 
     def on_solid_cb_click(self, *args):
         if self.muted_ui:
             return
         self.read_form_item('solid')
-        self.plot()
+        self.app.replot([self])
 
     def on_multicolored_cb_click(self, *args):
         if self.muted_ui:
             return
         self.read_form_item('multicolored')
-        self.plot()
+        self.app.replot([self])
 
     def convert_units(self, units):
         """
@@ -625,48 +823,44 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
 
     def plot(self):
 
-        FlatCAMApp.App.log.debug(str(inspect.stack()[1][3]) + " --> FlatCAMGerber.plot()")
+        log.debug(str(inspect.stack()[1][3]) + " --> FlatCAMGerber.plot()")
 
         # Does all the required setup and returns False
         # if the 'ptint' option is set to False.
         if not FlatCAMObj.plot(self):
             return
 
-        geometry = self.solid_geometry
+        self.add_plot_items()
 
-        # Make sure geometry is iterable.
-        try:
-            _ = iter(geometry)
-        except TypeError:
-            geometry = [geometry]
+        self.app.plotcanvas.auto_adjust_axes()
 
-        if self.options["multicolored"]:
-            linespec = '-'
-        else:
-            linespec = 'k-'
+    def plot_items(self):
+        from matplotlib.collections import LineCollection, PathCollection
 
+        # One collection for all the polygons.
         if self.options["solid"]:
-            for poly in geometry:
-                # TODO: Too many things hardcoded.
-                try:
-                    patch = PolygonPatch(poly,
-                                         facecolor="#BBF268",
-                                         edgecolor="#006E20",
-                                         alpha=0.75,
-                                         zorder=2)
-                    self.axes.add_patch(patch)
-                except AssertionError:
-                    FlatCAMApp.App.log.warning("A geometry component was not a polygon:")
-                    FlatCAMApp.App.log.warning(str(poly))
-        else:
-            for poly in geometry:
-                x, y = poly.exterior.xy
-                self.axes.plot(x, y, linespec)
-                for ints in poly.interiors:
-                    x, y = ints.coords.xy
-                    self.axes.plot(x, y, linespec)
+            # TODO: Too many things hardcoded.
+            data, skipped = polygon_data(self.solid_geometry)
+            if skipped > 0:
+                log.warning("%d geometry components were not polygons." % skipped)
 
-        self.app.plotcanvas.auto_adjust_axes()
+            return [(PathCollection, {"facecolor": "#BBF268",
+                                      "edgecolor": "#006E20",
+                                      "alpha": 0.75,
+                                      "zorder": 2}, data, (0, 0))]
+
+        if self.options["multicolored"]:
+            # Each ring in the next color, as with axes.plot().
+            # A collection per color, so that the ones in view
+            # can be picked without their colors.
+            from matplotlib import rcParams
+            cycle = [prop['color'] for prop in rcParams['axes.prop_cycle']]
+            rings = list(flatten_iter(self.solid_geometry, pathonly=True))
+            return [(LineCollection, {"colors": color}, line_data(rings[i::len(cycle)])[0], (0, 0))
+                    for i, color in enumerate(cycle)]
+
+        data, _ = line_data(self.solid_geometry)
+        return [(LineCollection, {"colors": 'k'}, data, (0, 0))]
 
     def serialize(self):
         return {
@@ -835,7 +1029,7 @@ class FlatCAMExcellon(FlatCAMObj, Excellon):
         """
         FlatCAMObj.set_ui(self, ui)
 
-        FlatCAMApp.App.log.debug("FlatCAMExcellon.set_ui()")
+        log.debug("FlatCAMExcellon.set_ui()")
 
         self.form_fields.update({
             "plot": self.ui.plot_cb,
@@ -914,7 +1108,6 @@ class FlatCAMExcellon(FlatCAMObj, Excellon):
         def geo_init(geo_obj, app_obj):
             assert isinstance(geo_obj, FlatCAMGeometry), \
                 "Initializer expected a FlatCAMGeometry, got %s" % type(geo_obj)
-            app_obj.progress.emit(20)
 
             geo_obj.solid_geometry = []
 
@@ -926,14 +1119,15 @@ class FlatCAMExcellon(FlatCAMObj, Excellon):
                     )
 
         def geo_thread(app_obj):
-            app_obj.new_object("geometry", outname, geo_init)
-            app_obj.progress.emit(100)
+            with app_obj.proc_container.new("Generating milling geometry.") as proc:
+                proc.expect("initialize")
+                app_obj.new_object("geometry", outname, geo_init)
 
         # Create a promise with the new name
         self.app.collection.promise(outname)
 
         # Send to worker
-        self.app.worker_task.emit({'fcn': geo_thread, 'params': [self.app]})
+        self.app.worker_task.emit({'fcn': geo_thread, 'params': [self.app], 'lock': self.uid})
 
         return True, ""
 
@@ -961,7 +1155,6 @@ class FlatCAMExcellon(FlatCAMObj, Excellon):
             assert isinstance(job_obj, FlatCAMCNCjob), \
                 "Initializer expected a FlatCAMCNCjob, got %s" % type(job_obj)
 
-            app_obj.progress.emit(20)
             job_obj.z_cut = self.options["drillz"]
             job_obj.z_move = self.options["travelz"]
             job_obj.feedrate = self.options["feedrate"]
@@ -975,37 +1168,34 @@ class FlatCAMExcellon(FlatCAMObj, Excellon):
                                                    toolchange=self.options["toolchange"],
                                                    toolchangez=self.options["toolchangez"])
 
-            app_obj.progress.emit(50)
             job_obj.gcode_parse()
 
-            app_obj.progress.emit(60)
             job_obj.create_geometry()
 
-            app_obj.progress.emit(80)
-
         # To be run in separate thread
         def job_thread(app_obj):
-            app_obj.new_object("cncjob", job_name, job_init)
-            app_obj.progress.emit(100)
+            with app_obj.proc_container.new("Generating CNC Job.") as proc:
+                proc.expect("emit", "parse", "union", "initialize")
+                app_obj.new_object("cncjob", job_name, job_init)
 
         # Create promise for the new name.
         self.app.collection.promise(job_name)
 
         # Send to worker
         # self.app.worker.add_task(job_thread, [self.app])
-        self.app.worker_task.emit({'fcn': job_thread, 'params': [self.app]})
+        self.app.worker_task.emit({'fcn': job_thread, 'params': [self.app], 'lock': self.uid})
 
     def on_plot_cb_click(self, *args):
         if self.muted_ui:
             return
         self.read_form_item('plot')
-        self.plot()
+        self.app.replot([self])
 
     def on_solid_cb_click(self, *args):
         if self.muted_ui:
             return
         self.read_form_item('solid')
-        self.plot()
+        self.app.replot([self])
 
     def convert_units(self, units):
         factor = Excellon.convert_units(self, units)
@@ -1026,24 +1216,25 @@ class FlatCAMExcellon(FlatCAMObj, Excellon):
         except TypeError:
             self.solid_geometry = [self.solid_geometry]
 
+        self.add_plot_items()
+
+        self.app.plotcanvas.auto_adjust_axes()
+
+    def plot_items(self):
+        from matplotlib.collections import LineCollection, PathCollection
+
         # Plot excellon (All polygons?)
         if self.options["solid"]:
-            for geo in self.solid_geometry:
-                patch = PolygonPatch(geo,
-                                     facecolor="#C40000",
-                                     edgecolor="#750000",
-                                     alpha=0.75,
-                                     zorder=3)
-                self.axes.add_patch(patch)
-        else:
-            for geo in self.solid_geometry:
-                x, y = geo.exterior.coords.xy
-                self.axes.plot(x, y, 'r-')
-                for ints in geo.interiors:
-                    x, y = ints.coords.xy
-                    self.axes.plot(x, y, 'g-')
+            data, _ = polygon_data(self.solid_geometry)
+            return [(PathCollection, {"facecolor": "#C40000",
+                                      "edgecolor": "#750000",
+                                      "alpha": 0.75,
+                                      "zorder": 3}, data, (0, 0))]
 
-        self.app.plotcanvas.auto_adjust_axes()
+        exteriors, _ = line_data([geo.exterior for geo in flatten_iter(self.solid_geometry)])
+        interiors, _ = line_data([list(geo.interiors) for geo in flatten_iter(self.solid_geometry)])
+        return [(LineCollection, {"colors": 'r'}, exteriors, (0, 0)),
+                (LineCollection, {"colors": 'g'}, interiors, (0, 0))]
 
 
 class FlatCAMCNCjob(FlatCAMObj, CNCjob):
@@ -1057,7 +1248,7 @@ class FlatCAMCNCjob(FlatCAMObj, CNCjob):
                  feedrate=3.0, z_cut=-0.002, tooldia=0.0,
                  spindlespeed=None):
 
-        FlatCAMApp.App.log.debug("Creating CNCJob object...")
+        log.debug("Creating CNCJob object...")
 
         CNCjob.__init__(self, units=units, kind=kind, z_move=z_move,
                         feedrate=feedrate, z_cut=z_cut, tooldia=tooldia,
@@ -1084,7 +1275,7 @@ class FlatCAMCNCjob(FlatCAMObj, CNCjob):
     def set_ui(self, ui):
         FlatCAMObj.set_ui(self, ui)
 
-        FlatCAMApp.App.log.debug("FlatCAMCNCJob.set_ui()")
+        log.debug("FlatCAMCNCJob.set_ui()")
 
         assert isinstance(self.ui, CNCObjectUI), \
             "Expected a CNCObjectUI, got %s" % type(self.ui)
@@ -1109,7 +1300,7 @@ class FlatCAMCNCjob(FlatCAMObj, CNCjob):
         and plots the object.
         """
         self.read_form()
-        self.plot()
+        self.app.replot([self])
 
     def on_exportgcode_button_click(self, *args):
         self.app.report_usage("cncjob_on_exportgcode_button")
@@ -1195,7 +1386,7 @@ class FlatCAMCNCjob(FlatCAMObj, CNCjob):
         if self.muted_ui:
             return
         self.read_form_item('plot')
-        self.plot()
+        self.app.replot([self])
 
     def plot(self):
 
@@ -1210,7 +1401,7 @@ class FlatCAMCNCjob(FlatCAMObj, CNCjob):
 
     def convert_units(self, units):
         factor = CNCjob.convert_units(self, units)
-        FlatCAMApp.App.log.debug("FlatCAMCNCjob.convert_units()")
+        log.debug("FlatCAMCNCjob.convert_units()")
         self.options["tooldia"] *= factor
 
 
@@ -1244,6 +1435,10 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
             if type(geo) is list:
                 FlatCAMGeometry.merge(geo, geo_final)
 
+            # Instanced, append all the copies.
+            elif isinstance(geo, FlatCAMGeometry):
+                geo_final.solid_geometry.append(geo.expanded_geometry())
+
             # If not list, just append
             else:
                 geo_final.solid_geometry.append(geo.solid_geometry)
@@ -1279,10 +1474,15 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
             "selectmethod": "single"
         })
 
+        # Step and repeat: List of (x, y). If not None, solid_geometry
+        # is one copy (the master) and the object is made of copies
+        # of it at each of these offsets. See expand_instances().
+        self.instances = None
+
         # Attributes to be included in serialization
         # Always append to it because it carries contents
         # from predecessors.
-        self.ser_attrs += ['options', 'kind']
+        self.ser_attrs += ['options', 'kind', 'instances']
 
     def build_ui(self):
         FlatCAMObj.build_ui(self)
@@ -1290,7 +1490,7 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
     def set_ui(self, ui):
         FlatCAMObj.set_ui(self, ui)
 
-        FlatCAMApp.App.log.debug("FlatCAMGeometry.set_ui()")
+        log.debug("FlatCAMGeometry.set_ui()")
 
         assert isinstance(self.ui, GeometryObjectUI), \
             "Expected a GeometryObjectUI, got %s" % type(self.ui)
@@ -1317,6 +1517,72 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
         self.ui.generate_cnc_button.clicked.connect(self.on_generatecnc_button_click)
         self.ui.generate_paint_button.clicked.connect(self.on_paint_button_click)
 
+    def expanded_geometry(self):
+        """
+        The geometry of all the copies if instanced, see
+        self.instances. Otherwise solid_geometry. The object
+        is not modified.
+
+        :return: Shapely object or list of them.
+        """
+        if self.instances is None:
+            return self.solid_geometry
+
+        return FlatCAMParallel.panelize_geometry(self.solid_geometry, self.instances)
+
+    def expand_instances(self):
+        """
+        Replaces the master and its instances with the geometry
+        of all the copies. Needed before changes that must apply
+        to each copy on its own.
+
+        :return: None
+        """
+        if self.instances is None:
+            return
+
+        log.debug("Expanding %d instances of %s" % (len(self.instances), self.options["name"]))
+        self.solid_geometry = self.expanded_geometry()
+        self.instances = None
+
+    def bounds(self):
+        """
+        Bounds of the object. If instanced, the bounds of the
+        master moved by the smallest and largest offsets.
+
+        :return: (xmin, ymin, xmax, ymax)
+        """
+        # Bounds saved in the project include the instances.
+        if not self.is_loaded() and self.lazy_bounds is not None:
+            return FlatCAMObj.bounds(self)
+
+        xmin, ymin, xmax, ymax = FlatCAMObj.bounds(self)
+
+        instances = self.instances
+        if not instances:
+            return xmin, ymin, xmax, ymax
+
+        dx = [offset[0] for offset in instances]
+        dy = [offset[1] for offset in instances]
+        return xmin + min(dx), ymin + min(dy), xmax + max(dx), ymax + max(dy)
+
+    # These see all the copies. See Geometry.
+
+    def flatten(self, geometry=None, reset=True, pathonly=False):
+        if geometry is None and self.instances is not None:
+            geometry = self.expanded_geometry()
+        return Geometry.flatten(self, geometry=geometry, reset=reset, pathonly=pathonly)
+
+    def get_exteriors(self, geometry=None):
+        if geometry is None and self.instances is not None:
+            geometry = self.expanded_geometry()
+        return Geometry.get_exteriors(self, geometry=geometry)
+
+    def get_interiors(self, geometry=None):
+        if geometry is None and self.instances is not None:
+            geometry = self.expanded_geometry()
+        return Geometry.get_interiors(self, geometry=geometry)
+
     def on_paint_button_click(self, *args):
         self.app.report_usage("geometry_on_paint_button")
 
@@ -1361,8 +1627,14 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
         :return: None
         """
 
-        # Which polygon.
-        poly = self.find_polygon(inside_pt)
+        # Which polygon. If instanced, the one in the copy
+        # that was clicked.
+        poly = None
+        for dx, dy in self.instances or [(0, 0)]:
+            poly = self.find_polygon([inside_pt[0] - dx, inside_pt[1] - dy])
+            if poly is not None:
+                poly = affinity.translate(poly, xoff=dx, yoff=dy)
+                break
 
         # No polygon?
         if poly is None:
@@ -1370,8 +1642,6 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
             self.app.inform.emit('[warning] No polygon found.')
             return
 
-        proc = self.app.proc_container.new("Painting polygon.")
-
         name = outname or self.options["name"] + "_paint"
 
         # Initializes the new geometry object
@@ -1410,12 +1680,8 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
             self.app.inform.emit("Done.")
 
         def job_thread(app_obj):
-            try:
+            with self.app.proc_container.new("Painting polygon."):
                 app_obj.new_object("geometry", name, gen_paintarea)
-            except Exception as e:
-                proc.done()
-                raise e
-            proc.done()
 
         self.app.inform.emit("Polygon Paint started ...")
 
@@ -1423,7 +1689,7 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
         self.app.collection.promise(name)
 
         # Background
-        self.app.worker_task.emit({'fcn': job_thread, 'params': [self.app]})
+        self.app.worker_task.emit({'fcn': job_thread, 'params': [self.app], 'lock': self.uid})
 
     def paint_poly_all(self, tooldia, overlap, outname=None,
                        connect=True, contour=True):
@@ -1438,53 +1704,19 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
         :return:
         """
 
-        proc = self.app.proc_container.new("Painting polygon.")
-
         name = outname or self.options["name"] + "_paint"
 
-        # This is a recursive generator of individual Polygons.
-        # Note: Double check correct implementation. Might exit
-        #       early if it finds something that is not a Polygon?
-        def recurse(geo):
-            try:
-                for subg in geo:
-                    for subsubg in recurse(subg):
-                        yield subsubg
-            except TypeError:
-                if isinstance(geo, Polygon):
-                    yield geo
-
-            raise StopIteration
-
         # Initializes the new geometry object
         def gen_paintarea(geo_obj, app_obj):
             assert isinstance(geo_obj, FlatCAMGeometry), \
                 "Initializer expected a FlatCAMGeometry, got %s" % type(geo_obj)
 
-            geo_obj.solid_geometry = []
-
-            for poly in recurse(self.solid_geometry):
-
-                if self.options["paintmethod"] == "seed":
-                    # Type(cp) == FlatCAMRTreeStorage | None
-                    cp = self.clear_polygon2(poly.buffer(-self.options["paintmargin"]),
-                                             tooldia, overlap=overlap, contour=contour,
-                                             connect=connect)
-
-                elif self.options["paintmethod"] == "lines":
-                    # Type(cp) == FlatCAMRTreeStorage | None
-                    cp = self.clear_polygon3(poly.buffer(-self.options["paintmargin"]),
-                                             tooldia, overlap=overlap, contour=contour,
-                                             connect=connect)
-
-                else:
-                    # Type(cp) == FlatCAMRTreeStorage | None
-                    cp = self.clear_polygon(poly.buffer(-self.options["paintmargin"]),
-                                            tooldia, overlap=overlap, contour=contour,
-                                            connect=connect)
-
-                if cp is not None:
-                    geo_obj.solid_geometry += list(cp.get_objects())
+            # Polygons are painted in the process pool if enabled.
+            geo_obj.solid_geometry = FlatCAMParallel.paint_geometry(
+                self.solid_geometry, tooldia, overlap,
+                method=self.options["paintmethod"],
+                margin=self.options["paintmargin"],
+                contour=contour, connect=connect)
 
             geo_obj.options["cnctooldia"] = tooldia
 
@@ -1493,16 +1725,15 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
             geo_obj.make_index()
             print("Done")
 
+            # Painted once, for all the copies. The
+            # index is of the master.
+            geo_obj.instances = copy(self.instances)
+
             self.app.inform.emit("Done.")
 
         def job_thread(app_obj):
-            try:
+            with self.app.proc_container.new("Painting polygon."):
                 app_obj.new_object("geometry", name, gen_paintarea)
-            except Exception as e:
-                proc.done()
-                traceback.print_stack()
-                raise e
-            proc.done()
 
         self.app.inform.emit("Polygon Paint started ...")
 
@@ -1510,7 +1741,7 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
         self.app.collection.promise(name)
 
         # Background
-        self.app.worker_task.emit({'fcn': job_thread, 'params': [self.app]})
+        self.app.worker_task.emit({'fcn': job_thread, 'params': [self.app], 'lock': self.uid})
 
     def on_generatecnc_button_click(self, *args):
         self.app.report_usage("geometry_on_generatecnc_button")
@@ -1530,7 +1761,8 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
         """
         Creates a CNCJob out of this Geometry object. The actual
         work is done by the target FlatCAMCNCjob object's
-        `generate_from_geometry_2()` method.
+        `generate_from_geometry_2()` method, or
+        `generate_from_instances()` if instanced.
 
         :param z_cut: Cut depth (negative)
         :param z_move: Hight of the tool when travelling (not cutting)
@@ -1570,36 +1802,58 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
             # Propagate options
             job_obj.options["tooldia"] = tooldia
 
-            app_obj.progress.emit(20)
             job_obj.z_cut = z_cut
             job_obj.z_move = z_move
             job_obj.feedrate = feedrate
             job_obj.spindlespeed = spindlespeed
-            app_obj.progress.emit(40)
             # TODO: The tolerance should not be hard coded. Just for testing.
-            job_obj.generate_from_geometry_2(self,
-                                             multidepth=multidepth,
-                                             depthpercut=depthperpass,
-                                             tolerance=0.0005)
-
-            app_obj.progress.emit(50)
-            job_obj.gcode_parse()
+            if FlatCAMParallel.enabled():
+                # G-Code is generated and parsed in a worker process,
+                # its stages are not seen here.
+                with FlatCAMProfile.stage("emit"):
+                    result = FlatCAMParallel.run(FlatCAMParallel.generate_cncjob,
+                                                 self.solid_geometry,
+                                                 {"units": job_obj.units,
+                                                  "z_cut": z_cut,
+                                                  "z_move": z_move,
+                                                  "feedrate": feedrate,
+                                                  "spindlespeed": spindlespeed,
+                                                  "tooldia": job_obj.tooldia,
+                                                  "multidepth": multidepth,
+                                                  "depthpercut": depthperpass,
+                                                  "tolerance": 0.0005},
+                                                 self.instances)
+                job_obj.gcode = result["gcode"]
+                job_obj.gcode_parsed = result["gcode_parsed"]
+            elif self.instances is not None:
+                # Paths are ordered once and repeated in each copy.
+                job_obj.generate_from_instances(self, self.instances,
+                                                multidepth=multidepth,
+                                                depthpercut=depthperpass,
+                                                tolerance=0.0005)
+
+                job_obj.gcode_parse()
+            else:
+                job_obj.generate_from_geometry_2(self,
+                                                 multidepth=multidepth,
+                                                 depthpercut=depthperpass,
+                                                 tolerance=0.0005)
 
-            app_obj.progress.emit(80)
+                job_obj.gcode_parse()
 
         if use_thread:
             # To be run in separate thread
             def job_thread(app_obj):
-                with self.app.proc_container.new("Generating CNC Job."):
+                with self.app.proc_container.new("Generating CNC Job.") as proc:
+                    proc.expect("emit", "initialize")
                     app_obj.new_object("cncjob", outname, job_init)
                     app_obj.inform.emit("CNCjob created: %s" % outname)
-                    app_obj.progress.emit(100)
 
             # Create a promise with the name
             self.app.collection.promise(outname)
 
             # Send to worker
-            self.app.worker_task.emit({'fcn': job_thread, 'params': [self.app]})
+            self.app.worker_task.emit({'fcn': job_thread, 'params': [self.app], 'lock': self.uid})
         else:
             self.app.new_object("cncjob", outname, job_init)
 
@@ -1607,7 +1861,7 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
         if self.muted_ui:
             return
         self.read_form_item('plot')
-        self.plot()
+        self.app.replot([self])
 
     def scale(self, factor):
         """
@@ -1626,6 +1880,41 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
             self.solid_geometry = affinity.scale(self.solid_geometry, factor, factor,
                                                  origin=(0, 0))
 
+        self.transform_instances(lambda pt: affinity.scale(pt, factor, factor, origin=(0, 0)))
+
+    def transform_instances(self, fcn):
+        """
+        Applies the linear part of an affine transformation
+        to the offsets of the instances. Transforming the master
+        with the full transformation and the offsets with this
+        transforms all the copies.
+
+        :param fcn: Takes and returns a shapely Point, i.e. an
+            affinity function with origin=(0, 0).
+        :return: None
+        """
+        if self.instances is None:
+            return
+
+        self.instances = [fcn(Point(offset)).coords[0] for offset in self.instances]
+
+    def mirror(self, axis, point):
+        Geometry.mirror(self, axis, point)
+
+        xscale, yscale = {"X": (1.0, -1.0), "Y": (-1.0, 1.0)}[axis]
+        self.transform_instances(lambda pt: affinity.scale(pt, xscale, yscale, origin=(0, 0)))
+
+    def skew(self, angle_x=None, angle_y=None, point=None):
+        Geometry.skew(self, angle_x, angle_y, point)
+
+        self.transform_instances(lambda pt: affinity.skew(pt, angle_x or 0, angle_y or 0,
+                                                          origin=(0, 0)))
+
+    def rotate(self, angle, point=None):
+        Geometry.rotate(self, angle, point)
+
+        self.transform_instances(lambda pt: affinity.rotate(pt, angle, origin=(0, 0)))
+
     def offset(self, vect):
         """
         Offsets all geometry by a given vector/
@@ -1661,27 +1950,25 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
 
         return factor
 
-    def plot_element(self, element):
-        try:
-            for sub_el in element:
-                self.plot_element(sub_el)
+    def plot_items(self):
+        """
+        The linear parts of the geometry, polygons as their
+        exterior and interiors, as a single LineCollection. If
+        instanced, one per instance, all with the paths of the
+        master.
 
-        except TypeError:  # Element is not iterable...
+        :return: See FlatCAMObj.plot_items().
+        """
+        from matplotlib.collections import LineCollection
 
-            if type(element) == Polygon:
-                x, y = element.exterior.coords.xy
-                self.axes.plot(x, y, 'r-')
-                for ints in element.interiors:
-                    x, y = ints.coords.xy
-                    self.axes.plot(x, y, 'r-')
-                return
+        data, skipped = line_data(self.solid_geometry)
+        if skipped > 0:
+            log.warning("Did not plot %d non-linear geometry components." % skipped)
 
-            if type(element) == LineString or type(element) == LinearRing:
-                x, y = element.coords.xy
-                self.axes.plot(x, y, 'r-')
-                return
+        if self.instances is None:
+            return [(LineCollection, {"colors": 'r'}, data, (0, 0))]
 
-            FlatCAMApp.App.log.warning("Did not plot:" + str(type(element)))
+        return [(LineCollection, {"colors": 'r'}, data, (dx, dy)) for dx, dy in self.instances]
 
     def plot(self):
         """
@@ -1730,8 +2017,8 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
         #                 self.axes.plot(x, y, 'r-')
         #         continue
         #
-        #     FlatCAMApp.App.log.warning("Did not plot:", str(type(geo)))
+        #     log.warning("Did not plot:", str(type(geo)))
 
-        self.plot_element(self.solid_geometry)
+        self.add_plot_items()
 
         self.app.plotcanvas.auto_adjust_axes()
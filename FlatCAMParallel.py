@@ -0,0 +1,325 @@
+############################################################
+# FlatCAM: 2D Post-processing for Manufacturing            #
+# http://flatcam.org                                       #
+# Author: Juan Pablo Caram (c)                             #
+# Date: 2/5/2014                                           #
+# MIT Licence                                              #
+############################################################
+
+"""
+Process pool for CPU bound geometry jobs.
+
+Worker tasks share the GIL with the GUI. Jobs run with run() or
+run_many() execute in separate processes instead, so they use other
+cores and don't make the GUI stutter. The task waits for the
+result and goes on as usual, i.e. with new_object().
+
+Arguments and results go through the pool as JSON plus a blob
+with all the Shapely objects as WKB. See FlatCAMProject.
+
+Jobs must be module level functions. Disabled, the default, jobs
+run in the calling thread.
+"""
+
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from shapely.geometry import Polygon
+
+from camlib import Geometry, Gerber, Excellon, CNCjob, flatten_iter, translate_nested
+from FlatCAMCommon import check_cancelled, TaskCancelled
+from FlatCAMProject import GeometryEncoder, decode_object, pack_geometry, unpack_geometry
+
+log = logging.getLogger('base')
+
+defaults = {
+    # Processes in the pool. 0 disables the pool.
+    "worker_processes": 0
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Classes whose defaults jobs see as in this process.
+_default_classes = [Geometry, Gerber, Excellon, CNCjob]
+
+
+def enabled():
+    """
+    :return: Whether jobs run in a process pool.
+    :rtype: bool
+    """
+    return defaults["worker_processes"] > 0
+
+
+def get_pool():
+    """
+    The shared pool. Created on first use.
+
+    :return: ProcessPoolExecutor or None if disabled.
+    """
+    global _pool
+
+    if not enabled():
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            log.debug("Starting %d worker processes." % defaults["worker_processes"])
+            # Not forked: this process has threads and Qt state.
+            _pool = ProcessPoolExecutor(max_workers=defaults["worker_processes"],
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown():
+    """
+    Stops the worker processes. A new pool is started if needed.
+
+    :return: None
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+def encode(value):
+    """
+    :param value: Any JSON serializable value with Shapely objects.
+    :return: (JSON string, geometry blob)
+    """
+    encoder = GeometryEncoder()
+    text = encoder.encode({"value": value})
+    return text, pack_geometry(encoder.geometries)
+
+
+def decode(text, blob):
+    """
+    Inverse of encode().
+
+    :return: The value.
+    """
+    return decode_object(text, unpack_geometry(blob))["value"]
+
+
+def _run_job(fcn, class_defaults, text, blob):
+    """
+    Runs in the worker process.
+
+    :param fcn: Job function.
+    :param class_defaults: {class name: defaults} for camlib classes.
+    :param text: Encoded arguments, see encode().
+    :param blob: Encoded arguments, see encode().
+    :return: Encoded result.
+    """
+    for cls in _default_classes:
+        cls.defaults.update(class_defaults[cls.__name__])
+
+    return encode(fcn(*decode(text, blob)))
+
+
+def _submit(pool, fcn, args):
+    text, blob = encode(list(args))
+    class_defaults = dict((cls.__name__, dict(cls.defaults)) for cls in _default_classes)
+    return pool.submit(_run_job, fcn, class_defaults, text, blob)
+
+
+def wait(futures, progress=None):
+    """
+    Waits for the results of jobs. If the calling task is
+    cancelled, cancels the jobs that have not started yet and
+    raises TaskCancelled. Jobs already running are not stopped.
+
+    :param futures: List of Futures from _submit().
+    :param progress: Called with the fraction of jobs done.
+    :return: List of decoded results.
+    """
+    try:
+        for done, future in enumerate(futures):
+            while True:
+                try:
+                    future.result(timeout=0.1)
+                    break
+                except TimeoutError:
+                    check_cancelled()
+            if progress is not None:
+                progress(float(done + 1) / len(futures))
+    except TaskCancelled:
+        for future in futures:
+            future.cancel()
+        raise
+
+    return [decode(*future.result()) for future in futures]
+
+
+def run(fcn, *args):
+    """
+    Runs fcn(*args) in the process pool and waits for the result.
+
+    :param fcn: Module level function.
+    :param args: Arguments for fcn.
+    :return: fcn's return value.
+    """
+    pool = get_pool()
+    if pool is None:
+        return fcn(*args)
+
+    return wait([_submit(pool, fcn, args)])[0]
+
+
+def run_many(fcn, arglist, progress=None):
+    """
+    Runs fcn(*args) for each args in arglist in the process
+    pool, in parallel.
+
+    :param fcn: Module level function.
+    :param arglist: List of argument lists.
+    :param progress: Called with the fraction of jobs done.
+    :return: List with fcn's return values.
+    """
+    pool = get_pool()
+    if pool is None:
+        results = []
+        for args in arglist:
+            results.append(fcn(*args))
+            if progress is not None:
+                progress(float(len(results)) / len(arglist))
+        return results
+
+    return wait([_submit(pool, fcn, args) for args in arglist], progress=progress)
+
+
+def chunks(items, n):
+    """
+    Splits items into n lists of about the same length. Contiguous
+    items are kept together.
+
+    :param items: List.
+    :param n: Number of lists.
+    :return: List of non-empty lists.
+    """
+    size = max(1, -(-len(items) // max(n, 1)))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+###############################################
+##                   Jobs                    ##
+###############################################
+
+def paint_polygons(polygons, tooldia, overlap, method="standard", margin=0.0,
+                   contour=True, connect=True):
+    """
+    Paint (area clearing) paths for each polygon.
+
+    :param polygons: List of Polygons.
+    :param tooldia: Tool diameter.
+    :param overlap: Overlap between passes, fraction of tooldia.
+    :param method: "standard", "seed" or "lines". See
+        Geometry.clear_polygon(), clear_polygon2() and clear_polygon3().
+    :param margin: Distance from the edges of the polygons.
+    :param contour: Paint around the edges.
+    :param connect: Connect paths to avoid tool lifts.
+    :return: List of paths.
+    """
+    clear = {"seed": Geometry.clear_polygon2,
+             "lines": Geometry.clear_polygon3}.get(method, Geometry.clear_polygon)
+
+    paths = []
+    for poly in polygons:
+        check_cancelled()
+        cp = clear(poly.buffer(-margin), tooldia, overlap=overlap,
+                   contour=contour, connect=connect)
+        if cp is not None:
+            paths += list(cp.get_objects())
+    return paths
+
+
+def paint_geometry(geometry, tooldia, overlap, method="standard", margin=0.0,
+                   contour=True, connect=True, njobs=None, progress=None):
+    """
+    paint_polygons() for all polygons in geometry, split
+    across the process pool.
+
+    :param geometry: Shapely object or list of them.
+    :param njobs: Jobs the polygons are split into. By default
+        two per process, or one if the pool is disabled.
+    :param progress: Called with the fraction of jobs done.
+    :return: List of paths.
+    """
+    polygons = [geo for geo in flatten_iter(geometry) if isinstance(geo, Polygon)]
+    if njobs is None:
+        njobs = 2 * defaults["worker_processes"] if enabled() else 1
+
+    results = run_many(paint_polygons, [[chunk, tooldia, overlap, method, margin, contour, connect]
+                                        for chunk in chunks(polygons, njobs)],
+                       progress=progress)
+    return [path for paths in results for path in paths]
+
+
+def translate_cells(geometry, offsets):
+    """
+    Copies of geometry, one per cell of a panel.
+
+    :param geometry: Shapely object or nested list of them.
+    :param offsets: List of (x, y), one per cell.
+    :return: List with the translated geometry of each cell.
+    """
+    cells = []
+    for dx, dy in offsets:
+        check_cancelled()
+        cells.append(translate_nested(geometry, dx, dy))
+    return cells
+
+
+def panelize_geometry(geometry, offsets):
+    """
+    translate_cells() split across the process pool.
+
+    :param geometry: Shapely object or nested list of them.
+    :param offsets: List of (x, y). See camlib.panel_offsets().
+    :return: List with the translated geometry of each cell,
+        in the order of offsets.
+    """
+    njobs = 2 * defaults["worker_processes"] if enabled() else 1
+
+    results = run_many(translate_cells, [[geometry, chunk] for chunk in chunks(offsets, njobs)])
+    return [cell for cells in results for cell in cells]
+
+
+def generate_cncjob(solid_geometry, params, offsets=None):
+    """
+    G-Code for geometry. See CNCjob.generate_from_geometry_2().
+
+    :param solid_geometry: Geometry to cut.
+    :param params: Dictionary with the CNCjob's "units", "z_cut",
+        "z_move", "feedrate", "spindlespeed" and "tooldia", and
+        generate_from_geometry_2()'s "multidepth", "depthpercut"
+        and "tolerance".
+    :param offsets: List of (x, y) to cut a copy of the geometry at
+        each, or None. See CNCjob.generate_from_instances().
+    :return: {"gcode": G-Code, "gcode_parsed": as in CNCjob.gcode_parse()}
+    """
+    geometry = Geometry()
+    geometry.solid_geometry = solid_geometry
+
+    job = CNCjob(units=params["units"], z_cut=params["z_cut"],
+                 z_move=params["z_move"], feedrate=params["feedrate"],
+                 tooldia=params["tooldia"], spindlespeed=params["spindlespeed"])
+    if offsets is None:
+        job.generate_from_geometry_2(geometry,
+                                     multidepth=params["multidepth"],
+                                     depthpercut=params["depthpercut"],
+                                     tolerance=params["tolerance"])
+    else:
+        job.generate_from_instances(geometry, offsets,
+                                    multidepth=params["multidepth"],
+                                    depthpercut=params["depthpercut"],
+                                    tolerance=params["tolerance"])
+
+    return {"gcode": job.gcode,
+            "gcode_parsed": job.gcode_parse()}
@@ -0,0 +1,343 @@
+############################################################
+# FlatCAM: 2D Post-processing for Manufacturing            #
+# http://flatcam.org                                       #
+# Author: Juan Pablo Caram (c)                             #
+# Date: 2/5/2014                                           #
+# MIT Licence                                              #
+############################################################
+
+"""
+Plot data with levels of detail.
+
+Objects plot their geometry as Matplotlib collections whose paths
+come from a PlotData. It keeps a simplified copy of the geometry
+for each zoom level, so a board seen as a thumbnail is not drawn
+with every vertex of every arc. The geometry of the object is
+never changed, only copied.
+
+Levels are those of the canvas' tiles: level n is used when a pixel
+is 2^n to 2^(n+1) units wide. See PlotCanvas.tile_level().
+Simplification merges consecutive vertices within the same cell
+of a grid of half a pixel at the level, so the result is no more
+than a pixel away from the geometry at any zoom in the level.
+
+A PlotData also has the bounding box of each primitive, so only
+those in view are given to Matplotlib. See get_paths().
+
+Objects make their PlotData in FlatCAMObj.plot_items(), which
+prepare_plots() runs for many objects at once, off the GUI thread.
+"""
+
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from shapely.geometry import Polygon, LineString, LinearRing
+
+from camlib import flatten_iter
+
+log = logging.getLogger('base')
+
+
+def prepare_plots(objects, workers=None, progress=None):
+    """
+    Calls prepare_plot() of each object, in a pool of threads.
+    Most of the work is in numpy and GEOS, which let other
+    threads run.
+
+    :param objects: List of FlatCAMObj.
+    :param workers: Threads, by default one per CPU.
+    :param progress: Called with the fraction of objects done.
+    :return: None
+    """
+    if len(objects) == 0:
+        return
+
+    workers = workers or os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(objects))) as pool:
+        futures = [pool.submit(obj.prepare_plot) for obj in objects]
+        for done, future in enumerate(futures):
+            try:
+                future.result()
+            except Exception:
+                # plot() will try again and report it.
+                log.exception("Could not prepare the plot of %s" % objects[done].options['name'])
+            if progress is not None:
+                progress(float(done + 1) / len(futures))
+
+
+def set_collection_paths(collection, paths):
+    """
+    Replaces the paths of a collection. LineCollection.set_paths()
+    expects arrays and would build new paths from them.
+
+    :param collection: Matplotlib Collection.
+    :param paths: List of Matplotlib Paths.
+    :return: None
+    """
+    from matplotlib.collections import Collection
+    Collection.set_paths(collection, paths)
+
+
+class PlotData(object):
+    """
+    Primitives (polygons or lines) to be plotted, as Matplotlib
+    paths, one per primitive, at any level of detail and only
+    those within some extents.
+
+    Levels are computed on first use and kept. Safe to use from
+    several threads.
+    """
+
+    # Size of the simplification grid, in pixels.
+    cell = 0.5
+
+    # Simplified levels keeping more than this fraction of the
+    # vertices are not kept, the full geometry is used instead.
+    max_ratio = 0.9
+
+    def __init__(self, primitives):
+        """
+        :param primitives: List of primitives, each a list of
+            rings, arrays of shape (n, 2) with n >= 2. The rings of
+            a primitive are a single path, i.e. a polygon's exterior
+            and interiors.
+        """
+
+        rings = [ring for rings in primitives for ring in rings]
+
+        if len(rings) > 0:
+            self.coords = np.concatenate(rings).astype(float)
+        else:
+            self.coords = np.zeros((0, 2))
+
+        # Index in coords where each ring starts, and the end.
+        self.ring_offsets = np.zeros(len(rings) + 1, dtype=int)
+        self.ring_offsets[1:] = np.cumsum([len(ring) for ring in rings])
+
+        # Index of the first ring of each primitive, and the end.
+        self.primitive_offsets = np.zeros(len(primitives) + 1, dtype=int)
+        self.primitive_offsets[1:] = np.cumsum([len(rings) for rings in primitives])
+
+        # Bounding box of each primitive, (n, 4) as in bounds().
+        # Searched as a whole with numpy, see select().
+        starts = self.ring_offsets[self.primitive_offsets[:-1]]
+        if len(starts) > 0:
+            self.primitive_bounds = np.hstack([np.minimum.reduceat(self.coords, starts),
+                                               np.maximum.reduceat(self.coords, starts)])
+        else:
+            self.primitive_bounds = np.zeros((0, 4))
+
+        # Highest level known to need the full geometry. Lower
+        # levels, more detailed, do too.
+        self.full_level = None
+
+        # {level or None for the full geometry: Detail}
+        self.details = {}
+
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.primitive_offsets) - 1
+
+    def bounds(self):
+        """
+        :return: (xmin, ymin, xmax, ymax) or None if empty.
+        """
+        if len(self.coords) == 0:
+            return None
+        xmin, ymin = self.coords.min(axis=0)
+        xmax, ymax = self.coords.max(axis=0)
+        return xmin, ymin, xmax, ymax
+
+    def select(self, extents):
+        """
+        Primitives intersecting an area.
+
+        :param extents: (xmin, ymin, xmax, ymax) of the area.
+        :return: Array with the indexes of the primitives.
+        """
+        xmin, ymin, xmax, ymax = extents
+        bounds = self.primitive_bounds
+        return np.flatnonzero((bounds[:, 0] <= xmax) & (bounds[:, 2] >= xmin) &
+                              (bounds[:, 1] <= ymax) & (bounds[:, 3] >= ymin))
+
+    def simplify(self, level):
+        """
+        Simplified coordinates for a zoom level.
+
+        :param level: Zoom level.
+        :return: (coords, ring_offsets) as self.coords and
+            self.ring_offsets, or None if hardly simpler than
+            the full geometry.
+        """
+        n = len(self.coords)
+        if n == 0:
+            return None
+
+        cells = np.floor(self.coords / (self.cell * 2.0 ** level))
+
+        # First of the vertices in a row within the same cell,
+        # and the ends of every ring.
+        keep = np.ones(n, dtype=bool)
+        keep[1:] = np.any(cells[1:] != cells[:-1], axis=1)
+        keep[self.ring_offsets[:-1]] = True
+        keep[self.ring_offsets[1:] - 1] = True
+
+        kept = np.count_nonzero(keep)
+        if kept > self.max_ratio * n:
+            return None
+
+        ring_offsets = np.zeros_like(self.ring_offsets)
+        ring_offsets[1:] = np.cumsum(np.add.reduceat(keep.astype(int), self.ring_offsets[:-1]))
+
+        return self.coords[keep], ring_offsets
+
+    def get_paths(self, level=None, extents=None):
+        """
+        Paths of the primitives for a zoom level.
+
+        :param level: Zoom level or None for the full geometry.
+        :param extents: (xmin, ymin, xmax, ymax). Only the primitives
+            intersecting it are returned. None for all.
+        :return: List of Matplotlib Paths, one per primitive
+            returned.
+        """
+        detail = self.get_detail(level)
+
+        if extents is None:
+            return detail.get_all()
+
+        indexes = self.select(extents)
+        if len(indexes) == len(self):
+            return detail.get_all()
+        return [detail.get(i) for i in indexes]
+
+    def get_detail(self, level):
+        """
+        The level of detail for a zoom level, made on first use.
+
+        :param level: Zoom level or None for the full geometry.
+        :return: Detail
+        """
+        with self.lock:
+            if level is not None and self.full_level is not None and level <= self.full_level:
+                level = None
+
+            if level in self.details:
+                return self.details[level]
+
+            simplified = None if level is None else self.simplify(level)
+
+            if simplified is None:
+                if level is not None:
+                    self.full_level = level if self.full_level is None else max(self.full_level, level)
+                    level = None
+                if level not in self.details:
+                    self.details[None] = Detail(self.coords, self.ring_offsets, self.primitive_offsets)
+            else:
+                self.details[level] = Detail(simplified[0], simplified[1], self.primitive_offsets)
+
+            return self.details[level]
+
+
+class Detail(object):
+    """
+    The primitives of a PlotData at a level of detail. Paths
+    are made the first time they are asked for, so those never
+    in view are not made.
+    """
+
+    def __init__(self, coords, ring_offsets, primitive_offsets):
+        """
+        :param coords: Coordinates of all the rings, (n, 2).
+        :param ring_offsets: Index in coords where each ring
+            starts, and the end.
+        :param primitive_offsets: Index of the first ring of
+            each primitive, and the end.
+        """
+        from matplotlib.path import Path
+
+        self.coords = coords
+
+        self.codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+        self.codes[ring_offsets[:-1]] = Path.MOVETO
+
+        # Index in coords where each primitive starts, and the end.
+        self.starts = ring_offsets[primitive_offsets]
+
+        # Made so far, None for the others.
+        self.paths = [None] * (len(self.starts) - 1)
+        self.complete = False
+
+    def get(self, i):
+        """
+        :param i: Index of a primitive.
+        :return: Its Matplotlib Path.
+        """
+        path = self.paths[i]
+        if path is None:
+            from matplotlib.path import Path
+
+            a, b = self.starts[i], self.starts[i + 1]
+            path = self.paths[i] = Path(self.coords[a:b], self.codes[a:b])
+        return path
+
+    def get_all(self):
+        """
+        :return: List of the Paths of all the primitives.
+        """
+        if not self.complete:
+            for i in range(len(self.paths)):
+                self.get(i)
+            self.complete = True
+        return self.paths
+
+
+def polygon_data(geometry):
+    """
+    PlotData of the polygons in geometry, one primitive per
+    polygon with its interiors. See camlib.polygon_paths().
+
+    :param geometry: Shapely object or nested list of them.
+    :return: (PlotData, number of non-polygons skipped)
+    """
+    primitives = []
+    skipped = 0
+    for geo in flatten_iter(geometry):
+        if not isinstance(geo, Polygon):
+            skipped += 1
+            continue
+        if geo.is_empty:
+            continue
+
+        primitives.append([np.asarray(geo.exterior.coords)[:, :2]] +
+                          [np.asarray(ring.coords)[:, :2] for ring in geo.interiors])
+
+    return PlotData(primitives), skipped
+
+
+def line_data(geometry):
+    """
+    PlotData of the linear parts of geometry, polygons as their
+    exterior and interiors, one primitive each. See
+    camlib.line_segments().
+
+    :param geometry: Shapely object or nested list of them.
+    :return: (PlotData, number of non-linear parts skipped)
+    """
+    primitives = []
+    skipped = 0
+    for geo in flatten_iter(geometry, pathonly=True):
+        if not isinstance(geo, (LineString, LinearRing)):
+            skipped += 1
+            continue
+        if geo.is_empty:
+            continue
+
+        primitives.append([np.asarray(geo.coords)[:, :2]])
+
+    return PlotData(primitives), skipped
@@ -6,7 +6,8 @@
 # MIT Licence                                              #
 ############################################################
 
-from FlatCAMGUI import FlatCAMActivityView
+from FlatCAMCommon import CancellationToken, TaskCancelled, get_current_token, set_current_token
+import FlatCAMProfile
 from PyQt4 import QtCore
 import weakref
 
@@ -24,6 +25,16 @@ import weakref
 
 
 class FCProcess(object):
+    """
+    A job tracked in the activity view.
+
+    Used as a context manager, the code in the ``with`` block can be
+    cancelled with cancel(): long loops check for it with
+    FlatCAMCommon.check_cancelled() and raise TaskCancelled.
+
+    The ``with`` block is also a job for FlatCAMProfile. Its stages
+    are timed and, if given with expect(), drive the progress bar.
+    """
 
     app = None
 
@@ -34,14 +45,30 @@ class FCProcess(object):
         self.descr = descr
         self.status = "Active"
 
+        # Created in a worker task, cancelling the process
+        # cancels the task.
+        self.token = get_current_token() or CancellationToken()
+        self.previous_token = None
+
+        self.job = FlatCAMProfile.job(descr)
+        self.profile = None
+
     def __del__(self):
         self.done()
 
     def __enter__(self):
-        pass
+        self.previous_token = set_current_token(self.token)
+        self.profile = self.job.__enter__()
+        return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if exc_type is not None:
+        self.job.__exit__(exc_type, exc_val, exc_tb)
+        set_current_token(self.previous_token)
+
+        if exc_type is not None and issubclass(exc_type, TaskCancelled):
+            self.app.log.info("Process cancelled: %s" % self.descr)
+
+        elif exc_type is not None:
             self.app.log.error("Abnormal termination of process!")
             self.app.log.error(exc_type)
             self.app.log.error(exc_val)
@@ -66,7 +93,33 @@ class FCProcess(object):
     def set_status(self, status_string):
         self.status = status_string
 
+    def expect(self, *names):
+        """
+        Sets the stages this process goes through. The progress
+        bar advances as they finish. See FlatCAMProfile.stage.
+
+        :param names: Stage names.
+        :return: None
+        """
+        self.profile.expect(*names)
+        self.profile.connect_progress(self.app.progress.emit)
+
+    def cancel(self):
+        """
+        Requests the process to stop. See FlatCAMCommon.CancellationToken.
+
+        :return: None
+        """
+        self.token.cancel()
+        self.set_status("Cancelling")
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
     def status_msg(self):
+        if self.cancelled:
+            return "%s (cancelling)" % self.descr
         return self.descr
 
 
@@ -107,6 +160,18 @@ class FCProcessContainer(object):
     def on_done(self, proc):
         self.remove(proc)
 
+    def cancel_all(self):
+        """
+        Cancels all the processes.
+
+        :return: None
+        """
+        for pref in list(self.procs):
+            proc = pref()
+            if proc is not None:
+                proc.cancel()
+                self.on_change(proc)
+
     def remove(self, proc):
 
         to_be_removed = []
@@ -123,6 +188,9 @@ class FCVisibleProcessContainer(QtCore.QObject, FCProcessContainer):
     something_changed = QtCore.pyqtSignal()
 
     def __init__(self, view):
+        # Here so the GUI is not imported without one, see FlatCAMBatch.
+        from FlatCAMGUI import FlatCAMActivityView
+
         assert isinstance(view, FlatCAMActivityView), \
             "Expected a FlatCAMActivityView, got %s" % type(view)
 
@@ -130,6 +198,7 @@ class FCVisibleProcessContainer(QtCore.QObject, FCProcessContainer):
         QtCore.QObject.__init__(self)
 
         self.view = view
+        self.view.cancel_clicked.connect(self.cancel_all)
 
         self.something_changed.connect(self.update_view)
 
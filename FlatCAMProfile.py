@@ -0,0 +1,428 @@
+############################################################
+# FlatCAM: 2D Post-processing for Manufacturing            #
+# http://flatcam.org                                       #
+# Author: Juan Pablo Caram (c)                             #
+# Date: 2/5/2014                                           #
+# MIT Licence                                              #
+############################################################
+
+"""
+Timing of the stages of jobs.
+
+A job (see FCProcess) is split into named stages, i.e. "parse",
+"union", "buffer", "index", "order", "emit" and "plot". For each
+stage the wall time, CPU time of the thread, peak memory and the
+number of items processed are recorded::
+
+    with FlatCAMProfile.stage("union", items=len(polygons)):
+        ...
+
+Stages outside of a job are not recorded. Finished jobs are kept
+in history, can be seen with the Tcl command "profile" and are
+written as JSON to defaults["profile_dir"] if set.
+
+Peak memory is traced with tracemalloc if defaults["profile_memory"]
+is set, otherwise it is the peak resident size of the process.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+import functools
+import tracemalloc
+from collections import OrderedDict, deque
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+log = logging.getLogger('base')
+
+defaults = {
+    # Directory for the JSON profile of every job. Empty to disable.
+    "profile_dir": "",
+    # Trace Python memory allocations. Precise but slow.
+    "profile_memory": False
+}
+
+# Finished jobs, latest last.
+history = deque(maxlen=50)
+
+_local = threading.local()
+
+
+def _memory_peak():
+    """
+    :return: Peak memory in bytes. See module docstring.
+    """
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[1]
+
+    if resource is None:
+        return 0
+
+    # Kilobytes in Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def set_tracing(enable):
+    """
+    Starts or stops tracing memory allocations.
+
+    :param enable: True to start.
+    :return: None
+    """
+    if enable and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enable and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+class StageRecord(object):
+    """
+    Totals for all the runs of a stage in a job.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        # Wall time not in nested stages.
+        self.self_wall = 0.0
+        self.cpu = 0.0
+        self.peak_memory = 0
+        self.items = 0
+
+    def to_dict(self):
+        return OrderedDict([("name", self.name),
+                            ("calls", self.calls),
+                            ("wall", self.wall),
+                            ("self_wall", self.self_wall),
+                            ("cpu", self.cpu),
+                            ("peak_memory", self.peak_memory),
+                            ("items", self.items)])
+
+
+class _Run(object):
+    """
+    A stage while it runs.
+    """
+
+    def __init__(self, record):
+        self.record = record
+        self.wall0 = time.perf_counter()
+        self.cpu0 = time.thread_time()
+        self.children_wall = 0.0
+        self.peak_memory = 0
+
+    def add(self, items):
+        """
+        Counts processed items.
+
+        :param items: Number of items.
+        :return: None
+        """
+        self.record.items += items
+
+
+class JobProfile(object):
+    """
+    Stages of a job. Filled in from one thread at a time.
+    """
+
+    def __init__(self, descr):
+        self.descr = descr
+        self.started = time.time()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.finished = False
+        self.stages = OrderedDict()
+
+        # Stages that tell the progress of the job, see expect().
+        self.expected = []
+        self.progress_callbacks = []
+
+        self._runs = []
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.thread_time()
+
+    def expect(self, *names):
+        """
+        Sets the stages the job goes through. Each one done adds
+        to the progress, see connect_progress().
+
+        :param names: Stage names.
+        :return: None
+        """
+        self.expected = list(names)
+
+    def connect_progress(self, callback):
+        """
+        :param callback: Called with the percentage done, 0 to 100,
+            as the expected stages finish.
+        :return: None
+        """
+        self.progress_callbacks.append(callback)
+
+    def begin(self, name):
+        if name not in self.stages:
+            self.stages[name] = StageRecord(name)
+
+        self._update_memory()
+        run = _Run(self.stages[name])
+        self._runs.append(run)
+        return run
+
+    def end(self, run):
+        self._update_memory()
+        self._runs.remove(run)
+
+        wall = time.perf_counter() - run.wall0
+        record = run.record
+        record.calls += 1
+        record.wall += wall
+        record.self_wall += wall - run.children_wall
+        record.cpu += time.thread_time() - run.cpu0
+        record.peak_memory = max(record.peak_memory, run.peak_memory)
+
+        if self._runs:
+            self._runs[-1].children_wall += wall
+
+        if record.name in self.expected:
+            done = set(self.expected).intersection(self.stages)
+            percentage = int(100 * len(done) / len(self.expected))
+            for callback in self.progress_callbacks:
+                callback(percentage)
+
+    def _update_memory(self):
+        """
+        Peak memory of the running stages. When tracing, the peak is
+        reset at every stage boundary so it is for the stage only.
+        """
+        peak = _memory_peak()
+        for run in self._runs:
+            run.peak_memory = max(run.peak_memory, peak)
+
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    def finish(self):
+        if self.finished:
+            return
+
+        self.finished = True
+        self.wall = time.perf_counter() - self._wall0
+        self.cpu = time.thread_time() - self._cpu0
+
+    def to_dict(self):
+        return OrderedDict([("descr", self.descr),
+                            ("started", self.started),
+                            ("wall", self.wall),
+                            ("cpu", self.cpu),
+                            ("stages", [record.to_dict() for record in self.stages.values()])])
+
+    def dump(self, filename):
+        """
+        Writes the profile as JSON.
+
+        :param filename: Path to the file.
+        :return: None
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def report(self):
+        """
+        :return: Table with the stages as text.
+        """
+        lines = ["%s: %.3fs wall, %.3fs CPU" % (self.descr, self.wall, self.cpu)]
+        for record in self.stages.values():
+            lines.append("  %-12s %4d calls %9.3fs wall %9.3fs self %9.3fs CPU %8.1f MB %9d items" %
+                         (record.name, record.calls, record.wall, record.self_wall, record.cpu,
+                          record.peak_memory / 1048576.0, record.items))
+        return "\n".join(lines)
+
+
+def get_current_profile():
+    """
+    :return: The JobProfile of the job running in this thread or None.
+    """
+    return getattr(_local, "profile", None)
+
+
+def set_current_profile(profile):
+    """
+    :param profile: JobProfile or None.
+    :return: The previous one, to restore it later.
+    """
+    previous = get_current_profile()
+    _local.profile = profile
+    return previous
+
+
+class _NoRun(object):
+    """
+    Stage outside of a job.
+    """
+
+    def add(self, items):
+        pass
+
+
+class stage(object):
+    """
+    Context manager recording a stage of the current job. The
+    stage's add(items) counts processed items.
+
+    :param name: Stage name.
+    :param items: Number of items if known beforehand.
+    """
+
+    def __init__(self, name, items=0):
+        self.name = name
+        self.items = items
+        self.profile = None
+        self.run = None
+
+    def __enter__(self):
+        self.profile = get_current_profile()
+        if self.profile is None:
+            return _NoRun()
+
+        self.run = self.profile.begin(self.name)
+        self.run.add(self.items)
+        return self.run
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.run is not None:
+            self.profile.end(self.run)
+
+
+def profiled(name):
+    """
+    Decorator recording every call of the function as a stage.
+
+    :param name: Stage name.
+    """
+
+    def decorator(fcn):
+        @functools.wraps(fcn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fcn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def add_items(items):
+    """
+    Counts processed items in the innermost running stage.
+
+    :param items: Number of items.
+    :return: None
+    """
+    profile = get_current_profile()
+    if profile is not None and profile._runs:
+        profile._runs[-1].add(items)
+
+
+def finish(profile):
+    """
+    Finishes a job: adds it to the history and writes it to
+    defaults["profile_dir"].
+
+    :param profile: JobProfile.
+    :return: None
+    """
+    profile.finish()
+    history.append(profile)
+
+    if not defaults["profile_dir"]:
+        return
+
+    name = "%s-%s.json" % (time.strftime("%Y%m%d-%H%M%S", time.localtime(profile.started)),
+                           re.sub(r'[^\w]+', '_', profile.descr).strip('_').lower())
+    try:
+        profile.dump(os.path.join(defaults["profile_dir"], name))
+    except (IOError, OSError) as e:
+        log.error("Cannot write profile: %s" % str(e))
+
+
+class job(object):
+    """
+    Context manager running a job with its own JobProfile in this
+    thread. Jobs inside another job are stages of the outer one.
+
+    :param descr: Job description.
+    """
+
+    def __init__(self, descr):
+        self.descr = descr
+        self.profile = None
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = get_current_profile()
+        if self.previous is not None:
+            self.profile = self.previous
+            return self.profile
+
+        self.profile = JobProfile(self.descr)
+        set_current_profile(self.profile)
+        return self.profile
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.previous is None:
+            set_current_profile(None)
+            finish(self.profile)
+
+
+class Timeline(object):
+    """
+    Job made of consecutive stages, i.e. the phases of startup::
+
+        startup = Timeline("Startup")
+        startup.phase("gui")
+        ...
+        startup.phase("shell")
+        startup.finish()
+
+    Each phase ends when the next one begins.
+
+    :param descr: Job description.
+    """
+
+    def __init__(self, descr):
+        self.profile = JobProfile(descr)
+        self.run = None
+
+    def phase(self, name):
+        """
+        Ends the current phase and begins the next one.
+
+        :param name: Stage name.
+        :return: None
+        """
+        self.end_phase()
+        self.run = self.profile.begin(name)
+
+    def end_phase(self):
+        if self.run is not None:
+            self.profile.end(self.run)
+            self.run = None
+
+    def finish(self):
+        """
+        Ends the last phase and finishes the job, see finish().
+
+        :return: The JobProfile.
+        """
+        self.end_phase()
+        finish(self.profile)
+        return self.profile
@@ -0,0 +1,489 @@
+############################################################
+# FlatCAM: 2D Post-processing for Manufacturing            #
+# http://flatcam.org                                       #
+# Author: Juan Pablo Caram (c)                             #
+# Date: 2/5/2014                                           #
+# MIT Licence                                              #
+############################################################
+
+"""
+Project files.
+
+Legacy projects are a single JSON document where every Shapely
+object is embedded as WKT (see camlib.to_dict()).
+
+Version 2 projects are zip files containing:
+
+* ``manifest.json``: Format version, FlatCAM version, project
+  options and, for each object, its kind, units, options, bounds
+  and members. This is all that is needed to list the objects,
+  the rest is read on demand (see FlatCAMObj.set_lazy()).
+* ``objects/<name>.json``: The rest of the object's serialized
+  attributes. Geometry is replaced by references into...
+* ``objects/<name>.geo``: ...a geometry blob: all the object's
+  Shapely objects as WKB with an offset table. See
+  pack_geometry().
+
+Objects that did not change since the project was last saved
+can be copied from that file as they are. See write_snapshot().
+"""
+
+import os
+import shutil
+import zipfile
+import struct
+import logging
+
+import numpy as np
+import simplejson as json
+from shapely.geometry import LinearRing
+from shapely.geometry.base import BaseGeometry
+from shapely.wkb import loads as wkb_loads
+
+from camlib import ApertureMacro, dict2obj
+
+log = logging.getLogger('base')
+
+FORMAT_VERSION = 2
+MANIFEST = "manifest.json"
+GEOMETRY_MAGIC = b"FCGB"
+
+# Flags in geometry blobs
+GEO_WKB = 0
+GEO_LINEARRING = 1  # WKB has no LinearRing, it's read as a LineString.
+
+
+def pack_geometry(geometries):
+    """
+    Packs a list of Shapely objects into a binary blob:
+
+    * 4 bytes: GEOMETRY_MAGIC
+    * uint32: Number of geometries n
+    * uint64 x (n + 1): Offsets of each WKB into the data
+    * uint8 x n: Flags, GEO_WKB or GEO_LINEARRING
+    * data: The WKB of each geometry one after the other.
+
+    All numbers are little endian.
+
+    :param geometries: List of Shapely objects.
+    :return: The blob.
+    :rtype: bytes
+    """
+    wkbs = [geo.wkb for geo in geometries]
+
+    offsets = np.zeros(len(wkbs) + 1, dtype='<u8')
+    np.cumsum([len(w) for w in wkbs], out=offsets[1:])
+
+    flags = np.array([GEO_LINEARRING if type(geo) == LinearRing else GEO_WKB
+                      for geo in geometries], dtype=np.uint8)
+
+    return b"".join([GEOMETRY_MAGIC,
+                     struct.pack('<I', len(wkbs)),
+                     offsets.tobytes(),
+                     flags.tobytes()] + wkbs)
+
+
+def unpack_geometry(blob):
+    """
+    Reads a blob created with pack_geometry().
+
+    :param blob: The blob.
+    :type blob: bytes
+    :return: List of Shapely objects.
+    """
+    if blob[:4] != GEOMETRY_MAGIC:
+        raise ValueError("Not a geometry blob.")
+
+    count = struct.unpack_from('<I', blob, 4)[0]
+    pos = 8
+    offsets = np.frombuffer(blob, dtype='<u8', count=count + 1, offset=pos).tolist()
+    pos += 8 * (count + 1)
+    flags = np.frombuffer(blob, dtype=np.uint8, count=count, offset=pos).tolist()
+    pos += count
+
+    data = memoryview(blob)[pos:]
+    geometries = []
+    for i in range(count):
+        geo = wkb_loads(bytes(data[offsets[i]:offsets[i + 1]]))
+        if flags[i] == GEO_LINEARRING:
+            geo = LinearRing(geo.coords)
+        geometries.append(geo)
+
+    return geometries
+
+
+class GeometryEncoder(object):
+    """
+    Replaces Shapely objects in data to be serialized with
+    references to a list of geometries that are stored
+    separately, see pack_geometry().
+    """
+
+    def __init__(self):
+        self.geometries = []
+
+    def shrink(self, value):
+        """
+        Lists made only of Shapely objects, like solid_geometry
+        usually is, are replaced by a single reference to a
+        range of geometries.
+
+        :param value: Any value to be serialized.
+        :return: value or the reference that replaces it.
+        """
+        if type(value) is list and len(value) > 0 and \
+                all(isinstance(geo, BaseGeometry) for geo in value):
+            start = len(self.geometries)
+            self.geometries.extend(value)
+            return {"__class__": "ShplyList",
+                    "__range__": [start, len(self.geometries)]}
+        return value
+
+    def default(self, obj):
+        """
+        For json.dump(..., default=...)
+
+        :param obj: An object json does not know how to serialize.
+        :return: A serializable representation.
+        """
+        if isinstance(obj, BaseGeometry):
+            self.geometries.append(obj)
+            return {"__class__": "Shply",
+                    "__ref__": len(self.geometries) - 1}
+        if isinstance(obj, ApertureMacro):
+            return {"__class__": "ApertureMacro",
+                    "__inst__": obj.to_dict()}
+        raise TypeError("%s is not serializable" % type(obj))
+
+    def encode(self, d):
+        """
+        Serializes the dictionary d.
+
+        :param d: Dictionary to serialize.
+        :return: JSON string
+        """
+        d = dict((key, self.shrink(value)) for key, value in d.items())
+        return json.dumps(d, default=self.default, sort_keys=True)
+
+
+def decode_object(text, geometries):
+    """
+    Inverse of GeometryEncoder.encode()
+
+    :param text: JSON string.
+    :param geometries: List of Shapely objects the references in
+        text point to.
+    :return: Dictionary.
+    """
+
+    def object_hook(d):
+        if d.get("__class__") == "Shply" and "__ref__" in d:
+            return geometries[d["__ref__"]]
+        if d.get("__class__") == "ShplyList" and "__range__" in d:
+            start, stop = d["__range__"]
+            return geometries[start:stop]
+        return dict2obj(d)
+
+    return json.loads(text, object_hook=object_hook)
+
+
+def is_legacy(filename):
+    """
+    :param filename: Project file.
+    :return: True if the file is not a version 2 (zip) project.
+    """
+    return not zipfile.is_zipfile(filename)
+
+
+class ProjectWriter(object):
+    """
+    Writes a version 2 project. Use as::
+
+        with ProjectWriter(filename) as writer:
+            writer.add_object(obj.to_dict())
+            writer.set_options(options, version)
+
+    The project is written to a temporary file that replaces
+    filename on close(), so an existing project is never left
+    half written.
+    """
+
+    def __init__(self, filename, compression=True, compresslevel=1):
+        """
+        :param filename: File to write to.
+        :param compression: Deflate the members.
+        :param compresslevel: 0 to 9, see zlib. Higher levels are
+            much slower and barely reduce the size of geometry.
+        """
+        self.filename = filename
+        self.tmp_filename = filename + ".tmp"
+
+        method = zipfile.ZIP_DEFLATED if compression else zipfile.ZIP_STORED
+        self.zip = zipfile.ZipFile(self.tmp_filename, 'w', compression=method,
+                                   compresslevel=compresslevel if compression else None)
+        self.manifest = {"format": FORMAT_VERSION,
+                         "version": None,
+                         "options": {},
+                         "objs": []}
+
+        # Projects that objects are being copied from. See copy_object().
+        self.sources = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def set_options(self, options, version):
+        """
+        :param options: Project options.
+        :param version: FlatCAM version that saved the project.
+        """
+        self.manifest["options"] = dict(options)
+        self.manifest["version"] = version
+
+    def add_object(self, d, bounds=None, name=None):
+        """
+        Adds an object to the project.
+
+        :param d: The object as returned by its to_dict(). Must
+            contain 'kind' and 'options'.
+        :param bounds: (xmin, ymin, xmax, ymax) of the object or None.
+        :param name: Name of the object's members in the file. Must be
+            unique in the project. Defaults to the object's position.
+        :return: The manifest entry for the object.
+        :rtype: dict
+        """
+        d = dict(d)
+        kind = d.pop("kind")
+        options = dict(d.pop("options"))
+        units = d.pop("units", None)
+
+        encoder = GeometryEncoder()
+        text = encoder.encode(d)
+
+        if name is None:
+            name = str(len(self.manifest["objs"]))
+
+        entry = {"kind": kind,
+                 "units": units,
+                 "options": options,
+                 "bounds": list(bounds) if bounds is not None else None,
+                 "data": "objects/%s.json" % name,
+                 "geometry": "objects/%s.geo" % name}
+
+        self.zip.writestr(entry["data"], text)
+        self.zip.writestr(entry["geometry"], pack_geometry(encoder.geometries))
+
+        self.manifest["objs"].append(entry)
+        return entry
+
+    def copy_object(self, source, entry):
+        """
+        Adds an object by copying it from another project.
+
+        :param source: Version 2 project file with the object.
+        :param entry: The manifest entry of the object in source.
+            Other than the members' names, it can be updated, i.e.
+            with new options.
+        :return: The manifest entry for the object.
+        :rtype: dict
+        """
+        if source not in self.sources:
+            self.sources[source] = zipfile.ZipFile(source, 'r')
+        z = self.sources[source]
+
+        self.zip.writestr(entry["data"], z.read(entry["data"]))
+        self.zip.writestr(entry["geometry"], z.read(entry["geometry"]))
+
+        entry = dict(entry)
+        self.manifest["objs"].append(entry)
+        return entry
+
+    def close_sources(self):
+        for z in self.sources.values():
+            z.close()
+        self.sources = {}
+
+    def close(self):
+        """
+        Writes the manifest and replaces the target file.
+        """
+        self.zip.writestr(MANIFEST, json.dumps(self.manifest, indent=2, sort_keys=True))
+        self.zip.close()
+        self.close_sources()
+
+        if os.path.exists(self.filename):
+            shutil.copymode(self.filename, self.tmp_filename)
+        os.replace(self.tmp_filename, self.filename)
+
+    def abort(self):
+        """
+        Discards the project. The target file is not modified.
+        """
+        self.zip.close()
+        self.close_sources()
+        try:
+            os.remove(self.tmp_filename)
+        except OSError:
+            pass
+
+
+class ProjectReader(object):
+    """
+    Reads a version 2 project.
+    """
+
+    def __init__(self, filename):
+        """
+        Opens the file and reads the manifest.
+
+        :param filename: Project file.
+        """
+        self.filename = filename
+        with zipfile.ZipFile(filename, 'r') as z:
+            self.manifest = json.loads(z.read(MANIFEST).decode('utf-8'))
+
+        if self.manifest.get("format", 0) > FORMAT_VERSION:
+            log.warning("Project %s has a newer format (%s)." %
+                        (filename, self.manifest["format"]))
+
+    @property
+    def options(self):
+        return self.manifest["options"]
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    @property
+    def objects(self):
+        """
+        Manifest entries of the objects.
+        """
+        return self.manifest["objs"]
+
+    def read_object(self, entry):
+        """
+        Reads an object.
+
+        :param entry: The manifest entry of the object.
+        :return: The object as from its to_dict().
+        :rtype: dict
+        """
+        with zipfile.ZipFile(self.filename, 'r') as z:
+            geometries = unpack_geometry(z.read(entry["geometry"]))
+            d = decode_object(z.read(entry["data"]).decode('utf-8'), geometries)
+
+        d.update(read_header(entry))
+        return d
+
+
+def read_header(entry):
+    """
+    The attributes of an object that are stored in the manifest.
+
+    :param entry: The manifest entry of the object.
+    :return: Dictionary with 'kind', 'options' and 'units', if
+        known, as from the object's to_dict().
+    :rtype: dict
+    """
+    d = {"kind": entry["kind"],
+         "options": dict(entry["options"])}
+    if entry.get("units") is not None:
+        d["units"] = entry["units"]
+    return d
+
+
+def read_project(filename):
+    """
+    Reads a project in any format.
+
+    :param filename: Project file.
+    :return: {"objs": [...], "options": {...}, "version": ...} with
+        each object as from its to_dict().
+    :rtype: dict
+    """
+    if is_legacy(filename):
+        with open(filename, 'r') as f:
+            return json.load(f, object_hook=dict2obj)
+
+    reader = ProjectReader(filename)
+    return {"objs": [reader.read_object(entry) for entry in reader.objects],
+            "options": reader.options,
+            "version": reader.version}
+
+
+def write_project(filename, objs, options, version, compression=True, bounds=None):
+    """
+    Writes a version 2 project.
+
+    :param filename: File to write to.
+    :param objs: Objects as from their to_dict().
+    :param options: Project options.
+    :param version: FlatCAM version.
+    :param compression: Deflate the file's members.
+    :param bounds: Bounds of each object in objs, or None.
+    :return: None
+    """
+    if bounds is None:
+        bounds = [None] * len(objs)
+
+    with ProjectWriter(filename, compression=compression) as writer:
+        for d, obj_bounds in zip(objs, bounds):
+            writer.add_object(d, bounds=obj_bounds)
+        writer.set_options(options, version)
+
+
+def snapshot(value):
+    """
+    Copy of value that the object it was taken from can't modify,
+    i.e. of the dictionary from an object's to_dict(). Containers are
+    copied, anything else, like Shapely objects, is assumed to be
+    immutable and is shared.
+
+    :param value: Value to copy.
+    :return: The copy.
+    """
+    if isinstance(value, dict):
+        return dict((key, snapshot(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [snapshot(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(snapshot(item) for item in value)
+    return value
+
+
+def write_snapshot(filename, items, options, version, compression=True):
+    """
+    Writes a version 2 project where some of the objects are
+    copied from previously saved projects. Each item is either:
+
+    * ``{"object": d, "bounds": bounds, "name": name}``: Arguments
+      for ProjectWriter.add_object().
+    * ``{"source": project, "entry": entry}``: Arguments for
+      ProjectWriter.copy_object().
+
+    :param filename: File to write to.
+    :param items: List of items as described.
+    :param options: Project options.
+    :param version: FlatCAM version.
+    :param compression: Deflate the file's members.
+    :return: The manifest entry of each item.
+    :rtype: list
+    """
+    entries = []
+    with ProjectWriter(filename, compression=compression) as writer:
+        for item in items:
+            if "source" in item:
+                entries.append(writer.copy_object(item["source"], item["entry"]))
+            else:
+                entries.append(writer.add_object(item["object"],
+                                                 bounds=item.get("bounds"),
+                                                 name=item.get("name")))
+        writer.set_options(options, version)
+    return entries
@@ -0,0 +1,508 @@
+############################################################
+# FlatCAM: 2D Post-processing for Manufacturing            #
+# http://flatcam.org                                       #
+# Author: Juan Pablo Caram (c)                             #
+# Date: 2/5/2014                                           #
+# MIT Licence                                              #
+############################################################
+
+"""
+Snapping to the geometry in the editor.
+
+A SnapIndex keeps the vertices and segments of the shapes being
+edited in numpy arrays, so a query is a few vectorized operations
+instead of an R-tree search and Python math per point.
+
+Mouse moves ask for points close to each other, so the vertices and
+segments around the last query are kept (the query region) and the
+next queries within it only look at those. A new region is found
+with a Grid, which buckets the vertices and segments by cell.
+
+Shapes are added and removed one at a time as they are edited.
+Added shapes are packed at the end of the arrays on the next query
+and looked at one by one until there are enough of them to build
+the grid again. Removed ones are masked out until most of the
+arrays are dead.
+"""
+
+import numpy as np
+
+from camlib import flatten_iter
+
+
+def geometry_paths(geometry):
+    """
+    :param geometry: Shapely object or nested list of them.
+    :return: List of the coordinates of its linear parts and
+        points, arrays of shape (n, 2).
+    """
+    return [np.asarray(geo.coords)[:, :2]
+            for geo in flatten_iter(geometry, pathonly=True) if not geo.is_empty]
+
+
+def geometry_arrays(geometry):
+    """
+    Vertices and segments of geometry.
+
+    :param geometry: Shapely object or nested list of them.
+    :return: (vertices, segments), arrays of shape (n, 2) and
+        (m, 4) with (x1, y1, x2, y2) in each row.
+    """
+    vertices, _, segments, _ = path_arrays(geometry_paths(geometry), [])
+    return vertices, segments
+
+
+def path_arrays(paths, owners):
+    """
+    Vertices and segments of paths, all in single arrays.
+
+    :param paths: List of arrays of shape (n, 2) with n > 0.
+    :param owners: Owner number of each path.
+    :return: (vertices, vertex owners, segments, segment owners)
+        with vertices of shape (n, 2) and segments of shape (m, 4),
+        (x1, y1, x2, y2) in each row.
+    """
+    if len(paths) == 0:
+        return np.zeros((0, 2)), np.zeros(0, dtype=int), np.zeros((0, 4)), np.zeros(0, dtype=int)
+
+    lengths = [len(path) for path in paths]
+    vertices = np.concatenate(paths).astype(float)
+    vertex_owners = np.repeat(np.asarray(owners, dtype=int), lengths) if len(owners) > 0 \
+        else np.zeros(len(vertices), dtype=int)
+
+    # Consecutive vertices of the same path.
+    same = np.ones(len(vertices) - 1, dtype=bool)
+    same[np.cumsum(lengths)[:-1] - 1] = False
+
+    segments = np.hstack([vertices[:-1][same], vertices[1:][same]])
+    return vertices, vertex_owners, segments, vertex_owners[:-1][same]
+
+
+class SnapIndex(object):
+    """
+    Vertices and segments of shapes, for nearest point queries.
+    Shapes are any hashable object, with their geometry given
+    when added.
+    """
+
+    # Half the width of the query region, in maximum distances
+    # of the query that made it.
+    region_size = 16
+
+    # Pack the arrays again when more than this fraction of
+    # their vertices are from removed shapes.
+    max_dead = 0.5
+
+    # Build the grid again when more vertices than this, or
+    # than an eighth of all, are not in it.
+    max_tail = 1024
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """
+        Removes all shapes.
+
+        :return: None
+        """
+
+        # Shape of each owner number, None if removed.
+        self.keys = []
+
+        # Number of vertices of each owner.
+        self.sizes = []
+
+        # {shape: owner number}
+        self.owners = {}
+
+        # Whether each owner is not removed.
+        self.alive = np.zeros(0, dtype=bool)
+
+        # Added and not yet packed, list of path_arrays().
+        self.pending = []
+
+        # Packed vertices and segments, and their owner numbers.
+        self.vertices = np.zeros((0, 2))
+        self.vertex_owners = np.zeros(0, dtype=int)
+        self.segments = np.zeros((0, 4))
+        self.segment_owners = np.zeros(0, dtype=int)
+
+        # Bounding boxes of segments, (xmin, ymin, xmax, ymax).
+        self.segment_bounds = np.zeros((0, 4))
+
+        # Vertices in self.vertices from removed shapes.
+        self.dead = 0
+
+        # Grid of the vertices and segments up to grid.n_points
+        # and grid.n_boxes. Those after are the tail.
+        self.grid = None
+
+        # (extents, vertex indexes, segment indexes) of the query
+        # region, or None.
+        self.region = None
+
+    def __len__(self):
+        return len(self.owners)
+
+    def add(self, key, geometry):
+        """
+        Adds a shape, replacing it if it is in the index.
+
+        :param key: The shape.
+        :param geometry: Its geometry, Shapely object or nested
+            list of them.
+        :return: None
+        """
+        self.add_many([key], [geometry_paths(geometry)])
+
+    def add_many(self, keys, paths):
+        """
+        Adds shapes, replacing those in the index.
+
+        :param keys: List of shapes.
+        :param paths: For each shape, list of the coordinates of
+            its linear parts and points. See geometry_paths().
+        :return: None
+        """
+        for key in keys:
+            self.remove(key)
+
+        all_paths = []
+        owners = []
+        for key, key_paths in zip(keys, paths):
+            owner = len(self.keys)
+            self.keys.append(key)
+            self.sizes.append(sum(len(path) for path in key_paths))
+            self.owners[key] = owner
+            all_paths.extend(key_paths)
+            owners.extend([owner] * len(key_paths))
+
+        self.pending.append(path_arrays(all_paths, owners))
+        self.region = None
+
+    def remove(self, key):
+        """
+        Removes a shape. Nothing happens if it is not in the index.
+
+        :param key: The shape.
+        :return: None
+        """
+        owner = self.owners.pop(key, None)
+        if owner is None:
+            return
+
+        self.keys[owner] = None
+        self.dead += self.sizes[owner]
+        if owner < len(self.alive):
+            self.alive[owner] = False
+
+        self.region = None
+
+    def pack(self):
+        """
+        Moves the pending shapes into the arrays. Builds the grid
+        again if many are not in it, dropping the removed shapes
+        first if there are many.
+
+        :return: None
+        """
+        if self.pending:
+            self.append_pending()
+
+        indexed = self.grid.n_points if self.grid is not None else 0
+        if self.grid is None or self.dead > self.max_dead * len(self.vertices) or \
+                len(self.vertices) - indexed > max(self.max_tail, len(self.vertices) // 8):
+            if self.dead > 0:
+                self.compact()
+            self.grid = Grid(self.vertices, self.segment_bounds)
+
+    def append_pending(self):
+        """
+        Moves the pending shapes to the end of the arrays.
+
+        :return: None
+        """
+
+        # Shapes added since the last time, some maybe removed.
+        added = [self.keys[owner] is not None for owner in range(len(self.alive), len(self.keys))]
+        self.alive = np.concatenate([self.alive, np.array(added, dtype=bool)])
+
+        pending = self.pending
+        self.pending = []
+
+        segments = np.concatenate([block[2] for block in pending])
+
+        self.vertices = np.concatenate([self.vertices] + [block[0] for block in pending])
+        self.vertex_owners = np.concatenate([self.vertex_owners] + [block[1] for block in pending])
+        self.segments = np.concatenate([self.segments, segments])
+        self.segment_owners = np.concatenate([self.segment_owners] + [block[3] for block in pending])
+        self.segment_bounds = np.concatenate([self.segment_bounds, segment_box(segments)])
+
+    def compact(self):
+        """
+        Drops the vertices and segments of removed shapes.
+
+        :return: None
+        """
+        keep = self.alive[self.vertex_owners]
+        self.vertices = self.vertices[keep]
+        self.vertex_owners = self.vertex_owners[keep]
+
+        keep = self.alive[self.segment_owners]
+        self.segments = self.segments[keep]
+        self.segment_owners = self.segment_owners[keep]
+        self.segment_bounds = self.segment_bounds[keep]
+
+        self.dead = 0
+
+    def get_region(self, pt, max_distance):
+        """
+        Vertices and segments that can be within max_distance
+        of pt, from the query region. A new region is made around
+        pt if pt is too close to the border of the last one.
+
+        :param pt: (x, y)
+        :param max_distance: Maximum distance.
+        :return: (vertex indexes, segment indexes)
+        """
+        x, y = pt
+        if self.region is not None:
+            (xmin, ymin, xmax, ymax), vertices, segments = self.region
+            if xmin <= x - max_distance and x + max_distance <= xmax and \
+                    ymin <= y - max_distance and y + max_distance <= ymax:
+                return vertices, segments
+
+        self.pack()
+
+        size = self.region_size * max_distance
+        xmin, ymin, xmax, ymax = x - size, y - size, x + size, y + size
+
+        # Candidates in the grid's cells and the tail.
+        vertices, segments = self.grid.query((xmin, ymin, xmax, ymax))
+        vertices = np.concatenate([vertices, np.arange(self.grid.n_points, len(self.vertices))])
+        segments = np.concatenate([segments, np.arange(self.grid.n_boxes, len(self.segments))])
+
+        vx, vy = self.vertices[vertices, 0], self.vertices[vertices, 1]
+        vertices = vertices[(vx >= xmin) & (vx <= xmax) & (vy >= ymin) & (vy <= ymax) &
+                            self.alive[self.vertex_owners[vertices]]]
+
+        bounds = self.segment_bounds[segments]
+        segments = segments[(bounds[:, 0] <= xmax) & (bounds[:, 2] >= xmin) &
+                            (bounds[:, 1] <= ymax) & (bounds[:, 3] >= ymin) &
+                            self.alive[self.segment_owners[segments]]]
+
+        self.region = ((xmin, ymin, xmax, ymax), vertices, segments)
+        return vertices, segments
+
+    def nearest(self, pt, k=1, max_distance=None):
+        """
+        Vertices nearest to a point.
+
+        :param pt: (x, y)
+        :param k: Number of vertices.
+        :param max_distance: Only vertices within this distance,
+            or None for any.
+        :return: List of up to k (distance, (x, y), shape), nearest
+            first.
+        """
+        if max_distance is None:
+            self.pack()
+            indexes = np.flatnonzero(self.alive[self.vertex_owners])
+        else:
+            indexes, _ = self.get_region(pt, max_distance)
+
+        distances = np.hypot(self.vertices[indexes, 0] - pt[0], self.vertices[indexes, 1] - pt[1])
+        if max_distance is not None:
+            within = distances <= max_distance
+            indexes, distances = indexes[within], distances[within]
+
+        if len(indexes) > k:
+            nearest = np.argpartition(distances, k - 1)[:k]
+            indexes, distances = indexes[nearest], distances[nearest]
+        order = np.argsort(distances, kind='stable')
+
+        return [(distances[i], tuple(self.vertices[indexes[i]].tolist()),
+                 self.keys[self.vertex_owners[indexes[i]]])
+                for i in order]
+
+    def snap(self, pt, max_distance, vertices=True, midpoints=False, edges=False):
+        """
+        Point of the geometry to snap to. Vertices and midpoints
+        take precedence over edges.
+
+        :param pt: (x, y)
+        :param max_distance: Maximum distance from pt.
+        :param vertices: Snap to vertices.
+        :param midpoints: Snap to the middle of segments.
+        :param edges: Snap to the nearest point of segments.
+        :return: (distance, (x, y), shape) or None if nothing
+            is close enough.
+        """
+        vertex_indexes, segment_indexes = self.get_region(pt, max_distance)
+        p = np.asarray(pt, dtype=float)
+
+        # (distance, point, owner) of the best of each kind.
+        candidates = []
+
+        if vertices and len(vertex_indexes) > 0:
+            candidates.append(closest(self.vertices[vertex_indexes], p,
+                                      self.vertex_owners[vertex_indexes]))
+
+        segments = self.segments[segment_indexes]
+        owners = self.segment_owners[segment_indexes]
+
+        if midpoints and len(segments) > 0:
+            candidates.append(closest((segments[:, :2] + segments[:, 2:]) / 2.0, p, owners))
+
+        best = min(candidates, key=lambda c: c[0]) if candidates else None
+        if (best is None or best[0] > max_distance) and edges and len(segments) > 0:
+            best = closest(project(segments, p), p, owners)
+
+        if best is None or best[0] > max_distance:
+            return None
+
+        distance, point, owner = best
+        return distance, point, self.keys[owner]
+
+
+class Grid(object):
+    """
+    Points and boxes bucketed by the cells of a regular grid, to
+    find those in an area without looking at all of them.
+    """
+
+    # Boxes over more cells than this are not bucketed, query()
+    # always returns them.
+    max_cells = 16
+
+    # Rows of cells looked at by query(). Taller areas are most
+    # of the grid, query() returns everything.
+    max_rows = 64
+
+    def __init__(self, points, boxes, density=8):
+        """
+        :param points: Array (n, 2).
+        :param boxes: Array (m, 4) of (xmin, ymin, xmax, ymax).
+        :param density: Points per cell on average, over the
+            bounds of the points.
+        """
+        self.n_points = len(points)
+        self.n_boxes = len(boxes)
+
+        if self.n_points > 0:
+            self.x0, self.y0 = points.min(axis=0)
+            width, height = points.max(axis=0) - (self.x0, self.y0)
+        else:
+            self.x0, self.y0, width, height = 0.0, 0.0, 0.0, 0.0
+
+        n = max(self.n_points, 1)
+        if width * height > 0:
+            self.cell = np.sqrt(width * height * density / n)
+        else:
+            self.cell = max(width, height) * density / n
+        self.cell = max(self.cell, 1e-9)
+
+        while True:
+            self.nx = int(width / self.cell) + 1
+            self.ny = int(height / self.cell) + 1
+            if self.nx * self.ny <= 4 * n + 16:
+                break
+            self.cell *= 2
+
+        ## Points
+        ids = self.column(points[:, 0]) + self.row(points[:, 1]) * self.nx
+        self.point_order, self.point_starts = self.bucket(ids)
+
+        ## Boxes
+        i0, i1 = self.column(boxes[:, 0]), self.column(boxes[:, 2])
+        j0, j1 = self.row(boxes[:, 1]), self.row(boxes[:, 3])
+        widths = i1 - i0 + 1
+        counts = widths * (j1 - j0 + 1)
+
+        large = counts > self.max_cells
+        self.large_boxes = np.flatnonzero(large)
+        counts[large] = 0
+
+        # One entry per box and cell it covers.
+        entries = np.repeat(np.arange(self.n_boxes), counts)
+        firsts = np.cumsum(counts) - counts
+        k = np.arange(len(entries)) - np.repeat(firsts, counts)
+        w = widths[entries]
+        ids = (i0[entries] + k % w) + (j0[entries] + k // w) * self.nx
+        order, self.box_starts = self.bucket(ids)
+        self.box_order = entries[order]
+
+    def column(self, x):
+        return np.clip(np.floor((x - self.x0) / self.cell), 0, self.nx - 1).astype(int)
+
+    def row(self, y):
+        return np.clip(np.floor((y - self.y0) / self.cell), 0, self.ny - 1).astype(int)
+
+    def bucket(self, ids):
+        """
+        :param ids: Cell number of each item.
+        :return: (items sorted by cell, index in them where each
+            cell starts, and the end)
+        """
+        order = np.argsort(ids, kind='stable')
+        starts = np.searchsorted(ids[order], np.arange(self.nx * self.ny + 1))
+        return order, starts
+
+    def query(self, extents):
+        """
+        Points and boxes that can be in an area.
+
+        :param extents: (xmin, ymin, xmax, ymax) of the area.
+        :return: (point indexes, box indexes), with some outside
+            the area too.
+        """
+        xmin, ymin, xmax, ymax = extents
+        i0, i1 = self.column(np.array([xmin, xmax]))
+        j0, j1 = self.row(np.array([ymin, ymax]))
+
+        if j1 - j0 + 1 > self.max_rows:
+            return np.arange(self.n_points), np.arange(self.n_boxes)
+
+        rows = [j * self.nx for j in range(j0, j1 + 1)]
+        points = [self.point_order[self.point_starts[r + i0]:self.point_starts[r + i1 + 1]] for r in rows]
+        boxes = [self.box_order[self.box_starts[r + i0]:self.box_starts[r + i1 + 1]] for r in rows]
+
+        # Boxes over several cells are there several times.
+        return np.concatenate(points), np.unique(np.concatenate(boxes + [self.large_boxes]))
+
+
+def segment_box(segments):
+    """
+    :param segments: Array (n, 4) of (x1, y1, x2, y2).
+    :return: Array (n, 4) of (xmin, ymin, xmax, ymax).
+    """
+    return np.hstack([np.minimum(segments[:, :2], segments[:, 2:]),
+                      np.maximum(segments[:, :2], segments[:, 2:])])
+
+
+def project(segments, p):
+    """
+    Points of segments nearest to p.
+
+    :param segments: Array (n, 4) of (x1, y1, x2, y2).
+    :param p: Array (x, y).
+    :return: Array (n, 2).
+    """
+    a = segments[:, :2]
+    ab = segments[:, 2:] - a
+    length2 = np.einsum('ij,ij->i', ab, ab)
+    t = np.einsum('ij,ij->i', p - a, ab) / np.where(length2 > 0, length2, 1.0)
+    return a + np.clip(t, 0.0, 1.0)[:, None] * ab
+
+
+def closest(points, p, owners):
+    """
+    :param points: Array (n, 2) with n > 0.
+    :param p: Array (x, y).
+    :param owners: Owner of each point.
+    :return: (distance, (x, y), owner) of the point nearest to p.
+    """
+    distances = np.hypot(points[:, 0] - p[0], points[:, 1] - p[1])
+    i = np.argmin(distances)
+    return distances[i], tuple(points[i].tolist()), owners[i]
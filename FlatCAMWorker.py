@@ -6,23 +6,70 @@
 # MIT Licence                                              #
 ############################################################
 
+import sys
+import threading
+import multiprocessing
+
 from PyQt4 import QtCore
 
+from FlatCAMCommon import TaskQueue, TaskCancelled, set_current_token
+
+
+class WorkerThread(QtCore.QThread):
+    """
+    Runs tasks from a WorkerPool until the pool is stopped.
+    """
+
+    def __init__(self, pool):
+        super(WorkerThread, self).__init__()
+        self.pool = pool
+
+    def run(self):
+        self.pool.app.log.debug("Worker Started!")
+        self.pool.allow_debug()
+
+        while True:
+            task = self.pool.queue.get()
+            if task is None:
+                break
+            self.pool.run_task(task)
+
 
-class Worker(QtCore.QObject):
+class WorkerPool(QtCore.QObject):
     """
-    Implements a queue of tasks to be carried out in order
-    in a single independent thread.
+    Runs the tasks emitted on App.worker_task in a pool of
+    threads. See FlatCAMCommon.TaskQueue for the format of the
+    tasks, their priorities, locks and cancellation.
+
+    Tasks with a 'worker_name' run in a separate lane of
+    one thread with that name, i.e. 'worker2' for tasks that
+    should not wait for, or hold up, the rest.
     """
 
     # avoid multiple tests  for debug availability
     pydevd_failed = False
 
-    def __init__(self, app, name=None):
-        super(Worker, self).__init__()
+    def __init__(self, app, threads=0, name=None):
+        """
+        :param app: The application.
+        :param threads: Number of threads. 0 for one per CPU, but
+            at least 2.
+        :param name: Name of the lane or None for the main pool.
+        """
+        super(WorkerPool, self).__init__()
         self.app = app
         self.name = name
 
+        if threads <= 0:
+            threads = max(2, multiprocessing.cpu_count())
+
+        self.queue = TaskQueue()
+        self.threads = [WorkerThread(self) for _ in range(threads)]
+
+        # Named lanes
+        self.lanes = {}
+        self.lanes_lock = threading.Lock()
+
     def allow_debug(self):
         """
          allow debuging/breakpoints in this threads
@@ -37,30 +84,98 @@ class Worker(QtCore.QObject):
             except ImportError:
                 self.pydevd_failed=True
 
-    def run(self):
+    def start(self):
+        self.app.log.debug("Starting %d worker threads." % len(self.threads))
+        for thread in self.threads:
+            thread.start()
 
-        self.app.log.debug("Worker Started!")
+    def stop(self):
+        """
+        Cancels all tasks and lets the threads finish.
 
-        self.allow_debug()
+        :return: None
+        """
+        for lane in self.lanes.values():
+            lane.stop()
+        self.queue.cancel_all()
+        self.queue.close()
 
-        # Tasks are queued in the event listener.
-        self.app.worker_task.connect(self.do_worker_task)
+    def wait(self, msecs):
+        """
+        Waits for the threads to finish after stop().
 
-    def do_worker_task(self, task):
+        :param msecs: Timeout for each thread in milliseconds.
+        :return: None
+        """
+        for lane in list(self.lanes.values()):
+            lane.wait(msecs)
+        for thread in self.threads:
+            thread.wait(msecs)
 
-        self.app.log.debug("Running task: %s" % str(task))
+    def submit(self, task):
+        """
+        Queues a task. Connect to App.worker_task.
+
+        :param task: Task dictionary.
+        :return: The task's CancellationToken.
+        """
+        self.app.log.debug("Queuing task: %s" % str(task))
 
-        self.allow_debug()
+        name = task.get('worker_name')
+        if name is not None and name != self.name:
+            with self.lanes_lock:
+                if name not in self.lanes:
+                    self.lanes[name] = WorkerPool(self.app, threads=1, name=name)
+                    self.lanes[name].start()
+                lane = self.lanes[name]
+            return lane.submit(task)
 
-        if ('worker_name' in task and task['worker_name'] == self.name) or \
-            ('worker_name' not in task and self.name is None):
+        return self.queue.put(task)
+
+    def pending(self):
+        """
+        :return: Number of queued and running tasks, in all lanes.
+        """
+        return self.queue.pending() + sum(lane.pending() for lane in list(self.lanes.values()))
+
+    def cancel_all(self):
+        """
+        Cancels all queued and running tasks, in all lanes.
 
+        :return: None
+        """
+        for lane in self.lanes.values():
+            lane.cancel_all()
+        self.queue.cancel_all()
+
+    def run_task(self, task):
+        """
+        Runs a task in the current thread.
+
+        :param task: Task dictionary from the queue.
+        :return: None
+        """
+        self.app.log.debug("Running task: %s" % str(task))
+
+        try:
+            if task['token'].cancelled:
+                self.app.log.debug("Task cancelled before starting.")
+                return
+
+            # For check_cancelled() in the task.
+            previous = set_current_token(task['token'])
             try:
                 task['fcn'](*task['params'])
-            except Exception as e:
-                self.app.thread_exception.emit(e)
-                raise e
+            finally:
+                set_current_token(previous)
+
+        except TaskCancelled:
+            self.app.log.debug("Task cancelled.")
 
-            return
+        except Exception as e:
+            self.app.thread_exception.emit(e)
+            # As for an exception in a slot.
+            sys.excepthook(*sys.exc_info())
 
-        self.app.log.debug("Task ignored.")
+        finally:
+            self.queue.done(task)
@@ -334,7 +334,8 @@ class ObjectCollection():
         else:
            self.object_list[item.row()].options["plot"] = False #(item.checkState() == QtCore.Qt.Checked)
 
-        self.object_list[item.row()].plot()
+        obj = self.object_list[item.row()]
+        obj.app.replot([obj])
         return
 
     def on_item_activated(self, index):
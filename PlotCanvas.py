@@ -15,34 +15,376 @@ mpl_use("Qt4Agg")
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.artist import Artist
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch, PathPatch
+from matplotlib.collections import Collection, PathCollection
+from matplotlib.text import Text, Annotation
+from matplotlib.font_manager import FontProperties
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import threading
+import time
 import FlatCAMApp
+from FlatCAMPlot import set_collection_paths
 import logging
 
 log = logging.getLogger('base')
 
 
-class CanvasCache(QtCore.QObject):
+def get_axes_bounds(axes):
+    """
+    Bounds of what is plotted on the axes.
+
+    :param axes: Matplotlib axes.
+    :return: (xmin, ymin, xmax, ymax) or None if empty.
+    """
+    xmin, ymin, xmax, ymax = axes.dataLim.extents
+    if not np.all(np.isfinite([xmin, ymin, xmax, ymax])) or xmin > xmax or ymin > ymax:
+        return None
+    return xmin, ymin, xmax, ymax
+
+
+def tile_level(density):
+    """
+    Zoom level of the tiles for a view. Tiles of level n have
+    2^n units per pixel, the largest not above the view's.
+
+    :param density: Units per pixel of the view.
+    :return: Level or None if density is not valid.
+    """
+    if not density > 0 or not np.isfinite(density):
+        return None
+    return int(np.floor(np.log2(density)))
+
+
+def tile_extents(key, tile_size):
+    """
+    :param key: (level, i, j) of a tile.
+    :param tile_size: Width and height of tiles in pixels.
+    :return: (xmin, ymin, xmax, ymax) of the tile.
+    """
+    level, i, j = key
+    size = tile_size * 2.0 ** level
+    return i * size, j * size, (i + 1) * size, (j + 1) * size
+
+
+def tile_fallbacks(key, levels):
+    """
+    Tiles of other levels that show the area of a tile, to show
+    scaled while it is rendered.
+
+    :param key: (level, i, j) of a tile.
+    :param levels: How many coarser levels to look at.
+    :return: List of lists of keys, each covering the tile:
+        the parent, its parent and so on, then the 4 children.
+    """
+    level, i, j = key
+    fallbacks = [[(level + up, i >> up, j >> up)] for up in range(1, levels + 1)]
+    fallbacks.append([(level - 1, 2 * i + di, 2 * j + dj) for dj in (0, 1) for di in (0, 1)])
+    return fallbacks
+
+
+def tile_keys(extents, level, tile_size):
+    """
+    Tiles covering an area.
+
+    :param extents: (xmin, ymin, xmax, ymax) of the area.
+    :param level: Zoom level, see tile_level().
+    :param tile_size: Width and height of tiles in pixels.
+    :return: List of (level, i, j).
+    """
+    xmin, ymin, xmax, ymax = extents
+    size = tile_size * 2.0 ** level
+    return [(level, i, j)
+            for j in range(int(np.floor(ymin / size)), int(np.floor(ymax / size)) + 1)
+            for i in range(int(np.floor(xmin / size)), int(np.floor(xmax / size)) + 1)]
+
+
+class LayerSnapshot(object):
+    """
+    Copy of what an axes (a layer, i.e. the plot of an object)
+    shows. Made in the main thread. The cache builds its own
+    artists from it in the background, so the ones on the
+    screen are never touched from there.
+
+    Lines, patches, collections and text at a point of the plot
+    are copied. A layer with any other artist is live: it is
+    not in the tiles and its axes are drawn over them.
+    """
+
+    def __init__(self, axes, plot_data=None):
+        """
+        :param axes: The layer's axes.
+        :param plot_data: {collection: (PlotData, (dx, dy) offset of
+            the collection)} for the collections of the axes with
+            levels of detail.
+        """
+
+        plot_data = plot_data or {}
+
+        # (artist class, data, properties, transformation on top
+        # of the data coordinates or None). The data of collections
+        # with levels of detail is their (PlotData, offset).
+        self.items = []
+
+        # Artists that could not be copied.
+        self.live = False
+
+        # Pixels drawn around self.bounds, i.e. line widths and
+        # text.
+        self.margin = 8
+
+        # Text is not in the axes' data limits.
+        text_points = []
+
+        # Not drawn, frames are off, the base axes shows the ticks.
+        # Animated artists are drawn by their owner over the
+        # canvas, see FlatCAMDraw.
+        frame = [axes.patch, axes.xaxis, axes.yaxis, axes.title, axes._left_title, axes._right_title] + \
+            list(axes.spines.values())
+
+        for artist in axes.get_children():
+            if not artist.get_visible() or artist.get_animated() or artist in frame:
+                continue
+            if isinstance(artist, Text) and artist.get_text() == '':
+                continue
+
+            transform = Artist.get_transform(artist)
+            extra = None if transform is axes.transData else transform - axes.transData
+
+            if isinstance(artist, Line2D):
+                self.items.append((Line2D, artist.get_xydata(),
+                                   {"color": artist.get_color(),
+                                    "linestyle": artist.get_linestyle(),
+                                    "linewidth": artist.get_linewidth(),
+                                    "marker": artist.get_marker(),
+                                    "markersize": artist.get_markersize(),
+                                    "alpha": artist.get_alpha(),
+                                    "zorder": artist.get_zorder()}, extra))
+
+            elif isinstance(artist, Patch):
+                path = artist.get_path().transformed(artist.get_patch_transform())
+                self.items.append((PathPatch, path,
+                                   {"facecolor": artist.get_facecolor(),
+                                    "edgecolor": artist.get_edgecolor(),
+                                    "linewidth": artist.get_linewidth(),
+                                    "fill": artist.get_fill(),
+                                    "zorder": artist.get_zorder()}, extra))
+
+            elif isinstance(artist, Collection):
+                self.items.append((PathCollection, plot_data.get(artist, artist.get_paths()),
+                                   {"facecolors": artist.get_facecolor(),
+                                    "edgecolors": artist.get_edgecolor(),
+                                    "linewidths": artist.get_linewidth(),
+                                    "alpha": artist.get_alpha(),
+                                    "zorder": artist.get_zorder()}, extra))
+
+            elif isinstance(artist, Text) and self.is_data_text(artist, axes):
+                if isinstance(artist, Annotation):
+                    position = artist.xyann
+                else:
+                    position = artist.get_unitless_position()
+                text = artist.get_text()
+                size = artist.get_fontsize() * axes.figure.dpi / 72.0
+                self.margin = max(self.margin, int(np.ceil(size * max(len(text), 1))))
+                text_points.append(position)
+                self.items.append((Text, position,
+                                   {"text": text,
+                                    "color": artist.get_color(),
+                                    "fontproperties": FontProperties._from_any(artist.get_fontproperties()),
+                                    "horizontalalignment": artist.get_horizontalalignment(),
+                                    "verticalalignment": artist.get_verticalalignment(),
+                                    "rotation": artist.get_rotation(),
+                                    "alpha": artist.get_alpha(),
+                                    "zorder": artist.get_zorder()}, None))
+
+            else:
+                self.live = True
+
+        self.bounds = get_axes_bounds(axes)
+        if text_points:
+            points = np.array(text_points, dtype=float)
+            xmin, ymin = points.min(axis=0)
+            xmax, ymax = points.max(axis=0)
+            if self.bounds is not None:
+                xmin, ymin = min(xmin, self.bounds[0]), min(ymin, self.bounds[1])
+                xmax, ymax = max(xmax, self.bounds[2]), max(ymax, self.bounds[3])
+            self.bounds = (xmin, ymin, xmax, ymax)
+
+    @staticmethod
+    def is_data_text(artist, axes):
+        """
+        :return: Whether the artist is text placed at a point of
+            the plot, without an arrow.
+        """
+        if isinstance(artist, Annotation):
+            return artist.anncoords == 'data' and artist.arrow_patch is None and \
+                artist.xycoords == 'data'
+        return Artist.get_transform(artist) is axes.transData
+
+    def build(self, axes):
+        """
+        Adds new artists showing the layer to axes.
+
+        :param axes: Matplotlib axes.
+        :return: List of (collection, PlotData, offset) for the
+            collections with levels of detail. Their paths must be
+            set for the level and extents drawn.
+        """
+        detailed = []
+
+        for cls, data, props, extra in self.items:
+            if cls is Line2D:
+                artist = Line2D(data[:, 0], data[:, 1], **props)
+            elif cls is Text:
+                artist = Text(data[0], data[1], **props)
+            elif isinstance(data, tuple):
+                artist = cls([], **props)
+                detailed.append((artist,) + data)
+            else:
+                artist = cls(data, **props)
+
+            if extra is not None:
+                artist.set_transform(extra + axes.transData)
+            else:
+                artist.set_transform(axes.transData)
+
+            if cls is Line2D:
+                axes.add_line(artist)
+            elif cls is Text:
+                axes._add_text(artist)
+            elif cls is PathPatch:
+                axes.add_patch(artist)
+            else:
+                axes.add_collection(artist, autolim=False)
+
+        return detailed
+
+
+class TileRenderer(object):
+    """
+    Draws tiles with Agg, with its own artists made from the
+    layers' snapshots. Each thread rendering tiles has its own.
     """
 
-    Case story #1:
+    def __init__(self, tile_size, dpi):
+        """
+        :param tile_size: Width and height of tiles in pixels.
+        :param dpi: Must be the same as the canvas' so that line
+            widths in points are the same.
+        """
+        self.tile_size = tile_size
+
+        self.figure = Figure(dpi=dpi)
+        self.figure.set_size_inches(tile_size / float(dpi), tile_size / float(dpi))
+        self.figure.patch.set_visible(False)
+
+        self.axes = self.figure.add_axes([0.0, 0.0, 1.0, 1.0], alpha=1.0)
+        self.setup_axes()
+
+        self.canvas = FigureCanvasAgg(self.figure)
+
+        # Generation of the layers in self.axes, see CanvasCache.
+        self.generation = None
+
+        # (collection, PlotData, offset) in self.axes.
+        self.detailed = []
+
+    def setup_axes(self):
+        self.axes.set_frame_on(False)
+        self.axes.set_xticks([])
+        self.axes.set_yticks([])
+        self.axes.patch.set_visible(False)
+        self.axes.set_autoscale_on(False)
+
+    def build(self, layers, generation):
+        """
+        Replaces the artists in self.axes with the layers', unless
+        they are of the same generation.
+
+        :param layers: List of LayerSnapshot, in the order they are plotted.
+        :param generation: CanvasCache.generation of the layers.
+        :return: None
+        """
+        if self.generation == generation:
+            return
+
+        self.axes.cla()
+        self.setup_axes()
+        self.detailed = []
+        for layer in layers:
+            if not layer.live:
+                self.detailed += layer.build(self.axes)
+        self.generation = generation
+
+    def render(self, key):
+        """
+        Draws a tile with the artists in self.axes.
+
+        :param key: (level, i, j)
+        :return: RGBA array of shape (tile_size, tile_size, 4)
+        """
+        xmin, ymin, xmax, ymax = tile_extents(key, self.tile_size)
+        self.axes.set_xlim((xmin, xmax))
+        self.axes.set_ylim((ymin, ymax))
+
+        # Lines are drawn a few pixels wide.
+        margin = 8 * 2.0 ** key[0]
+        for collection, data, (dx, dy) in self.detailed:
+            extents = (xmin - dx - margin, ymin - dy - margin, xmax - dx + margin, ymax - dy + margin)
+            set_collection_paths(collection, data.get_paths(key[0], extents))
+
+        self.canvas.draw()
+        width, height = self.canvas.get_width_height()
+        buf = np.frombuffer(self.canvas.buffer_rgba(), dtype=np.uint8)
+        return buf.reshape(height, width, 4).copy()
 
-    1) No objects in the project.
-    2) Object is created (new_object() emits object_created(obj)).
-       on_object_created() adds (i) object to collection and emits
-       (ii) new_object_available() then calls (iii) object.plot()
-    3) object.plot() creates axes if necessary on
-       app.collection.figure. Then plots on it.
-    4) Plots on a cache-size canvas (in background).
-    5) Plot completes. Bitmap is generated.
-    6) Visible canvas is painted.
 
+class CanvasCache(QtCore.QObject):
+    """
+    Bitmaps of the plots, in tiles, so that panning and zooming
+    do not redraw every artist of every object.
+
+    Tiles are square, tile_size pixels wide, on a grid fixed in
+    plot coordinates. Each zoom level has its own grid, see
+    tile_level(). A tile has all the layers (objects) composited.
+
+    1) An object plots on its axes. PlotCanvas.invalidate() and
+       update_screen(), in the main thread, copy its artists
+       with update_layer() and drop the tiles it covered and
+       covers now.
+    2) update_screen() asks for the tiles of the view with
+       get_cover(). They are shown instead of the objects' axes.
+       In place of missing ones, tiles of other zoom levels
+       covering the same area are shown scaled. The few left
+       uncovered are rendered at once with render_now(), or if
+       there are many, the axes are drawn as usual.
+    3) The missing tiles and those around the view are requested
+       with request_tiles(). on_update_req(), in the cache's
+       thread, renders them with Agg and emits new_screen.
+    4) PlotCanvas.on_new_screen() shows them.
     """
 
     # Signals:
-    # A bitmap is ready to be displayed.
+    # Tiles were rendered.
     new_screen = QtCore.pyqtSignal()
 
-    def __init__(self, plotcanvas, app, dpi=50):
+    # Width and height of tiles in pixels.
+    tile_size = 256
+
+    # Coarser levels shown in place of a missing tile.
+    fallback_levels = 3
+
+    def __init__(self, plotcanvas, app, dpi=50, max_tiles=256):
+        """
+        :param plotcanvas: The PlotCanvas.
+        :param app: The application.
+        :param dpi: Must be the same as the canvas' so that line
+            widths in points are the same.
+        :param max_tiles: Tiles kept. Least recently used ones go first.
+        """
 
         super(CanvasCache, self).__init__()
 
@@ -50,17 +392,29 @@ class CanvasCache(QtCore.QObject):
 
         self.plotcanvas = plotcanvas
         self.dpi = dpi
+        self.max_tiles = max_tiles
 
-        self.figure = Figure(dpi=dpi)
+        # Used only in the cache's thread.
+        self.renderer = TileRenderer(self.tile_size, dpi)
 
-        self.axes = self.figure.add_axes([0.0, 0.0, 1.0, 1.0], alpha=1.0)
-        self.axes.set_frame_on(False)
-        self.axes.set_xticks([])
-        self.axes.set_yticks([])
+        # Used only in the main thread, see render_now().
+        self.main_renderer = TileRenderer(self.tile_size, dpi)
 
-        self.canvas = FigureCanvasAgg(self.figure)
+        # All below is shared between threads.
+        self.lock = threading.Lock()
+
+        # {(level, i, j): RGBA array}, least recently used first.
+        self.cache = OrderedDict()
+
+        # {axes: LayerSnapshot}, in the order they are plotted.
+        self.layers = OrderedDict()
 
-        self.cache = None
+        # Increases when layers change. Tiles rendered from older
+        # layers are dropped.
+        self.generation = 0
+
+        # Latest request, see request_tiles().
+        self.request = None
 
     def run(self):
 
@@ -68,34 +422,209 @@ class CanvasCache(QtCore.QObject):
 
         self.plotcanvas.update_screen_request.connect(self.on_update_req)
 
-        self.app.new_object_available.connect(self.on_new_object_available)
+    ### Main thread ###
+
+    def update_layer(self, axes, plot_data=None):
+        """
+        Copies what axes shows and drops the tiles it affects.
+
+        :param axes: The layer's axes.
+        :param plot_data: {collection: (PlotData, offset)}, see LayerSnapshot.
+        :return: None
+        """
+        snapshot = LayerSnapshot(axes, plot_data)
+
+        with self.lock:
+            old = self.layers.get(axes)
+            self.layers[axes] = snapshot
+            self.generation += 1
+
+            if old is not None:
+                self._invalidate(old.bounds, old.margin)
+            self._invalidate(snapshot.bounds, snapshot.margin)
+
+    def remove_layer(self, axes):
+        """
+        :param axes: Axes no longer shown.
+        :return: None
+        """
+        with self.lock:
+            old = self.layers.pop(axes, None)
+            if old is None:
+                return
+            self.generation += 1
+            self._invalidate(old.bounds, old.margin)
+
+    def get_layers(self):
+        """
+        :return: Axes of the layers.
+        """
+        with self.lock:
+            return list(self.layers.keys())
+
+    def get_live_layers(self):
+        """
+        :return: Axes of the layers not in the tiles, see
+            LayerSnapshot.live.
+        """
+        with self.lock:
+            return [axes for axes, layer in self.layers.items() if layer.live]
+
+    def clear(self):
+        """
+        Drops all layers and tiles.
+
+        :return: None
+        """
+        with self.lock:
+            self.layers.clear()
+            self.cache.clear()
+            self.generation += 1
+
+    def _invalidate(self, bounds, margin):
+        """
+        Drops the tiles showing something within bounds. Call
+        with the lock held.
+
+        :param bounds: (xmin, ymin, xmax, ymax) or None.
+        :param margin: Pixels drawn around bounds.
+        :return: None
+        """
+        if bounds is None:
+            return
+
+        xmin, ymin, xmax, ymax = bounds
+        for key in list(self.cache.keys()):
+            txmin, tymin, txmax, tymax = tile_extents(key, self.tile_size)
 
-    def on_update_req(self, extents):
+            scaled = margin * 2.0 ** key[0]
+            if txmin - scaled <= xmax and xmin <= txmax + scaled and \
+                    tymin - scaled <= ymax and ymin <= tymax + scaled:
+                del self.cache[key]
+
+    def _store(self, key, tile):
+        """
+        Adds a tile, dropping the least recently used ones over
+        max_tiles. Call with the lock held.
+
+        :param key: (level, i, j)
+        :param tile: RGBA array.
+        :return: None
         """
-        Event handler for an updated display request.
+        self.cache[key] = tile
+        while len(self.cache) > self.max_tiles:
+            self.cache.popitem(last=False)
 
-        :param extents: [xmin, xmax, ymin, ymax, zoom(optional)]
+    def get_cover(self, keys):
         """
+        Tiles to show for an area. In place of a missing tile,
+        its parent or a coarser ancestor, scaled, or else its 4
+        children if all are there.
 
-        log.debug("Canvas update requested: %s" % str(extents))
+        :param keys: List of (level, i, j) covering the area.
+        :return: ({key: RGBA array} to show, keys not in the
+            cache, keys for which nothing is shown).
+        """
+        with self.lock:
+            tiles = {}
+            missing = []
+            gaps = []
+
+            for key in keys:
+                tile = self.cache.get(key)
+                if tile is not None:
+                    self.cache.move_to_end(key)
+                    tiles[key] = tile
+                    continue
+
+                missing.append(key)
+                for fallback in tile_fallbacks(key, self.fallback_levels):
+                    if all(fkey in self.cache for fkey in fallback):
+                        for fkey in fallback:
+                            tiles[fkey] = self.cache[fkey]
+                        break
+                else:
+                    gaps.append(key)
+
+            return tiles, missing, gaps
+
+    def render_now(self, keys):
+        """
+        Renders tiles in the main thread and adds them to the
+        cache.
 
-        # Note: This information below might be out of date. Establish
-        # a protocol regarding when to change the canvas in the main
-        # thread and when to check these values here in the background,
-        # or pass this data in the signal (safer).
-        log.debug("Size: %s [px]" % str(self.plotcanvas.get_axes_pixelsize()))
-        log.debug("Density: %s [units/px]" % str(self.plotcanvas.get_density()))
+        :param keys: List of (level, i, j).
+        :return: {key: RGBA array}
+        """
+        with self.lock:
+            generation = self.generation
+            layers = list(self.layers.values())
 
-        # Move the requested screen portion to the main thread
-        # and inform about the update:
+        self.main_renderer.build(layers, generation)
+        tiles = dict((key, self.main_renderer.render(key)) for key in keys)
 
-        self.new_screen.emit()
+        with self.lock:
+            if generation == self.generation:
+                for key, tile in tiles.items():
+                    self._store(key, tile)
 
-        # Continue to update the cache.
+        return tiles
 
-    def on_new_object_available(self):
+    def request_tiles(self, keys):
+        """
+        Asks for the tiles not in the cache to be rendered in the
+        background, in order. Replaces earlier requests not yet
+        served.
 
-        log.debug("A new object is available. Should plot it!")
+        :param keys: List of (level, i, j).
+        :return: None
+        """
+        request = list(keys)
+        with self.lock:
+            self.request = request
+            if all(key in self.cache for key in request):
+                return
+        self.plotcanvas.update_screen_request.emit(request)
+
+    ### Cache's thread ###
+
+    def on_update_req(self, keys):
+        """
+        Renders the requested tiles not in the cache.
+
+        :param keys: List of (level, i, j).
+        """
+        with self.lock:
+            # A newer request is queued.
+            if keys != self.request:
+                return
+            missing = [tuple(key) for key in keys if tuple(key) not in self.cache]
+
+        log.debug("Canvas update requested: %d tiles, %d missing" % (len(keys), len(missing)))
+
+        rendered = 0
+        for key in missing:
+            with self.lock:
+                if keys != self.request:
+                    break
+                # Rendered meanwhile by render_now().
+                if key in self.cache:
+                    continue
+                generation = self.generation
+                layers = list(self.layers.values())
+
+            self.renderer.build(layers, generation)
+            tile = self.renderer.render(key)
+
+            with self.lock:
+                # Layers changed while rendering.
+                if generation != self.generation:
+                    continue
+                self._store(key, tile)
+            rendered += 1
+
+        if rendered > 0:
+            self.new_screen.emit()
 
 
 class PlotCanvas(QtCore.QObject):
@@ -104,8 +633,8 @@ class PlotCanvas(QtCore.QObject):
     """
 
     # Signals:
-    # Request for new bitmap to display. The parameter
-    # is a list with [xmin, xmax, ymin, ymax, zoom(optional)]
+    # Request for new tiles to display. The parameter
+    # is a list of (level, i, j). See CanvasCache.
     update_screen_request = QtCore.pyqtSignal(list)
 
     def __init__(self, container, app):
@@ -125,6 +654,10 @@ class PlotCanvas(QtCore.QObject):
         # Options
         self.x_margin = 15  # pixels
         self.y_margin = 25  # Pixels
+        # Tiles of the view shown with nothing under them that
+        # are rendered at once. Each takes about as long as
+        # drawing the objects' axes, so with more they are drawn.
+        self.max_gap_tiles = 2
 
         # Parent container
         self.container = container
@@ -141,6 +674,34 @@ class PlotCanvas(QtCore.QObject):
         self.axes.axhline(color='Black')
         self.axes.axvline(color='Black')
 
+        # Tiles from the cache are shown on these axes instead
+        # of the objects' axes. See update_screen().
+        self.cache_axes = self.figure.add_axes([0.05, 0.05, 0.9, 0.9], label="cache")
+        self.cache_axes.set_autoscale_on(False)
+
+        # {(level, i, j): (AxesImage, tile)} in cache_axes.
+        self.tile_images = {}
+
+        # Objects' axes plotted since the last update_screen().
+        self.changed_axes = []
+
+        # {axes: [[collection, PlotData, offset, level and extents
+        # shown]]} for the collections with levels of detail. See
+        # add_collection().
+        self.plot_data = {}
+
+        # Within batch(), update_screen() waits until the end.
+        self.batch_depth = 0
+        self.batch_pending = False
+
+        # Redraws asked for by update_screen() within a frame
+        # are done once. See schedule_redraw().
+        self.redraw_timer = QtCore.QTimer()
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.timeout.connect(self.redraw)
+        self.last_draw = 0.0  # When the last draw ended.
+        self.draw_time = 0.0  # Seconds it took.
+
         # The canvas is the top level container (FigureCanvasQTAgg)
         self.canvas = FigureCanvas(self.figure)
         # self.canvas.setFocusPolicy(QtCore.Qt.ClickFocus)
@@ -159,7 +720,7 @@ class PlotCanvas(QtCore.QObject):
         self.background = self.canvas.copy_from_bbox(self.axes.bbox)
 
         ### Bitmap Cache
-        self.cache = CanvasCache(self, self.app)
+        self.cache = CanvasCache(self, self.app, dpi=self.figure.dpi)
         self.cache_thread = QtCore.QThread()
         self.cache.moveToThread(self.cache_thread)
         super(PlotCanvas, self).connect(self.cache_thread, QtCore.SIGNAL("started()"), self.cache.run)
@@ -189,6 +750,288 @@ class PlotCanvas(QtCore.QObject):
     def on_new_screen(self):
 
         log.debug("Cache updated the screen!")
+        self.update_screen()
+
+    def invalidate(self, axes):
+        """
+        Tells that the plot on the axes (an object's) changed.
+        The cache is updated on the next update_screen().
+
+        :param axes: Matplotlib axes.
+        :return: None
+        """
+        if axes not in self.changed_axes:
+            self.changed_axes.append(axes)
+        self.plot_data.pop(axes, None)
+
+    def add_collection(self, axes, collection, data, offset=(0, 0)):
+        """
+        Adds a collection to an object's axes, with the paths
+        from data at the level of detail of the view and only
+        those around it. They are replaced when the view
+        changes, see update_details().
+
+        :param axes: Matplotlib axes.
+        :param collection: Matplotlib Collection.
+        :param data: PlotData.
+        :param offset: (dx, dy) the collection's transformation
+            moves data by, if any.
+        :return: None
+        """
+        axes.add_collection(collection, autolim=False)
+
+        # Limits of all the data, not only what is in view.
+        bounds = data.bounds()
+        if bounds is not None:
+            dx, dy = offset
+            axes.update_datalim([(bounds[0] + dx, bounds[1] + dy), (bounds[2] + dx, bounds[3] + dy)])
+
+        entry = [collection, data, offset, None]
+        self.plot_data.setdefault(axes, []).append(entry)
+        self.update_detail(entry, self.get_level(), self.get_view_extents())
+
+    def get_view_extents(self):
+        """
+        :return: (xmin, ymin, xmax, ymax) of the view.
+        """
+        xmin, xmax = self.axes.get_xlim()
+        ymin, ymax = self.axes.get_ylim()
+        return xmin, ymin, xmax, ymax
+
+    def update_details(self):
+        """
+        Sets the paths of the collections with levels of detail
+        for the zoom level and extents of the view.
+
+        :return: None
+        """
+        level = self.get_level()
+        extents = self.get_view_extents()
+        for entries in self.plot_data.values():
+            for entry in entries:
+                self.update_detail(entry, level, extents)
+
+    @staticmethod
+    def update_detail(entry, level, extents):
+        """
+        Sets the paths of a collection in self.plot_data, unless
+        the ones it has are of the level and cover the extents.
+        Paths are selected half a view around it, so that short
+        pans do not need new ones.
+
+        :param entry: [collection, PlotData, offset, (level, extents) shown]
+        :param level: Zoom level.
+        :param extents: (xmin, ymin, xmax, ymax) of the view.
+        :return: None
+        """
+        collection, data, (dx, dy), shown = entry
+        xmin, ymin, xmax, ymax = extents[0] - dx, extents[1] - dy, extents[2] - dx, extents[3] - dy
+
+        if shown is not None and shown[0] == level:
+            sxmin, symin, sxmax, symax = shown[1]
+            if sxmin <= xmin and symin <= ymin and xmax <= sxmax and ymax <= symax:
+                return
+
+        width = (xmax - xmin) / 2.0
+        height = (ymax - ymin) / 2.0
+        selected = (xmin - width, ymin - height, xmax + width, ymax + height)
+        set_collection_paths(collection, data.get_paths(level, selected))
+        entry[3] = (level, selected)
+
+    def update_screen(self, sync=False):
+        """
+        Asks for the canvas to be redrawn, see redraw(). Requests
+        are merged, so only the last of many changes to the view,
+        i.e. zoom steps of a fast wheel scroll, is drawn.
+
+        :param sync: Draw now instead of in the next frame.
+        :return: None
+        """
+        if self.batch_depth > 0:
+            self.batch_pending = True
+            return
+
+        if sync:
+            self.redraw()
+        else:
+            self.schedule_redraw()
+
+    def schedule_redraw(self):
+        """
+        Redraws when the frame after the last draw starts, or
+        as soon as idle if it already has. Frames last
+        defaults["redraw_interval_ms"] or as long as the last
+        draw took, if longer, so slow draws are not queued up.
+
+        :return: None
+        """
+        if self.redraw_timer.isActive():
+            return
+
+        interval = max(self.app.defaults.get("redraw_interval_ms", 30) / 1000.0, self.draw_time)
+        delay = self.last_draw + interval - time.time()
+        self.redraw_timer.start(max(0, int(1000 * delay)))
+
+    def redraw(self):
+        """
+        Draws the canvas now. Tiles from the cache are shown
+        instead of the objects' axes, with tiles of other levels
+        scaled in place of missing ones and the few left rendered
+        at once. The missing tiles and those around the view are
+        rendered in the background. If too many are missing, the
+        axes are drawn instead. See CanvasCache.
+
+        :return: None
+        """
+        # Anything scheduled is drawn now.
+        self.redraw_timer.stop()
+        start = time.time()
+
+        tiles = None
+
+        if self.app.defaults.get("canvas_cache", True):
+            self.update_layers()
+
+            keys = self.get_view_tiles()
+            if keys:
+                tiles, missing, gaps = self.cache.get_cover(keys)
+                if len(gaps) > self.max_gap_tiles:
+                    tiles = None
+                elif gaps:
+                    tiles.update(self.cache.render_now(gaps))
+                    missing = [key for key in missing if key not in gaps]
+
+                # The view first.
+                request = missing + self.get_prefetch_tiles()
+                self.cache.request_tiles(request[:self.cache.max_tiles // 2])
+
+        if tiles is None or self.cache.get_live_layers():
+            self.update_details()
+
+        if tiles is None:
+            self.show_layers(True)
+        else:
+            self.show_tiles(tiles)
+            self.show_layers(False)
+
+        self.canvas.draw()
+
+        self.last_draw = time.time()
+        self.draw_time = self.last_draw - start
+
+    @contextmanager
+    def batch(self):
+        """
+        Draws once at the end of the block instead of every time
+        it is asked to, i.e. by each object plotted in it::
+
+            with plotcanvas.batch():
+                for obj in objects:
+                    obj.plot()
+        """
+        self.batch_depth += 1
+        try:
+            yield
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0 and self.batch_pending:
+                self.batch_pending = False
+                self.update_screen()
+
+    def update_layers(self):
+        """
+        Copies the axes plotted since the last call into the
+        cache and removes the ones no longer in the figure.
+
+        :return: None
+        """
+        for axes in self.changed_axes:
+            if axes in self.figure.axes:
+                plot_data = dict((entry[0], (entry[1], entry[2])) for entry in self.plot_data.get(axes, []))
+                self.cache.update_layer(axes, plot_data)
+        self.changed_axes = []
+
+        for axes in self.cache.get_layers():
+            if axes not in self.figure.axes:
+                self.cache.remove_layer(axes)
+
+        for axes in list(self.plot_data.keys()):
+            if axes not in self.figure.axes:
+                del self.plot_data[axes]
+
+    def get_view_tiles(self):
+        """
+        :return: The tiles (level, i, j) covering the view. Empty
+            if the view has no size or needs too many of them.
+        """
+        level = self.get_level()
+        if level is None:
+            return []
+
+        keys = tile_keys(self.get_view_extents(), level, self.cache.tile_size)
+        if len(keys) > self.cache.max_tiles // 2:
+            return []
+        return keys
+
+    def get_prefetch_tiles(self):
+        """
+        Tiles likely to be shown next, not in the view: a ring
+        one tile wide around it, for panning, and the view and
+        its ring one level coarser, for zooming out. Zooming in
+        shows the tiles of the view scaled until the finer ones
+        are rendered.
+
+        :return: List of (level, i, j), nearest first.
+        """
+        level = self.get_level()
+        if level is None:
+            return []
+
+        xmin, ymin, xmax, ymax = self.get_view_extents()
+        view = set(tile_keys((xmin, ymin, xmax, ymax), level, self.cache.tile_size))
+
+        keys = []
+        for ring_level in [level, level + 1]:
+            size = self.cache.tile_size * 2.0 ** ring_level
+            extents = (xmin - size, ymin - size, xmax + size, ymax + size)
+            keys += [key for key in tile_keys(extents, ring_level, self.cache.tile_size) if key not in view]
+        return keys
+
+    def show_layers(self, visible):
+        """
+        Shows the objects' axes or the tiles instead. Axes not
+        in the tiles stay visible, over them.
+
+        :param visible: Show the objects' axes.
+        :return: None
+        """
+        live = self.cache.get_live_layers()
+        for axes in self.cache.get_layers():
+            axes.set_visible(visible or axes in live)
+        self.cache_axes.set_visible(not visible)
+
+    def show_tiles(self, tiles):
+        """
+        Puts tiles on cache_axes, replacing the ones there. Tiles
+        of other levels than the view's are scaled.
+
+        :param tiles: {(level, i, j): RGBA array}
+        :return: None
+        """
+        for key in list(self.tile_images.keys()):
+            image, tile = self.tile_images[key]
+            if tiles.get(key) is not tile:
+                image.remove()
+                del self.tile_images[key]
+
+        for key, tile in tiles.items():
+            if key in self.tile_images:
+                continue
+            xmin, ymin, xmax, ymax = tile_extents(key, self.cache.tile_size)
+            # Finer levels over the coarser ones shown in their place.
+            image = self.cache_axes.imshow(tile, extent=(xmin, xmax, ymin, ymax), origin='upper',
+                                           zorder=-key[0])
+            self.tile_images[key] = (image, tile)
 
     def on_key_down(self, event):
         """
@@ -259,10 +1102,18 @@ class PlotCanvas(QtCore.QObject):
         self.axes.set_aspect(1)
         self.axes.grid(True)
 
+        self.cache_axes.cla()
+        self.cache_axes.set_autoscale_on(False)
+        self.figure.add_axes(self.cache_axes)
+        self.tile_images = {}
+        self.changed_axes = []
+        self.plot_data = {}
+        self.cache.clear()
+
         # Re-draw
-        self.canvas.draw_idle()
+        self.update_screen()
 
-    def adjust_axes(self, xmin, ymin, xmax, ymax):
+    def adjust_axes(self, xmin, ymin, xmax, ymax, sync=False):
         """
         Adjusts all axes while maintaining the use of the whole canvas
         and an aspect ratio to 1:1 between x and y axes. The parameters are an original
@@ -276,6 +1127,7 @@ class PlotCanvas(QtCore.QObject):
         :type xmax: float
         :param ymax: Requested maximum value for the Y axis.
         :type ymax: float
+        :param sync: Redraw now, see update_screen().
         :return: None
         """
 
@@ -316,15 +1168,13 @@ class PlotCanvas(QtCore.QObject):
             ax.set_ylim((ymin, ymax))
             ax.set_position([x_ratio, y_ratio, 1 - 2 * x_ratio, 1 - 2 * y_ratio])
 
-        # Sync re-draw to proper paint on form resize
-        self.canvas.draw()
-
-        ##### Temporary place-holder for cached update #####
-        self.update_screen_request.emit([0, 0, 0, 0, 0])
+        self.update_screen(sync=sync)
 
     def auto_adjust_axes(self, *args):
         """
         Calls ``adjust_axes()`` using the extents of the base axes.
+        On resize events (args is the event) the canvas is
+        redrawn now to paint properly on form resize.
 
         :rtype : None
         :return: None
@@ -332,7 +1182,7 @@ class PlotCanvas(QtCore.QObject):
 
         xmin, xmax = self.axes.get_xlim()
         ymin, ymax = self.axes.get_ylim()
-        self.adjust_axes(xmin, ymin, xmax, ymax)
+        self.adjust_axes(xmin, ymin, xmax, ymax, sync=len(args) > 0)
 
     def zoom(self, factor, center=None):
         """
@@ -372,10 +1222,7 @@ class PlotCanvas(QtCore.QObject):
             ax.set_ylim((ymin, ymax))
 
         # Async re-draw
-        self.canvas.draw_idle()
-
-        ##### Temporary place-holder for cached update #####
-        self.update_screen_request.emit([0, 0, 0, 0, 0])
+        self.update_screen()
 
     def pan(self, x, y):
         xmin, xmax = self.axes.get_xlim()
@@ -389,10 +1236,7 @@ class PlotCanvas(QtCore.QObject):
             ax.set_ylim((ymin + y * height, ymax + y * height))
 
         # Re-draw
-        self.canvas.draw_idle()
-
-        ##### Temporary place-holder for cached update #####
-        self.update_screen_request.emit([0, 0, 0, 0, 0])
+        self.update_screen()
 
     def new_axes(self, name):
         """
@@ -485,10 +1329,7 @@ class PlotCanvas(QtCore.QObject):
                 a.drag_pan(1, event.key, event.x, event.y)
 
             # Async re-draw (redraws only on thread idle state, uses timer on backend)
-            self.canvas.draw_idle()
-
-            ##### Temporary place-holder for cached update #####
-            self.update_screen_request.emit([0, 0, 0, 0, 0])
+            self.update_screen()
 
     def on_draw(self, renderer):
 
@@ -524,3 +1365,14 @@ class PlotCanvas(QtCore.QObject):
         height = ymax - ymin
 
         return width / xpx, height / ypx
+
+    def get_level(self):
+        """
+        Zoom level of the view, see tile_level().
+
+        :return: Level or None if the view has no size.
+        """
+        try:
+            return tile_level(self.get_density()[0])
+        except ZeroDivisionError:
+            return None
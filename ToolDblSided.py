@@ -187,7 +187,7 @@ class DblSidedTool(FlatCAMTool):
         fcobj.options["plot"] = True;
 
         fcobj.mirror(axis, [px, py])
-        fcobj.plot()
+        self.app.replot([fcobj])
 
     def on_toggle_pointbox(self):
         if self.axis_location.get_value() == "point":
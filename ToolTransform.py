@@ -220,7 +220,7 @@ class ToolTransform(FlatCAMTool):
                     py = 0.5 * (yminimal + ymaximal)
 
                     sel_obj.rotate(-num, point=(px, py))
-                    sel_obj.plot()
+                    self.app.replot([sel_obj])
                 self.app.inform.emit('Object was rotated ...')
             except Exception as e:
                 self.app.inform.emit("[ERROR] Due of %s, rotation movement was not executed." % str(e))
@@ -267,11 +267,11 @@ class ToolTransform(FlatCAMTool):
                 for obj in obj_list:
                     if axis is 'X':
                         obj.mirror('X', [px, py])
-                        obj.plot()
+                        self.app.replot([obj])
                         self.app.inform.emit('Flipped on the Y axis ...')
                     elif axis is 'Y':
                         obj.mirror('Y', [px, py])
-                        obj.plot()
+                        self.app.replot([obj])
                         self.app.inform.emit('Flipped on the X axis ...')
 
             except Exception as e:
@@ -310,7 +310,7 @@ class ToolTransform(FlatCAMTool):
                         obj.skew(num, 0, point=(xminimal, yminimal))
                     elif axis is 'Y':
                         obj.skew(0, num, point=(xminimal, yminimal))
-                    obj.plot()
+                    self.app.replot([obj])
                 self.app.inform.emit('Object was skewed on %s axis ...' % str(axis))
             except Exception as e:
                 self.app.inform.emit("[ERROR] Due of %s, Skew action was not executed." % str(e))
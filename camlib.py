@@ -13,15 +13,14 @@ from io import StringIO
 from numpy import arctan2, Inf, array, sqrt, pi, ceil, sin, cos, dot, float32, \
     transpose
 from numpy.linalg import solve, norm
-from matplotlib.figure import Figure
 import re
 import sys
 import traceback
 from decimal import Decimal
 
 import collections
+import struct
 import numpy as np
-import matplotlib
 #import matplotlib.pyplot as plt
 #from scipy.spatial import Delaunay, KDTree
 
@@ -29,30 +28,26 @@ from rtree import index as rtindex
 
 # See: http://toblerity.org/shapely/manual.html
 from shapely.geometry import Polygon, LineString, Point, LinearRing
-from shapely.geometry import MultiPoint, MultiPolygon
+from shapely.geometry import MultiPoint, MultiPolygon, MultiLineString
 from shapely.geometry import box as shply_box
 from shapely.ops import cascaded_union, unary_union
 import shapely.affinity as affinity
 from shapely.wkt import loads as sloads
 from shapely.wkt import dumps as sdumps
+from shapely.wkb import dumps as wkb_dumps
 from shapely.geometry.base import BaseGeometry
-
-# Used for solid polygons in Matplotlib
-from descartes.patch import PolygonPatch
+from shapely.errors import EmptyPartError
+from shapely.geometry.collection import GeometryCollection
 
 import simplejson as json
 # TODO: Commented for FlatCAM packaging with cx_freeze
 #from matplotlib.pyplot import plot, subplot
 
 import xml.etree.ElementTree as ET
-from svg.path import Path, Line, Arc, CubicBezier, QuadraticBezier, parse_path
 import itertools
 
-import xml.etree.ElementTree as ET
-from svg.path import Path, Line, Arc, CubicBezier, QuadraticBezier, parse_path
-
-
-from svgparse import *
+from FlatCAMCommon import check_cancelled, TaskCancelled
+from FlatCAMProfile import stage, profiled, add_items
 
 import logging
 
@@ -66,6 +61,77 @@ handler.setFormatter(formatter)
 log.addHandler(handler)
 
 
+def PolygonPatch(polygon, **kwargs):
+    """
+    descartes.patch.PolygonPatch(), used for solid polygons in
+    Matplotlib. Imported on first use so Matplotlib is not loaded
+    when nothing is plotted, i.e. in batch mode.
+
+    :param polygon: Shapely Polygon.
+    :param kwargs: Passed to PolygonPatch.
+    :return: Matplotlib PathPatch.
+    """
+    from descartes.patch import PolygonPatch as _PolygonPatch
+    return _PolygonPatch(polygon, **kwargs)
+
+
+def polygon_paths(geometry):
+    """
+    Matplotlib paths of the polygons in geometry, one per polygon
+    with its interiors, as drawn by PolygonPatch(). For a single
+    PathCollection instead of one patch per polygon.
+
+    :param geometry: Shapely object or nested list of them.
+    :return: (List of Matplotlib Paths, number of non-polygons skipped)
+    """
+    from matplotlib.path import Path
+
+    paths = []
+    skipped = 0
+    for geo in flatten_iter(geometry):
+        if not isinstance(geo, Polygon):
+            skipped += 1
+            continue
+        if geo.is_empty:
+            continue
+
+        rings = [np.asarray(geo.exterior.coords)[:, :2]] + \
+                [np.asarray(ring.coords)[:, :2] for ring in geo.interiors]
+
+        codes = np.full(sum(len(ring) for ring in rings), Path.LINETO, dtype=Path.code_type)
+        start = 0
+        for ring in rings:
+            codes[start] = Path.MOVETO
+            start += len(ring)
+
+        paths.append(Path(np.concatenate(rings), codes))
+
+    return paths, skipped
+
+
+def line_segments(geometry):
+    """
+    Coordinates of the linear parts of geometry, polygons as their
+    exterior and interiors. For a single LineCollection instead
+    of one line per part.
+
+    :param geometry: Shapely object or nested list of them.
+    :return: (List of arrays of shape (n, 2), number of non-linear
+        parts skipped, i.e. points)
+    """
+    lines = []
+    skipped = 0
+    for geo in flatten_iter(geometry, pathonly=True):
+        if not isinstance(geo, (LineString, LinearRing)):
+            skipped += 1
+            continue
+        if geo.is_empty:
+            continue
+        lines.append(np.asarray(geo.coords)[:, :2])
+
+    return lines, skipped
+
+
 class ParseError(Exception):
     pass
 
@@ -76,7 +142,9 @@ class Geometry(object):
     """
 
     defaults = {
-        "init_units": 'in'
+        "init_units": 'in',
+        "buffer_processes": 0,    # Needs the process pool. 0 = its processes.
+        "buffer_min_items": 500   # Fewer parts are buffered in one go.
     }
 
     def __init__(self):
@@ -95,6 +163,16 @@ class Geometry(object):
         # Index
         self.index = None
 
+    def mark_changed(self):
+        """
+        Called after modifying ``self.ser_attrs`` in place.
+        Does nothing here. FlatCAMObj counts the change so the
+        object is saved and plotted again.
+
+        :return: None
+        """
+        pass
+
     def make_index(self):
         self.flatten()
         self.index = FlatCAMRTree()
@@ -117,6 +195,7 @@ class Geometry(object):
 
         if type(self.solid_geometry) is list:
             self.solid_geometry.append(Point(origin).buffer(radius))
+            self.mark_changed()
             return
 
         try:
@@ -138,6 +217,7 @@ class Geometry(object):
 
         if type(self.solid_geometry) is list:
             self.solid_geometry.append(Polygon(points))
+            self.mark_changed()
             return
 
         try:
@@ -159,6 +239,7 @@ class Geometry(object):
 
         if type(self.solid_geometry) is list:
             self.solid_geometry.append(LineString(points))
+            self.mark_changed()
             return
 
         try:
@@ -216,7 +297,15 @@ class Geometry(object):
             if len(self.solid_geometry) == 0:
                 log.debug('solid_geometry is empty []')
                 return 0, 0, 0, 0
-            return cascaded_union(self.solid_geometry).bounds
+
+            # The bounds of the union are the bounds of the
+            # bounds. No need to compute the union itself.
+            bounds = np.array([geo.bounds for geo in self.solid_geometry
+                               if not geo.is_empty]).reshape(-1, 4)
+            if len(bounds) == 0:
+                return 0, 0, 0, 0
+            return (bounds[:, 0].min(), bounds[:, 1].min(),
+                    bounds[:, 2].max(), bounds[:, 3].max())
         else:
             return self.solid_geometry.bounds
 
@@ -306,8 +395,9 @@ class Geometry(object):
         """
         Creates a list of non-iterable linear geometry objects.
         Polygons are expanded into its exterior and interiors if specified.
+        None entries are skipped.
 
-        Results are placed in self.flat_geoemtry
+        Results are placed in self.flat_geometry
 
         :param geometry: Shapely type or list or list of list of such.
         :param reset: Clears the contents of self.flat_geometry.
@@ -320,25 +410,27 @@ class Geometry(object):
         if reset:
             self.flat_geometry = []
 
-        ## If iterable, expand recursively.
-        try:
-            for geo in geometry:
-                self.flatten(geometry=geo,
-                             reset=False,
-                             pathonly=pathonly)
-
-        ## Not iterable, do the actual indexing and add.
-        except TypeError:
-            if pathonly and type(geometry) == Polygon:
-                self.flat_geometry.append(geometry.exterior)
-                self.flatten(geometry=geometry.interiors,
-                             reset=False,
-                             pathonly=True)
-            else:
-                self.flat_geometry.append(geometry)
+        self.flat_geometry.extend(flatten_iter(geometry, pathonly=pathonly))
 
         return self.flat_geometry
 
+    def flatten_packed(self, geometry=None):
+        """
+        Like flatten(pathonly=True) but packs the coordinates of
+        all the linear elements into a single array instead of
+        a list of Shapely objects.
+
+        :param geometry: Shapely type or list or list of list of such.
+            Defaults to self.solid_geometry.
+        :return: The packed paths.
+        :rtype: FlatPathBuffer
+        """
+
+        if geometry is None:
+            geometry = self.solid_geometry
+
+        return FlatPathBuffer.from_geometry(geometry)
+
     # def make2Dstorage(self):
     #
     #     self.flatten()
@@ -407,14 +499,15 @@ class Geometry(object):
     def isolation_geometry(self, offset):
         """
         Creates contours around geometry at a given
-        offset distance.
+        offset distance. Large geometry is buffered in
+        parallel tiles. See buffer_tiled().
 
         :param offset: Offset distance.
         :type offset: float
         :return: The buffered geometry.
         :rtype: Shapely.MultiPolygon or Shapely.Polygon
         """
-        return self.solid_geometry.buffer(offset)
+        return buffer_tiled(self.solid_geometry, offset)
 
     def import_svg(self, filename, flip=True):
         """
@@ -427,6 +520,9 @@ class Geometry(object):
         :return: None
         """
 
+        # svg.path is only needed here.
+        from svgparse import svgparselength, getsvggeo
+
         # Parse into list of shapely objects
         svg_tree = ET.parse(filename)
         svg_root = svg_tree.getroot()
@@ -436,7 +532,7 @@ class Geometry(object):
         geos = getsvggeo(svg_root)
 
         if flip:
-            geos = [translate(scale(g, 1.0, -1.0, origin=(0, 0)), yoff=h) for g in geos]
+            geos = [affinity.translate(affinity.scale(g, 1.0, -1.0, origin=(0, 0)), yoff=h) for g in geos]
 
         # Add to object
         if self.solid_geometry is None:
@@ -448,6 +544,7 @@ class Geometry(object):
                 self.solid_geometry += geos
             else:
                 self.solid_geometry.append(geos)
+            self.mark_changed()
         else:  # It's shapely geometry
             # self.solid_geometry = cascaded_union([self.solid_geometry,
             #                                       cascaded_union(geos)])
@@ -475,6 +572,7 @@ class Geometry(object):
         return boundary.difference(self.solid_geometry)
         
     @staticmethod
+    @profiled("paint")
     def clear_polygon(polygon, tooldia, overlap=0.15, connect=True,
                       contour=True):
         """
@@ -527,6 +625,7 @@ class Geometry(object):
                 geoms.insert(i)
 
         while True:
+            check_cancelled()
 
             # Can only result in a Polygon or MultiPolygon
             current = current.buffer(-tooldia * (1 - overlap))
@@ -555,6 +654,7 @@ class Geometry(object):
         return geoms
 
     @staticmethod
+    @profiled("paint")
     def clear_polygon2(polygon, tooldia, seedpoint=None, overlap=0.15,
                        connect=True, contour=True):
         """
@@ -598,6 +698,7 @@ class Geometry(object):
         # Grow from seed until outside the box. The polygons will
         # never have an interior, so take the exterior LinearRing.
         while 1:
+            check_cancelled()
             path = Point(seedpoint).buffer(radius).exterior
             path = path.intersection(path_margin)
 
@@ -639,6 +740,7 @@ class Geometry(object):
         return geoms
 
     @staticmethod
+    @profiled("paint")
     def clear_polygon3(polygon, tooldia, overlap=0.15, connect=True,
                        contour=True):
         """
@@ -692,6 +794,7 @@ class Geometry(object):
 
         # Add lines to storage
         for line in lines_trimmed:
+            check_cancelled()
             geoms.insert(line)
 
         # Add margin (contour) to storage
@@ -729,6 +832,7 @@ class Geometry(object):
         return
 
     @staticmethod
+    @profiled("order")
     def paint_connect(storage, boundary, tooldia, max_walk=None):
         """
         Connects paths that results in a connection segment that is
@@ -778,6 +882,7 @@ class Geometry(object):
         current_pt = geo.coords[-1]
         try:
             while True:
+                check_cancelled()
                 path_count += 1
                 #log.debug("Path %d" % path_count)
 
@@ -827,13 +932,20 @@ class Geometry(object):
         return optimized_paths
 
     @staticmethod
+    @profiled("order")
     def path_connect(storage, origin=(0, 0)):
         """
         Simplifies paths in the FlatCAMRTreeStorage storage by
         connecting paths that touch on their enpoints.
 
+        LineStrings sharing exact endpoints are linked into chains
+        (see FlatPathBuffer.link()) and the coordinates of each chain
+        are concatenated once. LinearRings and any other geometry
+        are not connected and pass through unchanged.
+
         :param storage: Storage containing the initial paths.
         :rtype storage: FlatCAMRTreeStorage
+        :param origin: Not used, kept for compatibility.
         :return: Simplified storage.
         :rtype: FlatCAMRTreeStorage
         """
@@ -843,98 +955,68 @@ class Geometry(object):
         ## Index first and last points in paths
         def get_pts(o):
             return [o.coords[0], o.coords[-1]]
-        #
-        # storage = FlatCAMRTreeStorage()
-        # storage.get_points = get_pts
-        #
-        # for shape in pathlist:
-        #     if shape is not None:  # TODO: This shouldn't have happened.
-        #         storage.insert(shape)
 
-        path_count = 0
-        pt, geo = storage.nearest(origin)
-        storage.remove(geo)
-        #optimized_geometry = [geo]
-        optimized_geometry = FlatCAMRTreeStorage()
-        optimized_geometry.get_points = get_pts
-        #optimized_geometry.insert(geo)
-        try:
-            while True:
-                path_count += 1
-
-                #print "geo is", geo
-
-                _, left = storage.nearest(geo.coords[0])
-                #print "left is", left
-
-                # If left touches geo, remove left from original
-                # storage and append to geo.
-                if type(left) == LineString:
-                    if left.coords[0] == geo.coords[0]:
-                        storage.remove(left)
-                        geo.coords = list(geo.coords)[::-1] + list(left.coords)
-                        continue
-
-                    if left.coords[-1] == geo.coords[0]:
-                        storage.remove(left)
-                        geo.coords = list(left.coords) + list(geo.coords)
-                        continue
-
-                    if left.coords[0] == geo.coords[-1]:
-                        storage.remove(left)
-                        geo.coords = list(geo.coords) + list(left.coords)
-                        continue
-
-                    if left.coords[-1] == geo.coords[-1]:
-                        storage.remove(left)
-                        geo.coords = list(geo.coords) + list(left.coords)[::-1]
-                        continue
-
-                _, right = storage.nearest(geo.coords[-1])
-                #print "right is", right
-
-                # If right touches geo, remove left from original
-                # storage and append to geo.
-                if type(right) == LineString:
-                    if right.coords[0] == geo.coords[-1]:
-                        storage.remove(right)
-                        geo.coords = list(geo.coords) + list(right.coords)
-                        continue
-
-                    if right.coords[-1] == geo.coords[-1]:
-                        storage.remove(right)
-                        geo.coords = list(geo.coords) + list(right.coords)[::-1]
-                        continue
-
-                    if right.coords[0] == geo.coords[0]:
-                        storage.remove(right)
-                        geo.coords = list(geo.coords)[::-1] + list(right.coords)
-                        continue
-
-                    if right.coords[-1] == geo.coords[0]:
-                        storage.remove(right)
-                        geo.coords = list(left.coords) + list(geo.coords)
-                        continue
+        # Output is in the order of the first piece of each
+        # path. None marks the places of the LineStrings.
+        shapes = []
+        lines = []
+        for geo in storage.get_objects():
+            if type(geo) == LineString:
+                shapes.append(None)
+                lines.append(geo)
+            else:
+                shapes.append(geo)
 
-                # right is either a LinearRing or it does not connect
-                # to geo (nothing left to connect to geo), so we continue
-                # with right as geo.
-                storage.remove(right)
+        try:
+            flat_lines = FlatPathBuffer.from_linestrings(lines)
+        except EmptyPartError:
+            log.warning("path_connect(): Dropping empty paths.")
+            empty = [geo.is_empty for geo in lines]
+            empty_iter = iter(empty)
+            shapes = [geo for geo in shapes if geo is not None or not next(empty_iter)]
+            lines = [geo for geo, e in zip(lines, empty) if not e]
+            flat_lines = FlatPathBuffer.from_linestrings(lines)
+        chains = flat_lines.link()
+
+        # Where each chain goes in the output.
+        chain_at = {}
+        for chain in chains:
+            chain_at[min(i for i, _ in chain)] = chain
+
+        line_starts = flat_lines.start_points().tolist()
+        line_ends = flat_lines.end_points().tolist()
+
+        # Connected paths and their endpoints.
+        optimized = []
+        optimized_pts = []
+        line_idx = 0
+        for geo in shapes:
+            if geo is not None:
+                optimized.append(geo)
+                optimized_pts.append(get_pts(geo))
+                continue
 
-                if type(right) == LinearRing:
-                    optimized_geometry.insert(right)
-                else:
-                    # Cannot exteng geo any further. Put it away.
-                    optimized_geometry.insert(geo)
+            chain = chain_at.get(line_idx)
+            line_idx += 1
+            if chain is None:
+                continue
 
-                    # Continue with right.
-                    geo = right
+            if len(chain) == 1:
+                # Nothing to connect, use as is.
+                i = chain[0][0]
+                optimized.append(lines[i])
+                optimized_pts.append([line_starts[i], line_ends[i]])
+            else:
+                coords = flat_lines.chain_coords(chain)
+                optimized.append(LineString(coords))
+                optimized_pts.append([coords[0].tolist(), coords[-1].tolist()])
 
-        except StopIteration:  # Nothing found in storage.
-            optimized_geometry.insert(geo)
+        log.debug("path_connect(): %d paths, %d connected." %
+                  (len(lines), len(chains)))
 
-        #print path_count
-        log.debug("path_count = %d" % path_count)
+        optimized_geometry = FlatCAMRTreeStorage()
+        optimized_geometry.get_points = get_pts
+        optimized_geometry.insert_many(optimized, points=optimized_pts)
 
         return optimized_geometry
 
@@ -1848,7 +1930,7 @@ class Gerber (Geometry):
 
             self.parse_lines(line_generator(), follow=follow)
 
-    #@profile
+    @profiled("parse")
     def parse_lines(self, glines, follow=False):
         """
         Main Gerber parser. Reads Gerber and populates ``self.paths``, ``self.apertures``,
@@ -1910,6 +1992,7 @@ class Gerber (Geometry):
         try:
             for gline in glines:
                 line_num += 1
+                check_cancelled()
 
                 ### Cleanup
                 gline = gline.strip(' \r\n')
@@ -2345,10 +2428,11 @@ class Gerber (Geometry):
                     # If added for testing of bug #83
                     # TODO: Remove when bug fixed
                     if len(poly_buffer) > 0:
-                        if current_polarity == 'D':
-                            self.solid_geometry = self.solid_geometry.union(cascaded_union(poly_buffer))
-                        else:
-                            self.solid_geometry = self.solid_geometry.difference(cascaded_union(poly_buffer))
+                        with stage("union", items=len(poly_buffer)):
+                            if current_polarity == 'D':
+                                self.solid_geometry = self.solid_geometry.union(cascaded_union(poly_buffer))
+                            else:
+                                self.solid_geometry = self.solid_geometry.difference(cascaded_union(poly_buffer))
                         poly_buffer = []
 
                     current_polarity = match.group(1)
@@ -2415,27 +2499,34 @@ class Gerber (Geometry):
                 if not geo.is_empty:
                     poly_buffer.append(geo)
 
+            add_items(line_num)
+
             # --- Apply buffer ---
             if follow:
                 self.solid_geometry = poly_buffer
                 return
 
             log.warn("Joining %d polygons." % len(poly_buffer))
-            if self.use_buffer_for_union:
-                log.debug("Union by buffer...")
-                new_poly = MultiPolygon(poly_buffer)
-                new_poly = new_poly.buffer(0.00000001)
-                new_poly = new_poly.buffer(-0.00000001)
-                log.warn("Union(buffer) done.")
-            else:
-                log.debug("Union by union()...")
-                new_poly = cascaded_union(poly_buffer)
-                new_poly = new_poly.buffer(0)
-                log.warn("Union done.")
-            if current_polarity == 'D':
-                self.solid_geometry = self.solid_geometry.union(new_poly)
-            else:
-                self.solid_geometry = self.solid_geometry.difference(new_poly)
+            with stage("union", items=len(poly_buffer)):
+                if self.use_buffer_for_union:
+                    log.debug("Union by buffer...")
+                    new_poly = MultiPolygon(poly_buffer)
+                    new_poly = new_poly.buffer(0.00000001)
+                    new_poly = new_poly.buffer(-0.00000001)
+                    log.warn("Union(buffer) done.")
+                else:
+                    log.debug("Union by union()...")
+                    new_poly = cascaded_union(poly_buffer)
+                    new_poly = new_poly.buffer(0)
+                    log.warn("Union done.")
+                if current_polarity == 'D':
+                    self.solid_geometry = self.solid_geometry.union(new_poly)
+                else:
+                    self.solid_geometry = self.solid_geometry.difference(new_poly)
+
+        except TaskCancelled:
+            log.debug("Parsing cancelled at line %d." % line_num)
+            raise
 
         except Exception as err:
             ex_type, ex, tb = sys.exc_info()
@@ -2685,6 +2776,7 @@ class Excellon(Geometry):
         efile.close()
         self.parse_lines(estr)
 
+    @profiled("parse")
     def parse_lines(self, elines):
         """
         Main Excellon parser.
@@ -2876,11 +2968,12 @@ class Excellon(Geometry):
         """
         self.solid_geometry = []
 
-        for drill in self.drills:
-            # poly = drill['point'].buffer(self.tools[drill['tool']]["C"]/2.0)
-            tooldia = self.tools[drill['tool']]['C']
-            poly = drill['point'].buffer(tooldia / 2.0)
-            self.solid_geometry.append(poly)
+        with stage("buffer", items=len(self.drills)):
+            for drill in self.drills:
+                # poly = drill['point'].buffer(self.tools[drill['tool']]["C"]/2.0)
+                tooldia = self.tools[drill['tool']]['C']
+                poly = drill['point'].buffer(tooldia / 2.0)
+                self.solid_geometry.append(poly)
 
     def scale(self, factor):
         """
@@ -3079,6 +3172,7 @@ class CNCjob(Geometry):
 
         return factor
 
+    @profiled("emit")
     def generate_from_excellon_by_tool(self, exobj, tools="all",
                                        toolchange=False, toolchangez=0.1):
         """
@@ -3209,26 +3303,6 @@ class CNCjob(Geometry):
 
         log.debug("generate_from_geometry_2()")
 
-        ## Flatten the geometry
-        # Only linear elements (no polygons) remain.
-        flat_geometry = geometry.flatten(pathonly=True)
-        log.debug("%d paths" % len(flat_geometry))
-
-        ## Index first and last points in paths
-        # What points to index.
-        def get_pts(o):
-            return [o.coords[0], o.coords[-1]]
-
-        # Create the indexed storage.
-        storage = FlatCAMRTreeStorage()
-        storage.get_points = get_pts
-
-        # Store the geometry
-        log.debug("Indexing geometry before generating G-Code...")
-        for shape in flat_geometry:
-            if shape is not None:  # TODO: This shouldn't have happened.
-                storage.insert(shape)
-
         if tooldia is not None:
             self.tooldia = tooldia
 
@@ -3237,123 +3311,257 @@ class CNCjob(Geometry):
         if not append:
             self.gcode = ""
 
-        # Initial G-Code
-        self.gcode = self.unitcode[self.units.upper()] + "\n"
-        self.gcode += self.absolutecode + "\n"
-        self.gcode += self.feedminutecode + "\n"
-        self.gcode += "F%.2f\n" % self.feedrate
-        self.gcode += "G00 Z%.4f\n" % self.z_move  # Move (up) to travel height
-        if self.spindlespeed is not None:
-            self.gcode += "M03 S%d\n" % int(self.spindlespeed)  # Spindle start with configured speed
-        else:
-            self.gcode += "M03\n"  # Spindle start
-        #self.gcode += self.pausecode + "\n"
+        self.gcode = self.gcode_header()
 
         ## Iterate over geometry paths getting the nearest each time.
         log.debug("Starting G-Code...")
         path_count = 0
+        depths = self.cut_depths(multidepth, depthpercut)
+        with stage("emit") as emit:
+            for kind, coords in self.nearest_paths(geometry, passes=len(depths)):
+                path_count += 1
+                self.gcode += self.path2gcode(kind, coords, tolerance=tolerance,
+                                              multidepth=multidepth, depthpercut=depthpercut)
+            emit.add(path_count)
+
+        log.debug("%s paths traced." % path_count)
+
+        self.gcode += self.gcode_footer()
+
+    def generate_from_instances(self,
+                                geometry,
+                                offsets,
+                                tooldia=None,
+                                tolerance=0,
+                                multidepth=False,
+                                depthpercut=None):
+        """
+        Like generate_from_geometry_2(), for copies of geometry
+        placed at offsets, i.e. the cells of a panel. The paths
+        are ordered once, for geometry, and the same toolpath is
+        repeated in every cell. Cells are visited row by row,
+        alternating the direction. See order_offsets().
+
+        :param geometry: The geometry of one copy.
+        :param offsets: List of (x, y), one per copy.
+        :param tooldia:
+        :param tolerance:
+        :param multidepth: If True, use multiple passes to reach
+           the desired depth.
+        :param depthpercut: Maximum depth in each pass.
+        :return: None
+        """
+        assert isinstance(geometry, Geometry), \
+            "Expected a Geometry, got %s" % type(geometry)
+
+        log.debug("generate_from_instances()")
+
+        if tooldia is not None:
+            self.tooldia = tooldia
+
+        depths = self.cut_depths(multidepth, depthpercut)
+        paths = list(self.nearest_paths(geometry, passes=len(depths)))
+
+        self.gcode = self.gcode_header()
+
+        with stage("emit") as emit:
+            for dx, dy in order_offsets(offsets):
+                check_cancelled()
+                for kind, coords in paths:
+                    self.gcode += self.path2gcode(kind, coords + (dx, dy), tolerance=tolerance,
+                                                  multidepth=multidepth, depthpercut=depthpercut)
+                emit.add(len(paths))
+
+        log.debug("%d paths traced in %d copies." % (len(paths), len(offsets)))
+
+        self.gcode += self.gcode_footer()
+
+    def gcode_header(self):
+        """
+        :return: G-Code before the first path: units, feedrate,
+            travel height and spindle start.
+        :rtype: str
+        """
+        gcode = self.unitcode[self.units.upper()] + "\n"
+        gcode += self.absolutecode + "\n"
+        gcode += self.feedminutecode + "\n"
+        gcode += "F%.2f\n" % self.feedrate
+        gcode += "G00 Z%.4f\n" % self.z_move  # Move (up) to travel height
+        if self.spindlespeed is not None:
+            gcode += "M03 S%d\n" % int(self.spindlespeed)  # Spindle start with configured speed
+        else:
+            gcode += "M03\n"  # Spindle start
+        #gcode += self.pausecode + "\n"
+        return gcode
+
+    def gcode_footer(self):
+        """
+        :return: G-Code after the last path: tool up, back to
+            the origin and spindle stop.
+        :rtype: str
+        """
+        gcode = "G00 Z%.4f\n" % self.z_move  # Stop cutting
+        gcode += "G00 X0Y0\n"
+        gcode += "M05\n"  # Spindle stop
+        return gcode
+
+    def nearest_paths(self, geometry, passes=1):
+        """
+        Paths of the geometry in the order they are cut: starting
+        at the origin, the nearest path to where the tool left the
+        previous one, reversed if its end is closer.
+
+        :param geometry: Geometry
+        :param passes: Passes per path, as in path2gcode(). After
+            an even number of them the tool is back at the start
+            of a LINESTRING.
+        :return: Generator of (kind, coords), kind as in
+            FlatPathBuffer, coords a Numpy array of (x, y).
+        """
+        ## Flatten the geometry
+        # Only linear elements (no polygons) remain, packed
+        # into a single coordinate array.
+        flat_paths = geometry.flatten_packed()
+        log.debug("%d paths" % len(flat_paths))
+
+        ## Index first and last points in paths
+        starts = [tuple(pt) for pt in flat_paths.start_points().tolist()]
+        ends = [tuple(pt) for pt in flat_paths.end_points().tolist()]
+
+        # Paths are stored by their index in flat_paths.
+        storage = FlatCAMRTree()
+        storage.get_points = lambda i: (starts[i], ends[i])
+
+        log.debug("Indexing geometry before generating G-Code...")
+        with stage("index", items=len(flat_paths)):
+            for i in range(len(flat_paths)):
+                storage.insert(i, i)
+
         current_pt = (0, 0)
-        pt, geo = storage.nearest(current_pt)
         try:
+            hit = storage.nearest(current_pt)
             while True:
-                path_count += 1
+                check_cancelled()
                 #print "Current: ", "(%.3f, %.3f)" % current_pt
 
-                # Remove before modifying, otherwise
-                # deletion will fail.
-                storage.remove(geo)
+                idx = hit.object
+                pt = (hit.bbox[0], hit.bbox[1])
+                storage.remove_obj(idx, idx)
+
+                coords = flat_paths.get_coords(idx)
 
                 # If last point in geometry is the nearest
                 # but prefer the first one if last point == first point
                 # then reverse coordinates.
-                if pt != geo.coords[0] and pt == geo.coords[-1]:
-                    geo.coords = list(geo.coords)[::-1]
-
-                #---------- Single depth/pass --------
-                if not multidepth:
-                    # G-code
-                    # Note: self.linear2gcode() and self.point2gcode() will
-                    # lower and raise the tool every time.
-                    if type(geo) == LineString or type(geo) == LinearRing:
-                        self.gcode += self.linear2gcode(geo, tolerance=tolerance)
-                    elif type(geo) == Point:
-                        self.gcode += self.point2gcode(geo)
-                    else:
-                        log.warning("G-code generation not implemented for %s" % (str(type(geo))))
+                if pt != starts[idx] and pt == ends[idx]:
+                    coords = coords[::-1]
+
+                kind = flat_paths.kinds[idx]
+                yield kind, coords
 
-                #--------- Multi-pass ---------
+                # Did deletion at the beginning.
+                # Update current location and continue.
+                if kind == FlatPathBuffer.LINESTRING and passes > 0 and passes % 2 == 0:
+                    current_pt = tuple(coords[0])
                 else:
-                    if isinstance(self.z_cut, Decimal):
-                        z_cut = self.z_cut
-                    else:
-                        z_cut = Decimal(self.z_cut).quantize(Decimal('0.000000001'))
-
-                    if depthpercut is None:
-                        depthpercut = z_cut
-                    elif not isinstance(depthpercut, Decimal):
-                        depthpercut = Decimal(depthpercut).quantize(Decimal('0.000000001'))
-
-                    depth = 0
-                    reverse = False
-                    while depth > z_cut:
-
-                        # Increase depth. Limit to z_cut.
-                        depth -= depthpercut
-                        if depth < z_cut:
-                            depth = z_cut
-
-                        # Cut at specific depth and do not lift the tool.
-                        # Note: linear2gcode() will use G00 to move to the
-                        # first point in the path, but it should be already
-                        # at the first point if the tool is down (in the material).
-                        # So, an extra G00 should show up but is inconsequential.
-                        if type(geo) == LineString or type(geo) == LinearRing:
-                            self.gcode += self.linear2gcode(geo, tolerance=tolerance,
-                                                            zcut=depth,
-                                                            up=False)
-
-                        # Ignore multi-pass for points.
-                        elif type(geo) == Point:
-                            self.gcode += self.point2gcode(geo)
-                            break  # Ignoring ...
+                    current_pt = tuple(coords[-1])
 
-                        else:
-                            log.warning("G-code generation not implemented for %s" % (str(type(geo))))
+                # Next
+                hit = storage.nearest(current_pt)
 
-                        # Reverse coordinates if not a loop so we can continue
-                        # cutting without returning to the beginning.
-                        if type(geo) == LineString:
-                            geo.coords = list(geo.coords)[::-1]
-                            reverse = True
+        except StopIteration:  # Nothing found in storage.
+            pass
 
-                    # If geometry is reversed, revert.
-                    if reverse:
-                        if type(geo) == LineString:
-                            geo.coords = list(geo.coords)[::-1]
+    def cut_depths(self, multidepth=False, depthpercut=None):
+        """
+        Depths of the passes that cut a path.
 
-                    # Lift the tool
-                    self.gcode += "G00 Z%.4f\n" % self.z_move
-                    # self.gcode += "( End of path. )\n"
+        :param multidepth: If True, use multiple passes to reach
+           the desired depth.
+        :param depthpercut: Maximum depth in each pass.
+        :return: List of depths, Decimal. Only self.z_cut if
+            not multidepth.
+        """
+        if not multidepth:
+            return [self.z_cut]
 
-                # Did deletion at the beginning.
-                # Delete from index, update current location and continue.
-                #rti.delete(hits[0], geo.coords[0])
-                #rti.delete(hits[0], geo.coords[-1])
+        if isinstance(self.z_cut, Decimal):
+            z_cut = self.z_cut
+        else:
+            z_cut = Decimal(self.z_cut).quantize(Decimal('0.000000001'))
 
-                current_pt = geo.coords[-1]
+        if depthpercut is None:
+            depthpercut = z_cut
+        elif not isinstance(depthpercut, Decimal):
+            depthpercut = Decimal(depthpercut).quantize(Decimal('0.000000001'))
 
-                # Next
-                pt, geo = storage.nearest(current_pt)
+        depths = []
+        depth = 0
+        while depth > z_cut:
 
-        except StopIteration:  # Nothing found in storage.
-            pass
+            # Increase depth. Limit to z_cut.
+            depth -= depthpercut
+            if depth < z_cut:
+                depth = z_cut
+            depths.append(depth)
 
-        log.debug("%s paths traced." % path_count)
+        return depths
 
-        # Finish
-        self.gcode += "G00 Z%.4f\n" % self.z_move  # Stop cutting
-        self.gcode += "G00 X0Y0\n"
-        self.gcode += "M05\n"  # Spindle stop
+    def path2gcode(self, kind, coords, tolerance=0, multidepth=False, depthpercut=None):
+        """
+        G-Code to cut a path.
+
+        :param kind: FlatPathBuffer.LINESTRING, LINEARRING or POINT.
+        :param coords: Coordinates of the path.
+        :param tolerance: See linear2gcode().
+        :param multidepth: If True, use multiple passes to reach
+           the desired depth.
+        :param depthpercut: Maximum depth in each pass.
+        :return: G-Code.
+        :rtype: str
+        """
+        linear_kinds = (FlatPathBuffer.LINESTRING, FlatPathBuffer.LINEARRING)
+
+        #---------- Single depth/pass --------
+        if not multidepth:
+            # G-code
+            # Note: self.linear2gcode() and self.point2gcode() will
+            # lower and raise the tool every time.
+            if kind in linear_kinds:
+                return self.linear2gcode(coords, tolerance=tolerance)
+            else:
+                return self.point2gcode(coords)
+
+        #--------- Multi-pass ---------
+        gcode = ""
+
+        for depth in self.cut_depths(multidepth, depthpercut):
+
+            # Cut at specific depth and do not lift the tool.
+            # Note: linear2gcode() will use G00 to move to the
+            # first point in the path, but it should be already
+            # at the first point if the tool is down (in the material).
+            # So, an extra G00 should show up but is inconsequential.
+            if kind in linear_kinds:
+                gcode += self.linear2gcode(coords, tolerance=tolerance,
+                                           zcut=depth,
+                                           up=False)
+
+            # Ignore multi-pass for points.
+            else:
+                gcode += self.point2gcode(coords)
+                break  # Ignoring ...
+
+            # Reverse coordinates if not a loop so we can continue
+            # cutting without returning to the beginning.
+            if kind == FlatPathBuffer.LINESTRING:
+                coords = coords[::-1]
+
+        # Lift the tool
+        gcode += "G00 Z%.4f\n" % self.z_move
+        # gcode += "( End of path. )\n"
+
+        return gcode
 
     @staticmethod
     def codes_split(gline):
@@ -3375,6 +3583,7 @@ class CNCjob(Geometry):
 
         return command
 
+    @profiled("parse")
     def gcode_parse(self):
         """
         G-Code parser (from self.gcode). Generates dictionary with
@@ -3542,7 +3751,8 @@ class CNCjob(Geometry):
         
     def create_geometry(self):
         # TODO: This takes forever. Too much data?
-        self.solid_geometry = cascaded_union([geo['geom'] for geo in self.gcode_parsed])
+        with stage("union", items=len(self.gcode_parsed)):
+            self.solid_geometry = cascaded_union([geo['geom'] for geo in self.gcode_parsed])
 
     def linear2gcode(self, linear, tolerance=0, down=True, up=True,
                      zcut=None, ztravel=None, downrate=None,
@@ -3551,7 +3761,8 @@ class CNCjob(Geometry):
         Generates G-code to cut along the linear feature.
 
         :param linear: The path to cut along.
-        :type: Shapely.LinearRing or Shapely.Linear String
+        :type: Shapely.LinearRing, Shapely.Linear String or
+            array of coordinates.
         :param tolerance: All points in the simplified object will be within the
             tolerance distance of the original geometry.
         :type tolerance: float
@@ -3575,13 +3786,18 @@ class CNCjob(Geometry):
 
         # Simplify paths?
         if tolerance > 0:
+            if not isinstance(linear, BaseGeometry):
+                linear = LineString(linear)
             target_linear = linear.simplify(tolerance)
         else:
             target_linear = linear
 
         gcode = ""
 
-        path = list(target_linear.coords)
+        if isinstance(target_linear, BaseGeometry):
+            path = list(target_linear.coords)
+        else:
+            path = np.asarray(target_linear).tolist()
 
         # Move fast to 1st point
         if not cont:
@@ -3611,7 +3827,10 @@ class CNCjob(Geometry):
         gcode = ""
         #t = "G0%d X%.4fY%.4f\n"
         t = "G0%d " + CNCjob.defaults["coordinate_format"] + "\n"
-        path = list(point.coords)
+        if isinstance(point, BaseGeometry):
+            path = list(point.coords)
+        else:
+            path = np.asarray(point).tolist()
         gcode += t % (0, path[0][0], path[0][1])  # Move to first point
 
         if self.zdownrate is not None:
@@ -4245,6 +4464,552 @@ def distance(pt1, pt2):
     return sqrt((pt1[0] - pt2[0]) ** 2 + (pt1[1] - pt2[1]) ** 2)
 
 
+def flatten_iter(geometry, pathonly=False):
+    """
+    Iterates over the non-iterable geometry objects in a
+    geometry that can be a nested list of Shapely objects,
+    including multi-part ones, in depth-first order. Uses an
+    explicit stack so nesting depth is not limited by recursion.
+    None entries are skipped.
+
+    :param geometry: Shapely type or list or list of list of such.
+    :param pathonly: Expands polygons into their exterior and interiors.
+    :return: Generator of Shapely geometry.
+    """
+    stack = [iter((geometry,))]
+    while stack:
+        for geo in stack[-1]:
+            if geo is None:
+                continue
+
+            if isinstance(geo, Polygon):
+                if pathonly:
+                    yield geo.exterior
+                    stack.append(iter(geo.interiors))
+                    break
+                yield geo
+                continue
+
+            if isinstance(geo, BaseGeometry):
+                if hasattr(geo, 'geoms'):
+                    stack.append(iter(geo.geoms))
+                    break
+                yield geo
+                continue
+
+            ## If iterable, expand
+            try:
+                stack.append(iter(geo))
+                break
+            except TypeError:
+                yield geo
+        else:
+            stack.pop()
+
+
+def translate_nested(geometry, dx, dy):
+    """
+    Translates geometry that can be a nested list of Shapely
+    objects, keeping the nesting. None entries are kept.
+
+    :param geometry: Shapely type or list or list of list of such.
+    :param dx: Offset in X.
+    :param dy: Offset in Y.
+    :return: Translated copy.
+    """
+    if geometry is None:
+        return None
+
+    if isinstance(geometry, list):
+        return [translate_nested(geo, dx, dy) for geo in geometry]
+
+    return affinity.translate(geometry, xoff=dx, yoff=dy)
+
+
+def panel_offsets(rows, columns, dx, dy):
+    """
+    Offsets of the cells of a rectangular panel, row by row
+    from the bottom left.
+
+    :param rows: Number of rows.
+    :param columns: Number of columns.
+    :param dx: Distance between columns.
+    :param dy: Distance between rows.
+    :return: List of (x, y).
+    """
+    return [(col * dx, row * dy) for row in range(rows) for col in range(columns)]
+
+
+def order_offsets(offsets):
+    """
+    Order in which to visit the cells of a panel: row by row
+    from the bottom, left to right and right to left in
+    alternate rows.
+
+    :param offsets: List of (x, y).
+    :return: Sorted list of (x, y).
+    """
+    rows = {}
+    for dx, dy in offsets:
+        rows.setdefault(dy, []).append((dx, dy))
+
+    ordered = []
+    for i, dy in enumerate(sorted(rows)):
+        ordered += sorted(rows[dy], reverse=(i % 2 == 1))
+    return ordered
+
+
+class FlatPathBuffer(object):
+    """
+    Linear geometry (paths) packed into a single coordinate array.
+    Path i has kinds[i] and coordinates
+    coords[offsets[i]:offsets[i + 1]].
+    """
+
+    LINESTRING = 0
+    LINEARRING = 1
+    POINT = 2
+
+    def __init__(self, coords, offsets, kinds):
+        """
+        :param coords: Coordinates of all paths.
+        :type coords: numpy.ndarray, shape (N, 2)
+        :param offsets: Index of the first point of each path and
+            total number of points at the end.
+        :type offsets: numpy.ndarray, shape (M + 1,)
+        :param kinds: Type of each path, one of LINESTRING,
+            LINEARRING or POINT.
+        :type kinds: numpy.ndarray, shape (M,)
+        """
+        self.coords = coords
+        self.offsets = offsets
+        self.kinds = kinds
+
+    @classmethod
+    def from_geometry(cls, geometry):
+        """
+        Flattens geometry (see flatten_iter()) into a FlatPathBuffer.
+        Polygons are expanded into their exterior and interiors.
+        Empty elements are skipped.
+
+        :param geometry: Shapely type or list or list of list of such.
+        :return: The packed paths.
+        :rtype: FlatPathBuffer
+        """
+        arrays = []
+        kinds = []
+
+        for geo in flatten_iter(geometry, pathonly=True):
+            if isinstance(geo, LinearRing):
+                kind = cls.LINEARRING
+            elif isinstance(geo, LineString):
+                kind = cls.LINESTRING
+            elif isinstance(geo, Point):
+                kind = cls.POINT
+            else:
+                log.warning("Cannot pack %s as a path." % str(type(geo)))
+                continue
+
+            if geo.is_empty:
+                continue
+
+            arrays.append(np.asarray(geo.coords)[:, :2])
+            kinds.append(kind)
+
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        if arrays:
+            np.cumsum([len(a) for a in arrays], out=offsets[1:])
+            coords = np.concatenate(arrays).astype(np.float64)
+        else:
+            coords = np.zeros((0, 2), dtype=np.float64)
+
+        return cls(coords, offsets, np.array(kinds, dtype=np.int8))
+
+    @classmethod
+    def from_linestrings(cls, lines):
+        """
+        Packs a list of non-empty LineStrings. Reads all the
+        coordinates through a single WKB dump instead of one
+        coordinate sequence per object, which is much faster
+        for large numbers of small paths.
+
+        :param lines: List of Shapely.LineString
+        :return: The packed paths.
+        :rtype: FlatPathBuffer
+        """
+        if not lines:
+            return cls(np.zeros((0, 2), dtype=np.float64),
+                       np.zeros(1, dtype=np.int64),
+                       np.zeros(0, dtype=np.int8))
+
+        data = wkb_dumps(MultiLineString(lines), output_dimension=2)
+        endian = '<' if data[0] == 1 else '>'
+        header = struct.Struct(endian + 'I')
+
+        # Layout: MultiLineString header (byte order, type, count)
+        # then each LineString: byte order, type, count, x, y, x, y...
+        counts = np.empty(len(lines), dtype=np.int64)
+        starts = np.empty(len(lines), dtype=np.int64)
+        pos = 9
+        for i in range(len(lines)):
+            npts = header.unpack_from(data, pos + 5)[0]
+            counts[i] = npts
+            starts[i] = pos + 9
+            pos += 9 + 16 * npts
+
+        # Drop the headers, keep the coordinate bytes.
+        raw = np.frombuffer(data, dtype=np.uint8)
+        mask = np.ones(len(raw), dtype=bool)
+        mask[:9] = False
+        mask[(starts[:, None] - 9 + np.arange(9)).ravel()] = False
+        coords = raw[mask].view(endian + 'f8').astype(np.float64).reshape(-1, 2)
+
+        offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        return cls(coords, offsets,
+                   np.full(len(lines), cls.LINESTRING, dtype=np.int8))
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def get_coords(self, i):
+        """
+        Coordinates of the i-th path. This is a view into
+        self.coords, not a copy.
+
+        :param i: Index of the path.
+        :return: Array of shape (n, 2)
+        """
+        return self.coords[self.offsets[i]:self.offsets[i + 1]]
+
+    def get_geometry(self, i):
+        """
+        Creates a Shapely object for the i-th path.
+
+        :param i: Index of the path.
+        :return: Shapely.LineString, Shapely.LinearRing or Shapely.Point
+        """
+        kind = self.kinds[i]
+        coords = self.get_coords(i)
+        if kind == self.LINEARRING:
+            return LinearRing(coords)
+        if kind == self.POINT:
+            return Point(coords[0])
+        return LineString(coords)
+
+    def start_points(self):
+        """
+        :return: First point of every path.
+        :rtype: numpy.ndarray, shape (M, 2)
+        """
+        return self.coords[self.offsets[:-1]]
+
+    def end_points(self):
+        """
+        :return: Last point of every path.
+        :rtype: numpy.ndarray, shape (M, 2)
+        """
+        return self.coords[self.offsets[1:] - 1]
+
+    def link(self):
+        """
+        Finds chains of paths that touch exactly on their endpoints.
+        Equal endpoints are found at once by sorting, then chains are
+        grown in both directions from each path not yet used.
+
+        :return: List of chains, in the order of their first path.
+            Each chain is a list of (path index, reversed) tuples.
+        :rtype: list
+        """
+        npaths = len(self)
+        if npaths == 0:
+            return []
+
+        # Endpoint 2 * i is the start of path i, 2 * i + 1 its end.
+        # Adding 0.0 turns -0.0 into 0.0 so they compare equal.
+        endpoints = np.empty((2 * npaths, 2), dtype=np.float64)
+        endpoints[0::2] = self.start_points()
+        endpoints[1::2] = self.end_points()
+        endpoints += 0.0
+
+        # Same node id for equal points. Viewing (x, y) as a
+        # complex number is much faster than np.unique(axis=0).
+        _, node = np.unique(endpoints.view(np.complex128).ravel(),
+                            return_inverse=True)
+        order = np.argsort(node, kind='stable')
+        bounds = np.searchsorted(node[order], np.arange(node.max() + 2))
+
+        node = node.tolist()
+        order = order.tolist()
+        nextpos = bounds[:-1].tolist()
+        endpos = bounds[1:].tolist()
+        used = bytearray(npaths)
+
+        def take(nd):
+            """
+            Marks as used and returns the next unused endpoint
+            at node nd or None.
+            """
+            p = nextpos[nd]
+            stop = endpos[nd]
+            while p < stop:
+                key = order[p]
+                p += 1
+                if not used[key >> 1]:
+                    used[key >> 1] = 1
+                    nextpos[nd] = p
+                    return key
+            nextpos[nd] = p
+            return None
+
+        chains = []
+        for i in range(npaths):
+            if used[i]:
+                continue
+            used[i] = 1
+
+            # Forward from the end of path i.
+            forward = [(i, False)]
+            key = take(node[2 * i + 1])
+            while key is not None:
+                j = key >> 1
+                if key & 1:  # Touches at its end
+                    forward.append((j, True))
+                    key = take(node[2 * j])
+                else:
+                    forward.append((j, False))
+                    key = take(node[2 * j + 1])
+
+            # Backward from the start of path i.
+            backward = []
+            key = take(node[2 * i])
+            while key is not None:
+                j = key >> 1
+                if key & 1:
+                    backward.append((j, False))
+                    key = take(node[2 * j])
+                else:
+                    backward.append((j, True))
+                    key = take(node[2 * j + 1])
+
+            backward.reverse()
+            chains.append(backward + forward)
+
+        return chains
+
+    def chain_coords(self, chain):
+        """
+        Concatenates the coordinates of a chain of paths
+        as returned by link(). Points shared by consecutive
+        paths are included only once.
+
+        :param chain: List of (path index, reversed) tuples.
+        :return: Array of shape (n, 2)
+        """
+        idx = np.array([i for i, _ in chain], dtype=np.int64)
+        rev = np.array([r for _, r in chain], dtype=bool)
+        first = self.offsets[idx]
+        last = self.offsets[idx + 1] - 1
+
+        # All points of the first path, all but the first
+        # point of the others.
+        skip = np.ones(len(chain), dtype=np.int64)
+        skip[0] = 0
+        counts = last - first + 1 - skip
+
+        piece = np.repeat(np.arange(len(chain)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + \
+            skip[piece]
+
+        return self.coords[np.where(rev[piece], last[piece] - local, first[piece] + local)]
+
+
+def geometry_parts(geometry):
+    """
+    Iterates over the single-part, non-empty geometries in
+    a geometry that can be a nested list of Shapely objects,
+    including multi-part ones.
+
+    :param geometry: Shapely geometry or (nested) list of them.
+    :return: Generator of Shapely geometry.
+    """
+    stack = [geometry]
+    while stack:
+        geo = stack.pop()
+        if geo is None:
+            continue
+        if isinstance(geo, BaseGeometry) and hasattr(geo, 'geoms'):
+            stack.extend(reversed(list(geo.geoms)))
+        elif isinstance(geo, BaseGeometry):
+            if not geo.is_empty:
+                yield geo
+        else:
+            stack.extend(reversed(list(geo)))
+
+
+def _buffer_tile(parts, offset, box):
+    """
+    Job for buffer_tiled(), runs in a worker process.
+    Buffers the geometry in a tile and sorts the resulting
+    polygons into those strictly inside the tile's box and
+    those touching or crossing its border.
+
+    :param parts: List of Shapely objects in the tile.
+    :param offset: Buffer distance.
+    :param box: The tile, (xmin, ymin, xmax, ymax).
+    :return: (List of Polygons inside, List of Polygons on the border)
+    """
+    xmin, ymin, xmax, ymax = box
+
+    geo = GeometryCollection(parts).buffer(offset)
+
+    inside = []
+    border = []
+    for poly in geometry_parts(geo):
+        pxmin, pymin, pxmax, pymax = poly.bounds
+        if pxmin > xmin and pymin > ymin and pxmax < xmax and pymax < ymax:
+            inside.append(poly)
+        else:
+            border.append(poly)
+
+    return inside, border
+
+
+@profiled("buffer")
+def buffer_tiled(geometry, offset, processes=None, min_items=None,
+                 tiles_per_process=4, executor=None):
+    """
+    Buffers geometry by splitting it into a grid of spatial tiles,
+    buffering the tiles in the process pool of FlatCAMParallel and
+    stitching the results.
+
+    Parts are assigned to a tile by the center of their bounding box
+    so the buffered tiles overlap. Polygons that stay strictly inside
+    their tile cannot touch any other tile's result and are kept as
+    they are. Only those crossing a tile border, and whatever they
+    touch, are merged again. The result is the same as
+    geometry.buffer(offset) since a positive buffer of a union is the
+    union of the buffers.
+
+    Negative or zero offsets, geometry with few parts, single
+    process runs and runs without an executor while the pool is
+    disabled fall back to a plain buffer.
+
+    :param geometry: Shapely geometry or (nested) list of them.
+    :param offset: Buffer distance.
+    :type offset: float
+    :param processes: Number of processes the tiles are made for.
+        None uses Geometry.defaults["buffer_processes"], 0 those in
+        the pool.
+    :param min_items: Minimum number of parts worth tiling. None
+        uses Geometry.defaults["buffer_min_items"].
+    :param tiles_per_process: Tiles to create per process. More tiles
+        balance the load better but create longer borders.
+    :param executor: concurrent.futures.Executor to run the tiles on.
+        The process pool if None.
+    :return: The buffered geometry.
+    :rtype: Shapely.MultiPolygon or Shapely.Polygon
+    """
+
+    # Here to avoid a circular import.
+    import FlatCAMParallel
+
+    if processes is None:
+        processes = Geometry.defaults["buffer_processes"]
+    if not processes:
+        processes = FlatCAMParallel.defaults["worker_processes"]
+    if min_items is None:
+        min_items = Geometry.defaults["buffer_min_items"]
+
+    # The tiles would be buffered one after the other.
+    if executor is None and not FlatCAMParallel.enabled():
+        processes = 1
+
+    if isinstance(geometry, BaseGeometry) and (offset <= 0 or processes < 2):
+        return geometry.buffer(offset)
+
+    parts = list(geometry_parts(geometry))
+
+    if offset <= 0 or processes < 2 or len(parts) < max(min_items, 2):
+        if isinstance(geometry, BaseGeometry):
+            return geometry.buffer(offset)
+        return GeometryCollection(parts).buffer(offset)
+
+    log.debug("buffer_tiled(): %d parts, %d processes." % (len(parts), processes))
+
+    ## Grid
+    bounds = array([part.bounds for part in parts])
+    cx = (bounds[:, 0] + bounds[:, 2]) / 2.0
+    cy = (bounds[:, 1] + bounds[:, 3]) / 2.0
+    xmin, xmax = cx.min(), cx.max()
+    ymin, ymax = cy.min(), cy.max()
+    width = max(xmax - xmin, 1e-9)
+    height = max(ymax - ymin, 1e-9)
+
+    ntiles = max(processes * tiles_per_process, 2)
+    nx = int(max(1, min(ntiles, round(sqrt(ntiles * width / height)))))
+    ny = int(max(1, ceil(ntiles / float(nx))))
+    dx = width / nx
+    dy = height / ny
+
+    ix = np.clip(((cx - xmin) / dx).astype(int), 0, nx - 1)
+    iy = np.clip(((cy - ymin) / dy).astype(int), 0, ny - 1)
+    tile_ids = iy * nx + ix
+
+    ## Jobs. The outermost tiles extend past anything the
+    ## buffer can reach so parts never fall outside of their
+    ## own tile. Not to infinity, jobs' arguments are JSON.
+    tiles = collections.defaultdict(list)
+    for i, tid in enumerate(tile_ids):
+        tiles[tid].append(parts[i])
+
+    margin = abs(offset) + 1.0
+    outer = (bounds[:, 0].min() - margin, bounds[:, 1].min() - margin,
+             bounds[:, 2].max() + margin, bounds[:, 3].max() + margin)
+
+    jobs = []
+    for tid, tile_parts in tiles.items():
+        i, j = tid % nx, tid // nx
+        box = (xmin + i * dx if i > 0 else outer[0],
+               ymin + j * dy if j > 0 else outer[1],
+               xmin + (i + 1) * dx if i < nx - 1 else outer[2],
+               ymin + (j + 1) * dy if j < ny - 1 else outer[3])
+        jobs.append([tile_parts, offset, box])
+
+    # Queued tiles are dropped if cancelled.
+    if executor is None:
+        results = FlatCAMParallel.run_many(_buffer_tile, jobs)
+    else:
+        results = []
+        for result in executor.map(_buffer_tile, *zip(*jobs)):
+            check_cancelled()
+            results.append(result)
+
+    ## Stitch
+    inside = [poly for result in results for poly in result[0]]
+    border = [poly for result in results for poly in result[1]]
+
+    merged = set()
+    if inside and border:
+        inside_index = rtindex.Index((i, poly.bounds, None)
+                                     for i, poly in enumerate(inside))
+        for poly in border:
+            merged.update(inside_index.intersection(poly.bounds))
+
+    polygons = [poly for i, poly in enumerate(inside) if i not in merged]
+    if border:
+        polygons.extend(geometry_parts(
+            unary_union(border + [inside[i] for i in merged])))
+
+    log.debug("buffer_tiled(): %d tiles, %d inside, %d border, %d merged." %
+              (len(jobs), len(inside), len(border), len(merged)))
+
+    if len(polygons) == 1:
+        return polygons[0]
+    return MultiPolygon(polygons)
+
+
 class FlatCAMRTree(object):
     """
     Indexes geometry (Any object with "cooords" property containing
@@ -4337,6 +5102,43 @@ class FlatCAMRTreeStorage(FlatCAMRTree):
 
         super(FlatCAMRTreeStorage, self).insert(idx, obj)
 
+    def insert_many(self, objs, points=None):
+        """
+        Inserts several objects. If the storage is empty the
+        R-tree is bulk loaded, which is much faster than inserting
+        the points one by one.
+
+        :param objs: List of objects to insert.
+        :param points: The points to index for each object, if
+            already known. Must match what self.get_points()
+            would return. Computed with self.get_points() if None.
+        :return: None
+        """
+        if self.objects:
+            for obj in objs:
+                self.insert(obj)
+            return
+
+        if points is None:
+            points = [self.get_points(obj) for obj in objs]
+
+        entries = []
+        for obj, obj_points in zip(objs, points):
+            idx = len(self.objects)
+            self.objects.append(obj)
+            self.indexes[id(obj)] = idx  # See note in insert()
+
+            ptids = []
+            for pt in obj_points:
+                ptid = len(self.points2obj)
+                entries.append((ptid, (pt[0], pt[1], pt[0], pt[1]), idx))
+                ptids.append(ptid)
+                self.points2obj.append(idx)
+            self.obj2points.append(ptids)
+
+        if entries:
+            self.rti = rtindex.Index(iter(entries))
+
     #@profile
     def remove(self, obj):
         # See note about self.indexes in insert().
@@ -37,12 +37,20 @@ setup(
         "camlib",
         "DblSidedTool",
         "FlatCAMApp",
+        "FlatCAMBatch",
         "FlatCAMCommon",
+        "FlatCAMCore",
         "FlatCAMDraw",
+        "FlatCAMDrawStorage",
         "FlatCAMGUI",
         "FlatCAMObj",
+        "FlatCAMParallel",
+        "FlatCAMPlot",
         "FlatCAMProcess",
+        "FlatCAMProfile",
+        "FlatCAMProject",
         "FlatCAMShell",
+        "FlatCAMSnap",
         "FlatCAMTool",
         "FlatCAMVersion",
         "FlatCAMWorker",
@@ -1,11 +1,13 @@
 import sys
 import re
-import FlatCAMApp
+import time
+import itertools
+import FlatCAMCore
 import abc
 import collections
 from PyQt4 import QtCore
-from contextlib import contextmanager
 from FlatCAMObj import FlatCAMGerber, FlatCAMExcellon, FlatCAMGeometry, FlatCAMCNCjob, FlatCAMObj
+from FlatCAMCommon import CancellationToken, TaskCancelled
 
 
 class TclCommand(object):
@@ -48,13 +50,18 @@ class TclCommand(object):
     # Original incoming arguments into command
     original_args = None
 
+    # Options every command accepts, with their types.
+    common_option_types = collections.OrderedDict([
+        ('timeout', int)
+    ])
+
     def __init__(self, app):
         self.app = app
 
         if self.app is None:
             raise TypeError('Expected app to be FlatCAMApp instance.')
 
-        if not isinstance(self.app, FlatCAMApp.App):
+        if not isinstance(self.app, FlatCAMCore.AppCore):
             raise TypeError('Expected FlatCAMApp, got %s.' % type(app))
 
         self.log = self.app.log
@@ -151,9 +158,11 @@ class TclCommand(object):
         for key, value in list(self.help['args'].items()):
             help_string.append(get_decorated_argument(key, value))
 
-        # timeout is unique for signaled commands (this is not best oop practice, but much easier for now)
+        # timeout and async are unique for signaled commands (this is not best oop practice, but much easier for now)
         if isinstance(self, TclCommandSignaled):
             help_string.append("\t[-timeout <int>: Max wait for job timeout before error.]")
+            help_string.append("\t[-async <int>: 1 to return a job handle at once instead of waiting. "
+                               "See wait and wait_all.]")
 
         for example in self.help['examples']:
             help_string.append(get_decorated_example(example))
@@ -222,16 +231,17 @@ class TclCommand(object):
 
         # check options
         for key in options:
-            if key not in self.option_types and key != 'timeout':
+            if key in self.option_types:
+                option_type = self.option_types[key]
+            elif key in self.common_option_types:
+                option_type = self.common_option_types[key]
+            else:
                 self.raise_tcl_error('Unknown parameter: %s' % key)
             try:
-                if key != 'timeout':
-                    named_args[key] = self.option_types[key](options[key])
-                else:
-                    named_args[key] = int(options[key])
+                named_args[key] = option_type(options[key])
             except Exception as e:
                 self.raise_tcl_error("Cannot cast argument '-%s' to type '%s' with exception '%s'."
-                                     % (key, self.option_types[key], str(e)))
+                                     % (key, option_type, str(e)))
 
         # check required arguments
         for key in self.required:
@@ -274,6 +284,54 @@ class TclCommand(object):
             self.app.display_tcl_error(unknown, error_info)
             self.raise_tcl_unknown_error(unknown)
 
+    def wait_jobs(self, jobs, timeout):
+        """
+        Processes events until all the jobs finish and the signals
+        they sent are delivered.
+
+        :param jobs: List of TclJob.
+        :param timeout: Milliseconds.
+        :return: None
+        """
+
+        deadline = time.time() + timeout / 1000.0
+        status = {'timed_out': False}
+        loop = QtCore.QEventLoop()
+
+        def check(*args):
+            if all(job.done for job in jobs):
+                loop.quit()
+            elif time.time() > deadline:
+                status['timed_out'] = True
+                loop.quit()
+
+        # Polled too, the signal may come before the loop runs.
+        timer = QtCore.QTimer()
+        timer.timeout.connect(check)
+        timer.start(50)
+        self.app.shell_command_finished.connect(check)
+
+        try:
+            if not all(job.done for job in jobs):
+                loop.exec_()
+        finally:
+            timer.stop()
+            self.app.shell_command_finished.disconnect(check)
+
+        # Signals the jobs queued before finishing, i.e. object_created,
+        # may not have been delivered yet. Objects must be in the
+        # collection for the next command.
+        QtCore.QCoreApplication.processEvents()
+
+        for job in jobs:
+            if job.done and not job.finished:
+                job.error = TaskCancelled("Cancelled before it started.")
+
+        if status['timed_out']:
+            self.app.raise_tcl_unknown_error("Operation timed outed! Consider increasing option "
+                                             "'-timeout <miliseconds>' for command or "
+                                             "'set_sys background_timeout <miliseconds>'.")
+
     @abc.abstractmethod
     def execute(self, args, unnamed_args):
         """
@@ -289,6 +347,39 @@ class TclCommand(object):
         raise NotImplementedError("Please Implement this method")
 
 
+class TclJob(object):
+    """
+    A run of a TclCommandSignaled in the worker. Commands run with
+    -async 1 return its id, to be passed to wait, and are kept in
+    app.tcl_jobs until then.
+    """
+
+    ids = itertools.count(1)
+
+    def __init__(self, command):
+        """
+        :param command: The command, as typed.
+        """
+        self.id = "job%d" % next(TclJob.ids)
+        self.command = command
+        self.token = CancellationToken()
+
+        # Set in the worker.
+        self.started = False
+        self.finished = False
+        self.output = None
+        self.error = None
+        self.error_info = None
+
+    @property
+    def done(self):
+        """
+        Finished, or cancelled before it started. The worker does
+        not run cancelled tasks.
+        """
+        return self.finished or (self.token.cancelled and not self.started)
+
+
 class TclCommandSignaled(TclCommand):
     """
         !!! I left it here only  for demonstration !!!
@@ -302,26 +393,39 @@ class TclCommandSignaled(TclCommand):
 
         This class is  child of  TclCommand and is used for commands  which create  new objects
         it handles  all neccessary stuff about blocking and passing exeptions
+
+        With -async 1 the command does not block. It returns a job
+        handle right away and several commands run at the same time
+        in the worker pool. See TclCommandWait and TclCommandWaitAll.
     """
 
+    common_option_types = collections.OrderedDict([
+        ('timeout', int),
+        ('async', int)
+    ])
+
     @abc.abstractmethod
     def execute(self, args, unnamed_args):
         raise NotImplementedError("Please Implement this method")
 
-    output = None
+    def execute_call(self, job, args, unnamed_args):
+        """
+        Runs the command in the worker.
+
+        :param job: TclJob for the results.
+        :return: None
+        """
 
-    def execute_call(self, args, unnamed_args):
+        job.started = True
 
         try:
-            self.output = None
-            self.error = None
-            self.error_info = None
-            self.output = self.execute(args, unnamed_args)
+            job.output = self.execute(args, unnamed_args)
         except Exception as unknown:
-            self.error_info = sys.exc_info()
-            self.error = unknown
+            job.error_info = sys.exc_info()
+            job.error = unknown
         finally:
-            self.app.shell_command_finished.emit(self)
+            job.finished = True
+            self.app.shell_command_finished.emit(job)
 
     def execute_wrapper(self, *args):
         """
@@ -330,86 +434,45 @@ class TclCommandSignaled(TclCommand):
         This method should be reimplemented only when initial checking sequence differs
 
         :param args: arguments passed from tcl command console
-        :return: None, output text or exception
+        :return: None, output text, job handle or exception
         """
 
-        @contextmanager
-        def wait_signal(signal, timeout=300000):
-            """Block loop until signal emitted, or timeout (ms) elapses."""
-            loop = QtCore.QEventLoop()
-
-            # Normal termination
-            signal.connect(loop.quit)
-
-            # Termination by exception in thread
-            self.app.thread_exception.connect(loop.quit)
-
-            status = {'timed_out': False}
-
-            def report_quit():
-                status['timed_out'] = True
-                loop.quit()
-
-            yield
-
-            # Temporarily change how exceptions are managed.
-            oeh = sys.excepthook
-            ex = []
-
-            def except_hook(type_, value, traceback_):
-                ex.append(value)
-                oeh(type_, value, traceback_)
-            sys.excepthook = except_hook
-
-            # Terminate on timeout
-            if timeout is not None:
-                QtCore.QTimer.singleShot(timeout, report_quit)
-
-            # Block
-            loop.exec_()
-
-            # Restore exception management
-            sys.excepthook = oeh
-            if ex:
-                raise ex[0]
-
-            if status['timed_out']:
-                self.app.raise_tcl_unknown_error("Operation timed outed! Consider increasing option "
-                                                 "'-timeout <miliseconds>' for command or "
-                                                 "'set_sys background_timeout <miliseconds>'.")
+        job = None
 
         try:
             self.log.debug("TCL command '%s' executed." % str(self.__class__))
             self.original_args = args
             args, unnamed_args = self.check_args(args)
-            if 'timeout' in args:
-                passed_timeout = args['timeout']
-                del args['timeout']
-            else:
-                passed_timeout = self.app.defaults['background_timeout']
+            # every TclCommandNewObject ancestor  support  timeout as parameter,
+            # but it does not mean anything for child itself
+            # when operation  will be  really long is good  to set it higher then defqault 30s
+            passed_timeout = args.pop('timeout', self.app.defaults['background_timeout'])
+            run_async = args.pop('async', 0)
 
-            # set detail for processing, it will be there until next open or close
-            self.app.shell.open_proccessing(self.get_current_command())
+            job = TclJob(self.get_current_command())
+            self.app.worker_task.emit({'fcn': self.execute_call,
+                                       'params': [job, args, unnamed_args],
+                                       'token': job.token})
+
+            if run_async:
+                self.app.tcl_jobs[job.id] = job
+                return job.id
 
-            def handle_finished(obj):
-                self.app.shell_command_finished.disconnect(handle_finished)
-                if self.error is not None:
-                    self.raise_tcl_unknown_error(self.error)
+            # set detail for processing, it will be there until next open or close
+            if self.app.shell is not None:
+                self.app.shell.open_proccessing(self.get_current_command())
 
-            self.app.shell_command_finished.connect(handle_finished)
+            self.wait_jobs([job], passed_timeout)
 
-            with wait_signal(self.app.shell_command_finished, passed_timeout):
-                # every TclCommandNewObject ancestor  support  timeout as parameter,
-                # but it does not mean anything for child itself
-                # when operation  will be  really long is good  to set it higher then defqault 30s
-                self.app.worker_task.emit({'fcn': self.execute_call, 'params': [args, unnamed_args]})
+            if job.error is not None:
+                raise job.error
 
-            return self.output
+            return job.output
 
         except Exception as unknown:
             # if error happens inside thread execution, then pass correct error_info to display
-            if self.error_info is not None:
-                error_info = self.error_info
+            if job is not None and job.error_info is not None:
+                error_info = job.error_info
             else:
                 error_info = sys.exc_info()
             self.log.error("TCL command '%s' failed." % str(self))
@@ -57,4 +57,4 @@ class TclCommandAddPolygon(TclCommandSignaled):
         points = [[float(unnamed_args[2*i]), float(unnamed_args[2*i+1])] for i in range(len(unnamed_args)/2)]
 
         obj.add_polygon(points)
-        obj.plot()
+        self.app.replot([obj])
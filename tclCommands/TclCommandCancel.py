@@ -0,0 +1,54 @@
+from tclCommands.TclCommand import *
+
+
+class TclCommandCancel(TclCommand):
+    """
+    Tcl shell command to cancel running and queued jobs.
+
+    example:
+        cancel
+        cancel $job
+    """
+
+    # List of all command aliases, to be able use old names for backward compatibility (add_poly, add_polygon)
+    aliases = ['cancel']
+
+    # Dictionary of types from Tcl command, needs to be ordered
+    arg_names = collections.OrderedDict([
+        ('job', str)
+    ])
+
+    # Dictionary of types from Tcl command, needs to be ordered , this  is  for options  like -optionname value
+    option_types = collections.OrderedDict([
+
+    ])
+
+    # array of mandatory options for current Tcl command: required = {'name','outname'}
+    required = []
+
+    # structured help for current command, args needs to be ordered
+    help = {
+        'main': "Cancels the running processes and the jobs waiting to run.",
+        'args': collections.OrderedDict([
+            ('job', 'Job handle from a command run with -async 1. Only this job is cancelled.')
+        ]),
+        'examples': ['cancel', 'cancel $job']
+    }
+
+    def execute(self, args, unnamed_args):
+        """
+
+        :param args:
+        :param unnamed_args:
+        :return:
+        """
+
+        if 'job' in args:
+            job = self.app.tcl_jobs.get(args['job'])
+            if job is None:
+                self.raise_tcl_error("Unknown job: %s" % args['job'])
+            job.token.cancel()
+            return
+
+        self.app.proc_container.cancel_all()
+        self.app.worker.cancel_all()
@@ -87,7 +87,7 @@ class TclCommandMirror(TclCommandSignaled):
                 py = 0.5 * (ymin + ymax)
 
                 obj.mirror(axis, [px, py])
-                obj.plot()
+                self.app.replot([obj])
 
             except Exception as e:
                 return "Operation failed: %s" % str(e)
@@ -102,6 +102,6 @@ class TclCommandMirror(TclCommandSignaled):
 
             try:
                 obj.mirror(axis, [dist, dist])
-                obj.plot()
+                self.app.replot([obj])
             except Exception as e:
                 return "Operation failed: %s" % str(e)
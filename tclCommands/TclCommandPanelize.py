@@ -1,13 +1,22 @@
-from copy import copy,deepcopy
+from copy import deepcopy
 from tclCommands.TclCommand import *
+from camlib import panel_offsets
+import shapely.affinity as affinity
+import FlatCAMParallel
 
 
-class TclCommandPanelize(TclCommand):
+class TclCommandPanelize(TclCommandSignaled):
     """
     Tcl shell command to pannelize an object.
 
-    example:
+    The panel is built from translated copies of the source
+    object's geometry in one go, in the process pool if enabled
+    (see FlatCAMParallel). With -instanced, a geometry panel keeps
+    one copy of the source and the offsets of the cells instead,
+    see FlatCAMGeometry.instances.
 
+    example:
+        panelize board -rows 3 -columns 2 -outname board_panel
     """
 
     # List of all command aliases, to be able use old names for backward compatibility (add_poly, add_polygon)
@@ -25,6 +34,7 @@ class TclCommandPanelize(TclCommand):
         ('spacing_columns', float),
         ('spacing_rows', float),
         ('box', str),
+        ('instanced', bool),
         ('outname', str)
     ])
 
@@ -42,9 +52,12 @@ class TclCommandPanelize(TclCommand):
             ('spacing_rows', 'Spacing between rows.'),
             ('columns', 'Number of columns.'),
             ('rows', 'Number of rows;'),
+            ('instanced', 'Keep one copy of the geometry and the position of each cell. '
+                          'Not for Excellon objects.'),
             ('outname', 'Name of the new geometry object.')
         ]),
-        'examples': []
+        'examples': ['panelize board -rows 3 -columns 2 -outname board_panel',
+                     'panelize board -rows 10 -columns 5 -instanced 1']
     }
 
     def execute(self, args, unnamed_args):
@@ -97,55 +110,34 @@ class TclCommandPanelize(TclCommand):
         lenghtx = xmax - xmin + spacing_columns
         lenghty = ymax - ymin + spacing_rows
 
-        currenty = 0
-
-        def initialize_local(obj_init, app):
-            obj_init.solid_geometry = obj.solid_geometry
-            obj_init.offset([float(currentx), float(currenty)]),
-            objs.append(obj_init)
+        offsets = panel_offsets(args['rows'], args['columns'], float(lenghtx), float(lenghty))
 
-        def initialize_local_excellon(obj_init, app):
-            obj_init.tools = obj.tools
-            # drills are offset, so they need to be deep copied
-            obj_init.drills = deepcopy(obj.drills) 
-            obj_init.offset([float(currentx), float(currenty)])
+        def initialize_excellon(obj_init, app):
+            for option in obj.options:
+                if option != 'name':
+                    obj_init.options[option] = obj.options[option]
+
+            obj_init.tools = deepcopy(obj.tools)
+            obj_init.drills = [{"point": affinity.translate(drill['point'], xoff=dx, yoff=dy),
+                                "tool": drill['tool']}
+                               for dx, dy in offsets for drill in obj.drills]
             obj_init.create_geometry()
-            objs.append(obj_init)
 
-        def initialize_geometry(obj_init, app):
-            FlatCAMGeometry.merge(objs, obj_init)
+        # The cells of an instanced source are panelized too.
+        if isinstance(obj, FlatCAMGeometry) and obj.instances is not None:
+            offsets = [(x + dx, y + dy) for x, y in offsets for dx, dy in obj.instances]
 
-        def initialize_excellon(obj_init, app):
-            # merge expects tools to exist in the target object
-            obj_init.tools = obj.tools.copy()
-            FlatCAMExcellon.merge(objs, obj_init)
-
-        objs = []
-        if obj is not None:           
-
-            for row in range(args['rows']):
-                currentx = 0
-                for col in range(args['columns']):
-                    local_outname = outname + ".tmp." + str(col) + "." + str(row)
-                    if isinstance(obj, FlatCAMExcellon):
-                        self.app.new_object("excellon", local_outname, initialize_local_excellon, plot=False)
-                    else:
-                        self.app.new_object("geometry", local_outname, initialize_local, plot=False)
-                    currentx += lenghtx
-                currenty += lenghty
+        def initialize_geometry(obj_init, app):
+            if args.get('instanced'):
+                obj_init.solid_geometry = deepcopy(obj.solid_geometry)
+                obj_init.instances = offsets
+            else:
+                obj_init.solid_geometry = FlatCAMParallel.panelize_geometry(obj.solid_geometry, offsets)
 
+        with self.app.proc_container.new("Panelizing %s..." % name):
             if isinstance(obj, FlatCAMExcellon):
                 self.app.new_object("excellon", outname, initialize_excellon)
             else:
                 self.app.new_object("geometry", outname, initialize_geometry)
 
-            # deselect all  to avoid  delete selected object when run  delete  from  shell
-            self.app.collection.set_all_inactive()
-            for delobj in objs:
-                self.app.collection.set_active(delobj.options['name'])
-                self.app.on_delete()
-
-        else:
-            return "ERROR: obj is None"
-
         return "Ok"
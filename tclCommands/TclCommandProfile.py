@@ -0,0 +1,69 @@
+from tclCommands.TclCommand import *
+import json
+import FlatCAMProfile
+
+
+class TclCommandProfile(TclCommand):
+    """
+    Tcl shell command to show the time spent in the stages of recent jobs.
+
+    example:
+        profile -last 1
+        profile -dump /tmp/profile.json
+    """
+
+    # List of all command aliases, to be able use old names for backward compatibility (add_poly, add_polygon)
+    aliases = ['profile']
+
+    # Dictionary of types from Tcl command, needs to be ordered
+    arg_names = collections.OrderedDict([
+
+    ])
+
+    # Dictionary of types from Tcl command, needs to be ordered , this  is  for options  like -optionname value
+    option_types = collections.OrderedDict([
+        ('last', int),
+        ('dump', str),
+        ('clear', int)
+    ])
+
+    # array of mandatory options for current Tcl command: required = {'name','outname'}
+    required = []
+
+    # structured help for current command, args needs to be ordered
+    help = {
+        'main': "Shows the wall time, CPU time, peak memory and items of the stages of recent jobs.",
+        'args': collections.OrderedDict([
+            ('last', 'Number of jobs to show, latest first. Default is all.'),
+            ('dump', 'Write the jobs as JSON to this file instead.'),
+            ('clear', 'Forget the recorded jobs (1) afterwards.')
+        ]),
+        'examples': ['profile -last 1', 'profile -dump /tmp/profile.json']
+    }
+
+    def execute(self, args, unnamed_args):
+        """
+
+        :param args:
+        :param unnamed_args:
+        :return: Report text.
+        """
+
+        jobs = list(FlatCAMProfile.history)
+        if 'last' in args:
+            jobs = jobs[-args['last']:] if args['last'] > 0 else []
+
+        if 'dump' in args:
+            try:
+                with open(args['dump'], 'w') as f:
+                    json.dump([job.to_dict() for job in jobs], f, indent=2)
+            except IOError as e:
+                self.raise_tcl_error("Cannot write %s: %s" % (args['dump'], str(e)))
+            output = "%d jobs written to %s" % (len(jobs), args['dump'])
+        else:
+            output = "\n".join(job.report() for job in reversed(jobs))
+
+        if args.get('clear'):
+            FlatCAMProfile.history.clear()
+
+        return output
@@ -43,4 +43,5 @@ class TclCommandSaveProject(TclCommandSignaled):
         :return: None or exception
         """
 
-        self.app.save_project(args['filename'])
+        # Already in the worker, scripts expect the file when done.
+        self.app.save_project(args['filename'], background=False)
@@ -0,0 +1,57 @@
+from tclCommands.TclCommand import *
+
+
+class TclCommandWait(TclCommand):
+    """
+    Tcl shell command to wait for a job started with -async 1.
+
+    example:
+        set top [isolate top -dia 0.3 -async 1]
+        wait $top
+    """
+
+    # List of all command aliases, to be able use old names for backward compatibility (add_poly, add_polygon)
+    aliases = ['wait']
+
+    # Dictionary of types from Tcl command, needs to be ordered
+    arg_names = collections.OrderedDict([
+        ('job', str)
+    ])
+
+    # Dictionary of types from Tcl command, needs to be ordered , this  is  for options  like -optionname value
+    option_types = collections.OrderedDict([
+        ('timeout', int)
+    ])
+
+    # array of mandatory options for current Tcl command: required = {'name','outname'}
+    required = ['job']
+
+    # structured help for current command, args needs to be ordered
+    help = {
+        'main': "Waits for a job started with -async 1 and returns its result.",
+        'args': collections.OrderedDict([
+            ('job', 'Job handle returned by the command.'),
+            ('timeout', 'Max wait in milliseconds.')
+        ]),
+        'examples': ['set top [isolate top -dia 0.3 -async 1]\nwait $top']
+    }
+
+    def execute(self, args, unnamed_args):
+        """
+
+        :param args:
+        :param unnamed_args:
+        :return: The job's result.
+        """
+
+        job = self.app.tcl_jobs.get(args['job'])
+        if job is None:
+            self.raise_tcl_error("Unknown job: %s" % args['job'])
+
+        self.wait_jobs([job], args.get('timeout', self.app.defaults['background_timeout']))
+        del self.app.tcl_jobs[job.id]
+
+        if job.error is not None:
+            self.raise_tcl_error("%s failed: %s" % (job.command, str(job.error)))
+
+        return job.output
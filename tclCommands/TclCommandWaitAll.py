@@ -0,0 +1,55 @@
+from tclCommands.TclCommand import *
+
+
+class TclCommandWaitAll(TclCommand):
+    """
+    Tcl shell command to wait for all jobs started with -async 1.
+
+    example:
+        isolate top -dia 0.3 -async 1
+        isolate bottom -dia 0.3 -async 1
+        wait_all
+    """
+
+    # List of all command aliases, to be able use old names for backward compatibility (add_poly, add_polygon)
+    aliases = ['wait_all']
+
+    # Dictionary of types from Tcl command, needs to be ordered
+    arg_names = collections.OrderedDict([
+
+    ])
+
+    # Dictionary of types from Tcl command, needs to be ordered , this  is  for options  like -optionname value
+    option_types = collections.OrderedDict([
+        ('timeout', int)
+    ])
+
+    # array of mandatory options for current Tcl command: required = {'name','outname'}
+    required = []
+
+    # structured help for current command, args needs to be ordered
+    help = {
+        'main': "Waits for all jobs started with -async 1. Fails if any of them failed.",
+        'args': collections.OrderedDict([
+            ('timeout', 'Max wait in milliseconds.')
+        ]),
+        'examples': ['isolate top -dia 0.3 -async 1\nisolate bottom -dia 0.3 -async 1\nwait_all']
+    }
+
+    def execute(self, args, unnamed_args):
+        """
+
+        :param args:
+        :param unnamed_args:
+        :return: None or exception
+        """
+
+        jobs = list(self.app.tcl_jobs.values())
+
+        self.wait_jobs(jobs, args.get('timeout', self.app.defaults['background_timeout']))
+        for job in jobs:
+            del self.app.tcl_jobs[job.id]
+
+        failed = [job for job in jobs if job.error is not None]
+        if failed:
+            self.raise_tcl_error("\n".join("%s failed: %s" % (job.command, str(job.error)) for job in failed))
@@ -9,6 +9,7 @@ import tclCommands.TclCommandAddPolyline
 import tclCommands.TclCommandAddRectangle
 import tclCommands.TclCommandAlignDrill
 import tclCommands.TclCommandAlignDrillGrid
+import tclCommands.TclCommandCancel
 import tclCommands.TclCommandCncjob
 import tclCommands.TclCommandCutout
 import tclCommands.TclCommandDelete
@@ -40,6 +41,7 @@ import tclCommands.TclCommandOptions
 import tclCommands.TclCommandPaint
 import tclCommands.TclCommandPanelize
 import tclCommands.TclCommandPlot
+import tclCommands.TclCommandProfile
 import tclCommands.TclCommandSaveProject
 import tclCommands.TclCommandScale
 import tclCommands.TclCommandSetActive
@@ -47,6 +49,8 @@ import tclCommands.TclCommandSetSys
 import tclCommands.TclCommandSubtractPoly
 import tclCommands.TclCommandSubtractRectangle
 import tclCommands.TclCommandVersion
+import tclCommands.TclCommandWait
+import tclCommands.TclCommandWaitAll
 import tclCommands.TclCommandWriteGCode
 
 
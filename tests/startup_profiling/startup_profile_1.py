@@ -0,0 +1,108 @@
+# This script measures the cost of starting FlatCAM, per phase.
+# Run from this directory:
+#
+#   python startup_profile_1.py [runs]
+#
+# Every run is a new interpreter. Reported are the import time of
+# the heavy packages (from python -X importtime), the phases of
+# App.__init__ (see FlatCAMProfile.Timeline) and the time to start
+# the headless core (see FlatCAMBatch). Needs a display for the GUI.
+
+import os
+import re
+import sys
+import json
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Packages reported separately. The rest is "other".
+PACKAGES = ['PyQt4', 'matplotlib', 'numpy', 'shapely', 'rtree', 'svg', 'tkinter',
+            'descartes', 'tclCommands', 'FlatCAMDraw', 'camlib']
+
+GUI = '''
+import sys, json
+import FlatCAMProfile
+startup = FlatCAMProfile.Timeline("Startup")
+startup.phase("import")
+from PyQt4 import QtGui, QtCore
+from FlatCAMApp import App
+startup.phase("qapplication")
+app = QtGui.QApplication(sys.argv)
+fc = App(user_defaults=False, startup=startup)
+print("PROFILE " + json.dumps(FlatCAMProfile.history[-1].to_dict()))
+# Stops the workers.
+QtCore.QTimer.singleShot(0, app.quit)
+app.exec_()
+'''
+
+HEADLESS = '''
+import sys, json
+import FlatCAMProfile
+startup = FlatCAMProfile.Timeline("Headless")
+startup.phase("import")
+from PyQt4 import QtCore
+import FlatCAMBatch
+startup.phase("core")
+qapp = QtCore.QCoreApplication(sys.argv)
+app = FlatCAMBatch.BatchApp(user_defaults=False)
+startup.phase("tcl")
+app.tcl
+app.shutdown()
+print("PROFILE " + json.dumps(startup.finish().to_dict()))
+'''
+
+
+def run(code):
+    """
+    Runs code in a new interpreter.
+
+    :return: (import times {package: seconds}, profile dictionary)
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    imports = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        match = re.match(r'import time:\s+(\d+) \|\s+\d+ \|(\s*)(\S+)', line)
+        if match:
+            top = match.group(3).split('.')[0]
+            imports[top if top in PACKAGES else 'other'] += int(match.group(1)) / 1e6
+
+    profile = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("PROFILE "):
+            profile = json.loads(line[len("PROFILE "):])
+
+    if profile is None:
+        print(proc.stderr[-2000:])
+
+    return imports, profile
+
+
+def report(name, results):
+    print("\n%s (%d runs, mean seconds)" % (name, len(results)))
+
+    print("  Imports:")
+    for package in PACKAGES + ['other']:
+        times = [imports.get(package, 0.0) for imports, _ in results]
+        print("    %-16s %8.3f" % (package, sum(times) / len(times)))
+
+    profiles = [profile for _, profile in results if profile is not None]
+    if not profiles:
+        return
+
+    print("  Phases:")
+    for i, stage in enumerate(profiles[0]["stages"]):
+        walls = [profile["stages"][i]["wall"] for profile in profiles]
+        print("    %-16s %8.3f" % (stage["name"], sum(walls) / len(walls)))
+    print("    %-16s %8.3f" % ("total", sum(p["wall"] for p in profiles) / len(profiles)))
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    report("Headless", [run(HEADLESS) for _ in range(runs)])
+    report("GUI", [run(GUI) for _ in range(runs)])
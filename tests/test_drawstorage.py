@@ -0,0 +1,82 @@
+import unittest
+
+from FlatCAMDrawStorage import DrawStorage
+
+
+class Shape(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+class DrawStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loaded = [Shape("l%d" % i) for i in range(5)]
+        self.storage = DrawStorage()
+        self.storage.load(self.loaded)
+
+    def test_load(self):
+        self.assertEqual(list(self.storage.get_objects()), self.loaded)
+        self.assertEqual(len(self.storage), 5)
+        self.assertFalse(self.storage.is_modified())
+        self.assertIsNone(self.storage.undo())
+
+    def test_modified(self):
+        new = Shape("new")
+        self.storage.remove_many(self.loaded[1:3])
+        self.storage.insert(new)
+        self.storage.remove(Shape("unknown"))
+
+        self.assertTrue(self.storage.is_modified())
+        self.assertEqual(self.storage.get_removed(), self.loaded[1:3])
+        self.assertEqual(self.storage.get_added(), [new])
+        self.assertEqual(self.storage.get_merged(), [self.loaded[0], self.loaded[3], self.loaded[4], new])
+
+        # Back as loaded, in another order.
+        self.storage.remove(new)
+        self.storage.insert_many([self.loaded[2], self.loaded[1]])
+        self.assertFalse(self.storage.is_modified())
+        self.assertEqual(self.storage.get_merged(), self.loaded)
+
+    def test_undo(self):
+        a, b = Shape("a"), Shape("b")
+
+        # A union: two removed, one added.
+        self.storage.remove_many(self.loaded[:2])
+        self.storage.insert(a)
+        self.storage.end_change()
+
+        self.storage.insert(b)
+        self.storage.end_change()
+        self.storage.end_change()
+
+        self.assertEqual(self.storage.undo(), ([b], []))
+        self.assertEqual(self.storage.undo(), ([a], self.loaded[:2]))
+        self.assertFalse(self.storage.is_modified())
+        self.assertIsNone(self.storage.undo())
+
+        self.assertEqual(self.storage.redo(), (self.loaded[:2], [a]))
+        self.assertEqual(set(self.storage.get_objects()), set(self.loaded[2:] + [a]))
+
+        # A new change drops what was undone.
+        self.storage.remove(a)
+        self.assertIsNone(self.storage.redo())
+        self.assertEqual(self.storage.undo(), ([], [a]))
+
+    def test_max_changes(self):
+        for i in range(DrawStorage.max_changes + 10):
+            self.storage.insert(Shape("s%d" % i))
+            self.storage.end_change()
+
+        for i in range(DrawStorage.max_changes):
+            self.assertIsNotNone(self.storage.undo())
+        self.assertIsNone(self.storage.undo())
+        self.assertEqual(len(self.storage), 5 + 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import sys
+import unittest
+
+from shapely.geometry import Point, LineString, LinearRing, Polygon, MultiPolygon
+from camlib import Geometry, CNCjob, FlatPathBuffer, polygon_paths, line_segments
+
+
+class FlattenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.square = Polygon([(0, 0), (4, 0), (4, 4), (0, 4)],
+                              [[(1, 1), (2, 1), (2, 2), (1, 2)]])
+        self.line = LineString([(5, 5), (6, 6), (7, 5)])
+        self.point = Point(8, 8)
+
+    def test_order(self):
+        geo = Geometry()
+        geo.solid_geometry = [self.line, [None, [self.point]], MultiPolygon([self.square])]
+
+        flat = geo.flatten()
+        self.assertEqual(len(flat), 3)
+        self.assertTrue(flat[0].equals(self.line))
+        self.assertTrue(flat[1].equals(self.point))
+        self.assertTrue(flat[2].equals(self.square))
+
+    def test_pathonly(self):
+        geo = Geometry()
+        geo.solid_geometry = [self.square, self.line]
+
+        flat = geo.flatten(pathonly=True)
+        self.assertEqual(len(flat), 3)
+        self.assertTrue(flat[0].equals(self.square.exterior))
+        self.assertTrue(flat[1].equals(self.square.interiors[0]))
+        self.assertTrue(flat[2].equals(self.line))
+
+    def test_deep_nesting(self):
+        nested = self.line
+        for _ in range(sys.getrecursionlimit() * 2):
+            nested = [nested, None]
+
+        geo = Geometry()
+        geo.solid_geometry = nested
+        flat = geo.flatten()
+        self.assertEqual(len(flat), 1)
+        self.assertTrue(flat[0].equals(self.line))
+
+    def test_reset(self):
+        geo = Geometry()
+        geo.solid_geometry = [self.line]
+        geo.flatten()
+        geo.flatten(geometry=[self.point], reset=False)
+        self.assertEqual(len(geo.flat_geometry), 2)
+
+    def test_polygon_paths(self):
+        paths, skipped = polygon_paths([self.square, [self.line, MultiPolygon([self.square])]])
+        self.assertEqual(len(paths), 2)
+        self.assertEqual(skipped, 1)
+
+        # Exterior and interior, 5 points each.
+        self.assertEqual(len(paths[0].vertices), 10)
+        self.assertEqual(list(paths[0].codes).count(paths[0].MOVETO), 2)
+        self.assertTrue(paths[0].contains_point((3, 3)))
+        self.assertEqual(tuple(paths[0].vertices[5]), (1, 1))
+
+    def test_line_segments(self):
+        lines, skipped = line_segments([self.square, self.line, self.point])
+        self.assertEqual(skipped, 1)
+        self.assertEqual([len(line) for line in lines], [5, 5, 3])
+        self.assertEqual(lines[2].tolist(), [[5, 5], [6, 6], [7, 5]])
+
+
+class FlatPathBufferTest(unittest.TestCase):
+
+    def test_packing(self):
+        square = Polygon([(0, 0), (4, 0), (4, 4), (0, 4)],
+                         [[(1, 1), (2, 1), (2, 2), (1, 2)]])
+        line = LineString([(5, 5), (6, 6), (7, 5)])
+
+        geo = Geometry()
+        geo.solid_geometry = [[square], None, line, Point(8, 8), LineString()]
+        flat = geo.flatten_packed()
+
+        self.assertEqual(len(flat), 4)
+        self.assertEqual(list(flat.kinds), [FlatPathBuffer.LINEARRING,
+                                            FlatPathBuffer.LINEARRING,
+                                            FlatPathBuffer.LINESTRING,
+                                            FlatPathBuffer.POINT])
+        self.assertEqual(list(flat.offsets), [0, 5, 10, 13, 14])
+        self.assertEqual(flat.coords.shape, (14, 2))
+        self.assertEqual(flat.get_coords(2).tolist(), [[5, 5], [6, 6], [7, 5]])
+        self.assertEqual(flat.start_points().tolist(), [[0, 0], [1, 1], [5, 5], [8, 8]])
+        self.assertEqual(flat.end_points().tolist(), [[0, 0], [1, 1], [7, 5], [8, 8]])
+        self.assertTrue(isinstance(flat.get_geometry(0), LinearRing))
+        self.assertTrue(flat.get_geometry(2).equals(line))
+
+    def test_empty(self):
+        flat = FlatPathBuffer.from_geometry([])
+        self.assertEqual(len(flat), 0)
+        self.assertEqual(flat.start_points().shape, (0, 2))
+
+
+class GenerateFromPackedTest(unittest.TestCase):
+
+    def test_gcode(self):
+        line = LineString([(1, 0), (0, 0)])
+        geo = Geometry()
+        geo.solid_geometry = [line, Point(3, 3)]
+
+        cnc = CNCjob(z_cut=-0.1)
+        cnc.generate_from_geometry_2(geo)
+
+        # Line is cut starting from its end, nearest to the origin.
+        moves = [l for l in cnc.gcode.splitlines() if l.startswith("G00 X") or l.startswith("G01 X")]
+        self.assertEqual(moves[:3], ["G00 X0.0000Y0.0000",
+                                     "G01 X1.0000Y0.0000",
+                                     "G00 X3.0000Y3.0000"])
+
+        # Input geometry is not modified.
+        self.assertEqual(list(line.coords), [(1, 0), (0, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
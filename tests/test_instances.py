@@ -0,0 +1,109 @@
+import unittest
+
+from shapely.geometry import LineString, Point, Polygon
+
+import FlatCAMParallel
+from camlib import CNCjob, Geometry, panel_offsets, order_offsets
+
+
+def square(x, y, size):
+    return Polygon([(x, y), (x + size, y), (x + size, y + size), (x, y + size)])
+
+
+def new_job():
+    return CNCjob(units="IN", z_cut=-0.01, z_move=0.1, feedrate=5.0, tooldia=0.1)
+
+
+def cuts(job):
+    return [geo["geom"] for geo in job.gcode_parsed if geo["kind"][0] == "C"]
+
+
+class InstancesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.master = Geometry()
+        self.master.solid_geometry = [square(0, 0, 2), square(3, 1, 1).exterior, Point(5, 5)]
+
+    def test_order_offsets(self):
+        offsets = panel_offsets(3, 3, 10.0, 20.0)
+        ordered = order_offsets(offsets)
+
+        self.assertEqual(sorted(ordered), sorted(offsets))
+        # Right to left in the second row.
+        self.assertEqual(ordered[:6], [(0.0, 0.0), (10.0, 0.0), (20.0, 0.0),
+                                       (20.0, 20.0), (10.0, 20.0), (0.0, 20.0)])
+        self.assertEqual(ordered[6:], [(0.0, 40.0), (10.0, 40.0), (20.0, 40.0)])
+
+    def test_one_instance(self):
+        # Same as without instances.
+        for multidepth in [False, True]:
+            expected = new_job()
+            expected.generate_from_geometry_2(self.master, tolerance=0.0005,
+                                              multidepth=multidepth, depthpercut=0.004)
+
+            job = new_job()
+            job.generate_from_instances(self.master, [(0, 0)], tolerance=0.0005,
+                                        multidepth=multidepth, depthpercut=0.004)
+
+            self.assertEqual(job.gcode, expected.gcode)
+
+    def test_multidepth_order(self):
+        geo = Geometry()
+        geo.solid_geometry = [LineString([(0, 0), (10, 0)]), LineString([(11, 0), (20, 0)]),
+                              LineString([(1, 1), (5, 5)]), Point(3, 12)]
+
+        # Tool moves, as before instances. After an even number
+        # of passes the tool is back at the start of the path.
+        expected = {0.5: [(0, 0), (10, 0), (1, 1), (5, 5), (11, 0), (20, 0), (3, 12)],
+                    1.0: [(0, 0), (11, 0), (5, 5), (3, 12)]}
+        for depthpercut, moves in expected.items():
+            job = CNCjob(units="IN", z_cut=-1, z_move=0.1, feedrate=5.0, tooldia=0.1)
+            job.generate_from_geometry_2(geo, multidepth=True, depthpercut=depthpercut)
+            self.assertEqual([line for line in job.gcode.splitlines() if line.startswith("G00 X")],
+                             ["G00 X%.4fY%.4f" % move for move in moves] + ["G00 X0Y0"])
+
+            job = CNCjob(units="IN", z_cut=-1, z_move=0.1, feedrate=5.0, tooldia=0.1)
+            job.generate_from_instances(geo, [(0, 0)], multidepth=True, depthpercut=depthpercut)
+            self.assertEqual([line for line in job.gcode.splitlines() if line.startswith("G00 X")],
+                             ["G00 X%.4fY%.4f" % move for move in moves] + ["G00 X0Y0"])
+
+    def test_cells(self):
+        offsets = panel_offsets(2, 3, 8.0, 9.0)
+
+        master_job = new_job()
+        master_job.generate_from_geometry_2(self.master, tolerance=0.0005)
+        master_job.gcode_parse()
+        master_cuts = cuts(master_job)
+
+        job = new_job()
+        job.generate_from_instances(self.master, offsets, tolerance=0.0005)
+        job.gcode_parse()
+        panel_cuts = cuts(job)
+
+        # The same paths in each cell, in the same order.
+        self.assertEqual(len(panel_cuts), len(offsets) * len(master_cuts))
+        for i, (dx, dy) in enumerate(order_offsets(offsets)):
+            cell = panel_cuts[i * len(master_cuts):(i + 1) * len(master_cuts)]
+            for a, b in zip(cell, master_cuts):
+                self.assertEqual(len(a.coords), len(b.coords))
+                for (ax, ay), (bx, by) in zip(a.coords, b.coords):
+                    self.assertAlmostEqual(ax, bx + dx, places=3)
+                    self.assertAlmostEqual(ay, by + dy, places=3)
+
+        self.assertTrue(job.gcode.endswith("G00 X0Y0\nM05\n"))
+
+    def test_parallel_job(self):
+        offsets = panel_offsets(2, 2, 8.0, 9.0)
+        params = {"units": "IN", "z_cut": -0.01, "z_move": 0.1, "feedrate": 5.0,
+                  "spindlespeed": None, "tooldia": 0.1, "multidepth": False,
+                  "depthpercut": None, "tolerance": 0.0005}
+
+        result = FlatCAMParallel.generate_cncjob(self.master.solid_geometry, params, offsets)
+
+        job = new_job()
+        job.generate_from_instances(self.master, offsets, tolerance=0.0005)
+        self.assertEqual(result["gcode"], job.gcode)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+
+from shapely.geometry import Point, LineString, Polygon, MultiPolygon
+
+import FlatCAMParallel
+from camlib import CNCjob, Geometry, panel_offsets
+
+
+def square(x, y, size):
+    return Polygon([(x, y), (x + size, y), (x + size, y + size), (x, y + size)])
+
+
+def job_args(value, geo):
+    return {"value": value, "area": geo.area, "defaults": dict(Geometry.defaults)}
+
+
+class ParallelTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        FlatCAMParallel.defaults["worker_processes"] = 2
+
+    @classmethod
+    def tearDownClass(cls):
+        FlatCAMParallel.shutdown()
+        FlatCAMParallel.defaults["worker_processes"] = 0
+
+    def setUp(self):
+        self.polygons = [square(3 * i, 3 * j, 2) for i in range(4) for j in range(3)]
+
+    def test_encode(self):
+        value = {"geo": [Point(1, 2), [LineString([(0, 0), (1, 1)]), None]],
+                 "kind": ["C", "F"], "n": 1.5}
+        result = FlatCAMParallel.decode(*FlatCAMParallel.encode(value))
+        self.assertTrue(result["geo"][0].equals(value["geo"][0]))
+        self.assertTrue(result["geo"][1][0].equals(value["geo"][1][0]))
+        self.assertEqual(result["geo"][1][1], None)
+        self.assertEqual(result["kind"], ["C", "F"])
+        self.assertEqual(result["n"], 1.5)
+
+    def test_run(self):
+        Geometry.defaults["buffer_min_items"] = 123
+        try:
+            result = FlatCAMParallel.run(job_args, 7, square(0, 0, 2))
+        finally:
+            Geometry.defaults["buffer_min_items"] = 500
+
+        self.assertEqual(result["value"], 7)
+        self.assertEqual(result["area"], 4)
+        # Defaults are the same as in this process.
+        self.assertEqual(result["defaults"]["buffer_min_items"], 123)
+
+    def test_paint(self):
+        expected = FlatCAMParallel.paint_polygons(self.polygons, 0.2, 0.15, "standard", 0.1)
+
+        result = FlatCAMParallel.paint_geometry(MultiPolygon(self.polygons), 0.2, 0.15,
+                                                method="standard", margin=0.1)
+
+        self.assertEqual(len(result), len(expected))
+        for a, b in zip(result, expected):
+            self.assertTrue(a.equals_exact(b, 0))
+
+    def test_paint_progress(self):
+        expected = FlatCAMParallel.paint_polygons(self.polygons, 0.2, 0.15, "seed", 0.0)
+
+        # One job per polygon, in the pool and here.
+        for processes in [2, 0]:
+            FlatCAMParallel.defaults["worker_processes"] = processes
+            try:
+                done = []
+                result = FlatCAMParallel.paint_geometry(self.polygons, 0.2, 0.15, method="seed",
+                                                        njobs=len(self.polygons), progress=done.append)
+            finally:
+                FlatCAMParallel.defaults["worker_processes"] = 2
+
+            self.assertEqual(len(done), len(self.polygons))
+            self.assertEqual(done, sorted(done))
+            self.assertEqual(done[-1], 1.0)
+            self.assertEqual(len(result), len(expected))
+            for a, b in zip(result, expected):
+                self.assertTrue(a.equals_exact(b, 0))
+
+    def test_cncjob(self):
+        geometry = [poly.exterior for poly in self.polygons] + [Point(20, 20)]
+        params = {"units": "IN", "z_cut": -0.01, "z_move": 0.1, "feedrate": 5.0,
+                  "spindlespeed": None, "tooldia": 0.1, "multidepth": False,
+                  "depthpercut": None, "tolerance": 0.0005}
+
+        result = FlatCAMParallel.run(FlatCAMParallel.generate_cncjob, geometry, params)
+
+        geo = Geometry()
+        geo.solid_geometry = geometry
+        job = CNCjob(units="IN", z_cut=-0.01, z_move=0.1, feedrate=5.0, tooldia=0.1)
+        job.generate_from_geometry_2(geo, tolerance=0.0005)
+        job.gcode_parse()
+
+        self.assertEqual(result["gcode"], job.gcode)
+        self.assertEqual(len(result["gcode_parsed"]), len(job.gcode_parsed))
+        for a, b in zip(result["gcode_parsed"], job.gcode_parsed):
+            self.assertEqual(a["kind"], b["kind"])
+            self.assertTrue(a["geom"].equals_exact(b["geom"], 0))
+
+    def test_panelize(self):
+        offsets = panel_offsets(3, 4, 10.0, 20.0)
+        self.assertEqual(len(offsets), 12)
+        self.assertEqual(offsets[:2], [(0.0, 0.0), (10.0, 0.0)])
+        self.assertEqual(offsets[-1], (30.0, 40.0))
+
+        geometry = [square(0, 0, 2), [LineString([(0, 0), (1, 1)]), None]]
+        cells = FlatCAMParallel.panelize_geometry(geometry, offsets)
+
+        self.assertEqual(len(cells), 12)
+        for (dx, dy), cell in zip(offsets, cells):
+            self.assertTrue(cell[0].equals(square(dx, dy, 2)))
+            self.assertTrue(cell[1][0].equals(LineString([(dx, dy), (dx + 1, dy + 1)])))
+            self.assertEqual(cell[1][1], None)
+
+    def test_disabled(self):
+        FlatCAMParallel.defaults["worker_processes"] = 0
+        try:
+            self.assertIsNone(FlatCAMParallel.get_pool())
+            geo = square(0, 0, 1)
+            result = FlatCAMParallel.run(job_args, geo, geo)
+            # Not copied, ran here.
+            self.assertTrue(result["value"] is geo)
+        finally:
+            FlatCAMParallel.defaults["worker_processes"] = 2
+
+    def test_chunks(self):
+        self.assertEqual(FlatCAMParallel.chunks(list(range(5)), 2), [[0, 1, 2], [3, 4]])
+        self.assertEqual(FlatCAMParallel.chunks(list(range(2)), 4), [[0], [1]])
+        self.assertEqual(FlatCAMParallel.chunks([], 4), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
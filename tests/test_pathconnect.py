@@ -1,3 +1,4 @@
+import time
 import unittest
 
 from shapely.geometry import LineString, Polygon
@@ -84,5 +85,93 @@ class PathConnectTest1(unittest.TestCase):
         matches = [p for p in result if p.equals(LineString([[0, 0], [1, 1], [2, 1]]))]
         self.assertEqual(len(matches), 1)
 
+
+class PathConnectTest2(unittest.TestCase):
+
+    def test_reversed_chain(self):
+        paths = [
+            LineString([[2, 1], [1, 1]]),
+            LineString([[3, 0], [2, 1]]),
+            LineString([[0, 0], [1, 1]])
+        ]
+
+        result = list(Geometry.path_connect(mkstorage(paths)).get_objects())
+        self.assertEqual(len(result), 1)
+        self.assertTrue(result[0].equals(LineString([[0, 0], [1, 1], [2, 1], [3, 0]])))
+
+        # Joints are not repeated.
+        self.assertEqual(len(result[0].coords), 4)
+
+    def test_closed_chain(self):
+        paths = [
+            LineString([[0, 0], [1, 0]]),
+            LineString([[1, 1], [1, 0]]),
+            LineString([[1, 1], [0, 1]]),
+            LineString([[0, 1], [0, 0]])
+        ]
+
+        result = list(Geometry.path_connect(mkstorage(paths)).get_objects())
+        self.assertEqual(len(result), 1)
+        self.assertEqual(len(result[0].coords), 5)
+        self.assertEqual(result[0].coords[0], result[0].coords[-1])
+
+    def test_rings_untouched(self):
+        ring = LinearRing([[1, 1], [2, 2], [1, 3], [0, 2]])
+        paths = [ring, LineString([[1, 1], [5, 5]])]
+
+        result = list(Geometry.path_connect(mkstorage(paths)).get_objects())
+        self.assertEqual(len(result), 2)
+        self.assertTrue(result[0] is ring)
+        self.assertTrue(result[1].equals(paths[1]))
+
+    def test_result_index(self):
+        paths = [
+            LineString([[0, 0], [1, 1]]),
+            LineString([[1, 1], [2, 1]]),
+            LineString([[5, 5], [6, 5]])
+        ]
+
+        result = Geometry.path_connect(mkstorage(paths))
+        pt, geo = result.nearest((2.1, 1))
+        self.assertEqual(pt, (2, 1))
+        self.assertTrue(geo.equals(LineString([[0, 0], [1, 1], [2, 1]])))
+
+        result.remove(geo)
+        pt, geo = result.nearest((2.1, 1))
+        self.assertEqual(pt, (5, 5))
+
+    def test_empty(self):
+        result = Geometry.path_connect(mkstorage([]))
+        self.assertEqual(list(result.get_objects()), [])
+
+    def test_many_fragments(self):
+        # 1000 zig-zag paths cut into 100 fragments each,
+        # shuffled and randomly reversed.
+        paths = []
+        points = []
+        for c in range(1000):
+            pts = [(c * 1.0, j * 0.1 + random() * 0.01) for j in range(101)]
+            for j in range(100):
+                seg = [pts[j], pts[j + 1]]
+                if random() < 0.5:
+                    seg = seg[::-1]
+                paths.append(LineString(seg))
+                points.append(seg)
+
+        order = sorted(range(len(paths)), key=lambda i: random())
+        storage = FlatCAMRTreeStorage()
+        storage.get_points = lambda o: [o.coords[0], o.coords[-1]]
+        storage.insert_many([paths[i] for i in order], points=[points[i] for i in order])
+
+        start = time.time()
+        result = list(Geometry.path_connect(storage).get_objects())
+        elapsed = time.time() - start
+        print("path_connect() of %d fragments: %.3f s" % (len(paths), elapsed))
+
+        self.assertEqual(len(result), 1000)
+        self.assertEqual(sum(len(geo.coords) for geo in result), 101000)
+        self.assertLess(elapsed, 2.0)  # Well under 1 s on a typical machine.
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
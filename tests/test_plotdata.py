@@ -0,0 +1,124 @@
+import unittest
+
+import numpy as np
+from shapely.geometry import Point, Polygon, LineString
+
+from camlib import polygon_paths, line_segments
+from FlatCAMPlot import polygon_data, line_data, prepare_plots
+
+
+class PlotDataTest(unittest.TestCase):
+
+    def setUp(self):
+        # Drill sized holes in a board, and traces.
+        board = Polygon([(0, 0), (100, 0), (100, 50), (0, 50)],
+                        [Point(x, 25).buffer(1.0).exterior.coords for x in range(10, 100, 20)])
+        pads = [Point(x, y).buffer(0.5) for x in range(5, 100, 10) for y in (5, 45)]
+        self.polygons = [board, pads]
+        self.lines = [LineString([(x, 5), (x, 45)]) for x in range(5, 100, 10)] + [board]
+
+    def test_full(self):
+        # Same paths as without levels of detail.
+        data, skipped = polygon_data(self.polygons + [Point(0, 0)])
+        paths, expected_skipped = polygon_paths(self.polygons + [Point(0, 0)])
+        self.assertEqual(skipped, expected_skipped)
+        self.assertEqual(len(data), len(paths))
+        for a, b in zip(data.get_paths(), paths):
+            np.testing.assert_array_equal(a.vertices, b.vertices)
+            np.testing.assert_array_equal(a.codes, b.codes)
+
+        data, skipped = line_data(self.lines)
+        lines, _ = line_segments(self.lines)
+        self.assertEqual(len(data), len(lines))
+        for a, b in zip(data.get_paths(), lines):
+            np.testing.assert_array_equal(a.vertices, b)
+
+        self.assertEqual(data.bounds(), (0.0, 0.0, 100.0, 50.0))
+
+    def test_pixel_accurate(self):
+        data, _ = polygon_data(self.polygons)
+        full = data.get_paths()
+        full_vertices = sum(len(path.vertices) for path in full)
+
+        for level in range(-6, 4):
+            pixel = 2.0 ** level
+            paths = data.get_paths(level)
+            self.assertEqual(len(paths), len(full))
+            self.assertLessEqual(sum(len(path.vertices) for path in paths), full_vertices)
+
+            for path, original in zip(paths, full):
+                # Same rings, each within a pixel of the original.
+                self.assertEqual(list(path.codes).count(1), list(original.codes).count(1))
+                for ring, original_ring in zip(path.to_polygons(closed_only=False),
+                                               original.to_polygons(closed_only=False)):
+                    np.testing.assert_array_equal(ring[0], original_ring[0])
+                    np.testing.assert_array_equal(ring[-1], original_ring[-1])
+                    if len(ring) > 1:
+                        self.assertLessEqual(LineString(ring).hausdorff_distance(LineString(original_ring)),
+                                             pixel)
+
+        # Coarse levels are simpler, fine ones are the geometry.
+        self.assertLess(sum(len(path.vertices) for path in data.get_paths(0)), full_vertices / 4)
+        self.assertIs(data.get_paths(-8), full)
+        self.assertIs(data.get_paths(-9), full)
+
+    def test_select(self):
+        data, _ = polygon_data(self.polygons)
+        full = data.get_paths()
+
+        # Pads at x=45, y=5 and y=45, and the board.
+        paths = data.get_paths(None, (44.0, 0.0, 46.0, 50.0))
+        self.assertEqual(len(paths), 3)
+        self.assertIs(paths[0], full[0])
+
+        # Level and extents.
+        paths = data.get_paths(0, (44.0, 0.0, 46.0, 10.0))
+        self.assertEqual(len(paths), 2)
+        self.assertIs(paths[1], data.get_paths(0)[9])
+
+        self.assertIs(data.get_paths(None, (-10.0, -10.0, 110.0, 60.0)), full)
+        self.assertEqual(data.get_paths(None, (200.0, 0.0, 300.0, 10.0)), [])
+
+    def test_geometry_untouched(self):
+        before = [pad.wkb for pad in self.polygons[1]]
+        data, _ = polygon_data(self.polygons)
+        data.get_paths(2)
+        self.assertEqual([pad.wkb for pad in self.polygons[1]], before)
+
+    def test_empty(self):
+        data, _ = line_data([])
+        self.assertEqual(len(data), 0)
+        self.assertIsNone(data.bounds())
+        self.assertEqual(data.get_paths(3), [])
+
+
+class PreparedObject(object):
+
+    def __init__(self, geometry):
+        self.options = {"name": "obj", "plot": True}
+        self.geometry = geometry
+        self.prepared_plot = None
+
+    def prepare_plot(self):
+        if self.geometry is None:
+            raise ValueError("No geometry")
+        self.prepared_plot = polygon_data(self.geometry)[0]
+
+
+class PreparePlotsTest(unittest.TestCase):
+
+    def test_prepare(self):
+        objects = [PreparedObject([Point(i, 0).buffer(1.0)]) for i in range(10)]
+        objects.insert(3, PreparedObject(None))
+
+        done = []
+        prepare_plots(objects, workers=4, progress=done.append)
+
+        self.assertEqual(done[-1], 1.0)
+        self.assertIsNone(objects[3].prepared_plot)
+        for i, obj in enumerate(objects[:3] + objects[4:]):
+            self.assertEqual(obj.prepared_plot.bounds(), (i - 1.0, -1.0, i + 1.0, 1.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+from shapely.geometry import Polygon
+
+import FlatCAMProfile
+from camlib import Gerber, Geometry
+
+
+class ProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        FlatCAMProfile.history.clear()
+
+    def tearDown(self):
+        FlatCAMProfile.history.clear()
+        FlatCAMProfile.defaults["profile_dir"] = ""
+
+    def test_stages(self):
+        with FlatCAMProfile.job("Test job") as profile:
+            with FlatCAMProfile.stage("parse", items=3) as parse:
+                parse.add(2)
+                with FlatCAMProfile.stage("union"):
+                    sum(range(10000))
+            with FlatCAMProfile.stage("parse"):
+                pass
+
+        self.assertEqual(list(FlatCAMProfile.history), [profile])
+        self.assertEqual(list(profile.stages.keys()), ["parse", "union"])
+
+        parse = profile.stages["parse"]
+        union = profile.stages["union"]
+        self.assertEqual(parse.calls, 2)
+        self.assertEqual(parse.items, 5)
+        self.assertEqual(union.calls, 1)
+        self.assertGreaterEqual(parse.wall, union.wall)
+        self.assertAlmostEqual(parse.self_wall, parse.wall - union.wall)
+        self.assertGreater(parse.peak_memory, 0)
+        self.assertGreaterEqual(profile.wall, parse.wall)
+
+    def test_timeline(self):
+        startup = FlatCAMProfile.Timeline("Startup")
+        startup.phase("import")
+        startup.phase("gui")
+        sum(range(10000))
+        startup.phase("import")
+        profile = startup.finish()
+
+        self.assertEqual(list(FlatCAMProfile.history), [profile])
+        self.assertEqual(list(profile.stages.keys()), ["import", "gui"])
+        self.assertEqual(profile.stages["import"].calls, 2)
+        self.assertEqual(profile.stages["gui"].calls, 1)
+        # Not nested.
+        self.assertAlmostEqual(profile.stages["gui"].self_wall, profile.stages["gui"].wall)
+        self.assertGreaterEqual(profile.wall, profile.stages["import"].wall + profile.stages["gui"].wall)
+
+    def test_no_job(self):
+        # Not recorded, but works.
+        with FlatCAMProfile.stage("parse") as parse:
+            parse.add(1)
+        FlatCAMProfile.add_items(1)
+        self.assertIsNone(FlatCAMProfile.get_current_profile())
+        self.assertEqual(len(FlatCAMProfile.history), 0)
+
+    def test_nested_job(self):
+        with FlatCAMProfile.job("Outer") as outer:
+            with FlatCAMProfile.job("Inner") as inner:
+                with FlatCAMProfile.stage("emit"):
+                    pass
+        self.assertTrue(inner is outer)
+        self.assertEqual(list(FlatCAMProfile.history), [outer])
+        self.assertIn("emit", outer.stages)
+
+    def test_thread(self):
+        seen = []
+        with FlatCAMProfile.job("Job"):
+            thread = threading.Thread(target=lambda: seen.append(FlatCAMProfile.get_current_profile()))
+            thread.start()
+            thread.join(5)
+        self.assertEqual(seen, [None])
+
+    def test_progress(self):
+        progress = []
+        with FlatCAMProfile.job("Job") as profile:
+            profile.expect("parse", "union")
+            profile.connect_progress(progress.append)
+            with FlatCAMProfile.stage("parse"):
+                pass
+            with FlatCAMProfile.stage("other"):
+                pass
+            with FlatCAMProfile.stage("union"):
+                pass
+        self.assertEqual(progress, [50, 100])
+
+    def test_gerber(self):
+        gerber = Gerber()
+        with FlatCAMProfile.job("Open Gerber") as profile:
+            gerber.parse_lines(["%FSLAX24Y24*%", "%MOIN*%", "%ADD10C,0.0100*%",
+                                "D10*", "X0Y0D02*", "X10000Y0D01*", "M02*"])
+
+        self.assertEqual(profile.stages["parse"].calls, 1)
+        self.assertEqual(profile.stages["parse"].items, 7)
+        self.assertEqual(profile.stages["union"].items, 1)
+
+    def test_paint(self):
+        square = Polygon([(0, 0), (1, 0), (1, 1), (0, 1)])
+        with FlatCAMProfile.job("Paint") as profile:
+            Geometry.clear_polygon(square, 0.1)
+        self.assertEqual(profile.stages["paint"].calls, 1)
+        self.assertEqual(profile.stages["order"].calls, 1)
+
+    def test_dump(self):
+        folder = tempfile.mkdtemp()
+        try:
+            FlatCAMProfile.defaults["profile_dir"] = folder
+            with FlatCAMProfile.job("Opening Gerber"):
+                with FlatCAMProfile.stage("parse", items=4):
+                    pass
+
+            names = os.listdir(folder)
+            self.assertEqual(len(names), 1)
+            self.assertTrue(names[0].endswith("-opening_gerber.json"))
+            with open(os.path.join(folder, names[0])) as f:
+                data = json.load(f)
+            self.assertEqual(data["descr"], "Opening Gerber")
+            self.assertEqual(data["stages"][0]["name"], "parse")
+            self.assertEqual(data["stages"][0]["items"], 4)
+        finally:
+            shutil.rmtree(folder)
+
+    def test_tracing(self):
+        FlatCAMProfile.set_tracing(True)
+        try:
+            with FlatCAMProfile.job("Job") as profile:
+                with FlatCAMProfile.stage("small"):
+                    pass
+                with FlatCAMProfile.stage("big"):
+                    data = [0] * 1000000
+                    del data
+        finally:
+            FlatCAMProfile.set_tracing(False)
+
+        self.assertGreater(profile.stages["big"].peak_memory, 4000000)
+        self.assertLess(profile.stages["small"].peak_memory, 4000000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import simplejson as json
+from shapely.geometry import LineString, LinearRing, Point, Polygon
+
+import camlib
+import FlatCAMProject
+
+
+def mkproject():
+    """
+    Serialized objects as FlatCAMObj.to_dict() would return them.
+    """
+    gerber = camlib.Gerber()
+    gerber.parse_file("tests/gerber_files/simple1.gbr")
+    gerber_d = gerber.to_dict()
+    gerber_d.update({"kind": "gerber", "options": {"name": "simple1.gbr", "plot": True}})
+
+    excellon = camlib.Excellon()
+    excellon.parse_file("tests/excellon_files/case1.drl")
+    excellon.create_geometry()
+    excellon_d = excellon.to_dict()
+    excellon_d.update({"kind": "excellon", "options": {"name": "case1.drl"}})
+
+    geometry = camlib.Geometry()
+    geometry.solid_geometry = [LinearRing([(0, 0), (1, 0), (1, 1)]),
+                               [LineString([(2, 2), (3, 3)]), Point(5, 5)],
+                               Polygon([(0, 0), (4, 0), (4, 4)])]
+    geometry_d = geometry.to_dict()
+    geometry_d.update({"kind": "geometry", "options": {"name": "geo", "cnctooldia": 0.1}})
+
+    return {"objs": [gerber_d, excellon_d, geometry_d],
+            "options": {"units": "IN"},
+            "version": 8.5}
+
+
+class ProjectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.project = mkproject()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def assertSameData(self, a, b, tolerance=0.0):
+        if isinstance(a, camlib.BaseGeometry):
+            self.assertEqual(type(a), type(b))
+            self.assertTrue(a.equals_exact(b, tolerance) or (a.is_empty and b.is_empty))
+        elif isinstance(a, camlib.ApertureMacro):
+            self.assertEqual(a.to_dict(), b.to_dict())
+        elif isinstance(a, dict):
+            self.assertEqual(sorted(a.keys()), sorted(str(k) for k in b.keys()))
+            for key in a:
+                self.assertSameData(a[key], b[str(key)], tolerance)
+        elif isinstance(a, (list, tuple)):
+            self.assertEqual(len(a), len(b))
+            for x, y in zip(a, b):
+                self.assertSameData(x, y, tolerance)
+        else:
+            self.assertEqual(a, b)
+
+    def test_roundtrip(self):
+        for compression in [True, False]:
+            filename = os.path.join(self.dir, "project%d.fcp" % compression)
+            FlatCAMProject.write_project(filename, self.project["objs"],
+                                         self.project["options"], self.project["version"],
+                                         compression=compression)
+
+            self.assertFalse(FlatCAMProject.is_legacy(filename))
+            d = FlatCAMProject.read_project(filename)
+            self.assertEqual(d["options"], self.project["options"])
+            self.assertEqual(d["version"], self.project["version"])
+            self.assertSameData(self.project["objs"], d["objs"])
+
+    def test_legacy(self):
+        filename = os.path.join(self.dir, "legacy.fcp")
+        with open(filename, 'w') as f:
+            json.dump(self.project, f, default=camlib.to_dict, indent=2, sort_keys=True)
+
+        self.assertTrue(FlatCAMProject.is_legacy(filename))
+        d = FlatCAMProject.read_project(filename)
+        self.assertEqual(d["options"], self.project["options"])
+
+        # WKT is not exact.
+        self.assertSameData(self.project["objs"], d["objs"], tolerance=1e-9)
+
+    def test_reader(self):
+        filename = os.path.join(self.dir, "project.fcp")
+        FlatCAMProject.write_project(filename, self.project["objs"],
+                                     self.project["options"], self.project["version"])
+
+        reader = FlatCAMProject.ProjectReader(filename)
+        self.assertEqual([e["kind"] for e in reader.objects], ["gerber", "excellon", "geometry"])
+        self.assertEqual(reader.objects[2]["options"], {"name": "geo", "cnctooldia": 0.1})
+
+        d = reader.read_object(reader.objects[2])
+        self.assertSameData(self.project["objs"][2], d)
+
+    def test_header(self):
+        filename = os.path.join(self.dir, "project.fcp")
+        objs = self.project["objs"]
+        bounds = [(0, 0, 1, 2), None, (0, 0, 5, 5)]
+        FlatCAMProject.write_project(filename, objs, self.project["options"],
+                                     self.project["version"], bounds=bounds)
+
+        # Enough to list the objects without reading them.
+        reader = FlatCAMProject.ProjectReader(filename)
+        for entry, d, obj_bounds in zip(reader.objects, objs, bounds):
+            self.assertEqual(entry["bounds"], list(obj_bounds) if obj_bounds else None)
+            header = FlatCAMProject.read_header(entry)
+            self.assertEqual(header, {"kind": d["kind"], "options": d["options"],
+                                      "units": d["units"]})
+
+    def test_geometry_bounds(self):
+        geometry = camlib.Geometry()
+        geometry.solid_geometry = [LineString([(2, 2), (3, 3)]), Point(5, -1),
+                                   Polygon([(0, 0), (4, 0), (4, 4)]), LineString()]
+        self.assertEqual(geometry.bounds(), (0, -1, 5, 4))
+
+    def test_incremental(self):
+        filename = os.path.join(self.dir, "project.fcp")
+        objs = self.project["objs"]
+        FlatCAMProject.write_project(filename, objs[:2], self.project["options"],
+                                     self.project["version"])
+        previous = FlatCAMProject.ProjectReader(filename).objects
+
+        # Saved again over itself: the first object is copied
+        # with new options, the second is dropped and a new one added.
+        entry = dict(previous[0], options={"name": "renamed"})
+        items = [{"source": filename, "entry": entry},
+                 {"object": objs[2], "bounds": (0, 0, 5, 5), "name": "abc"}]
+        entries = FlatCAMProject.write_snapshot(filename, items, {"units": "MM"}, 8.6)
+
+        reader = FlatCAMProject.ProjectReader(filename)
+        self.assertEqual(reader.objects, entries)
+        self.assertEqual(reader.options, {"units": "MM"})
+        self.assertEqual(entries[0]["data"], previous[0]["data"])
+        self.assertEqual(entries[1]["data"], "objects/abc.json")
+
+        d = reader.read_object(reader.objects[0])
+        self.assertEqual(d["options"], {"name": "renamed"})
+        d["options"] = objs[0]["options"]
+        self.assertSameData(objs[0], d)
+        self.assertSameData(objs[2], reader.read_object(reader.objects[1]))
+        self.assertEqual(os.listdir(self.dir), ["project.fcp"])
+
+    def test_atomic(self):
+        filename = os.path.join(self.dir, "project.fcp")
+        FlatCAMProject.write_project(filename, self.project["objs"],
+                                     self.project["options"], self.project["version"])
+        with open(filename, 'rb') as f:
+            before = f.read()
+
+        # Object can't be serialized.
+        items = [{"object": {"kind": "geometry", "options": {}, "solid_geometry": object()}}]
+        self.assertRaises(TypeError, FlatCAMProject.write_snapshot,
+                          filename, items, {}, 8.5)
+
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), before)
+        self.assertEqual(os.listdir(self.dir), ["project.fcp"])
+
+    def test_snapshot(self):
+        d = {"tools": {"1": {"C": 0.1}}, "drills": [{"point": Point(0, 0)}]}
+        copy = FlatCAMProject.snapshot(d)
+        d["tools"]["1"]["C"] = 0.2
+        d["drills"].append(None)
+        self.assertEqual(copy["tools"]["1"]["C"], 0.1)
+        self.assertEqual(len(copy["drills"]), 1)
+        self.assertTrue(copy["drills"][0]["point"] is d["drills"][0]["point"])
+
+
+class GeometryBlobTest(unittest.TestCase):
+
+    def test_pack(self):
+        geometries = [Point(1, 2), LinearRing([(0, 0), (1, 0), (1, 1)]),
+                      LineString([(0, 0), (1, 1)]), Point(1, 2, 3),
+                      Polygon([(0, 0), (1, 0), (1, 1)], [[(0.1, 0.05), (0.9, 0.05), (0.9, 0.8)]])]
+        result = FlatCAMProject.unpack_geometry(FlatCAMProject.pack_geometry(geometries))
+
+        self.assertEqual(len(result), len(geometries))
+        for a, b in zip(geometries, result):
+            self.assertEqual(type(a), type(b))
+            self.assertEqual(a.wkb, b.wkb)
+
+    def test_empty(self):
+        self.assertEqual(FlatCAMProject.unpack_geometry(FlatCAMProject.pack_geometry([])), [])
+
+    def test_bad_blob(self):
+        self.assertRaises(ValueError, FlatCAMProject.unpack_geometry, b"nope")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from PyQt4 import QtCore
+from shapely.geometry import Polygon
+
+from FlatCAMBatch import BatchApp
+
+
+class ProjectSaveTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.qapp = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication(sys.argv)
+        cls.fc = BatchApp(user_defaults=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fc.shutdown()
+        del cls.fc
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fc.run_script('new')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_modified_in_place(self):
+        filename = os.path.join(self.dir, "project.fcp")
+        triangle = Polygon([(5, 5), (6, 5), (6, 6)])
+
+        self.fc.run_script('new_geometry geo; add_polygon geo 0 0 1 0 1 1')
+        self.fc.save_project(filename, background=False)
+
+        # Appended to solid_geometry, not set.
+        self.fc.run_script('add_polygon geo 5 5 6 5 6 6')
+        self.assertIsNone(self.fc.collection.get_by_name("geo").get_saved())
+        self.fc.save_project(filename, background=False)
+
+        self.fc.open_project(filename)
+        geo = self.fc.collection.get_by_name("geo")
+        self.assertEqual(len(geo.solid_geometry), 2)
+        self.assertTrue(geo.solid_geometry[1].equals(triangle))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+
+import numpy as np
+from shapely.geometry import Point, LineString, Polygon, box
+
+from FlatCAMSnap import SnapIndex, geometry_arrays
+
+
+class SnapIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        # Pads, traces and an outline with a hole.
+        self.shapes = {}
+        for i in range(200):
+            self.shapes["pad%d" % i] = Point(i % 20, i // 20).buffer(0.3, 4)
+        for i in range(10):
+            self.shapes["trace%d" % i] = LineString([(0, i + 0.5), (19, i + 0.5), (19.5, i + 1)])
+        self.shapes["outline"] = Polygon([(-1, -1), (20, -1), (20, 10), (-1, 10)],
+                                         [[(5, 5), (6, 5), (6, 6)]])
+        self.shapes["point"] = Point(25, 25)
+
+        self.index = SnapIndex()
+        for key, geo in self.shapes.items():
+            self.index.add(key, geo)
+
+        self.rng = np.random.RandomState(0)
+
+    def brute_vertices(self, pt):
+        return sorted((np.hypot(x - pt[0], y - pt[1]), (x, y), key)
+                      for key, geo in self.shapes.items()
+                      for x, y in geometry_arrays(geo)[0])
+
+    def test_nearest(self):
+        for pt in self.rng.uniform(-2, 22, (50, 2)):
+            expected = self.brute_vertices(pt)
+            for k, max_distance in [(1, None), (3, None), (5, 0.5), (1, 0.01)]:
+                result = self.index.nearest(tuple(pt), k=k, max_distance=max_distance)
+                within = [e for e in expected if max_distance is None or e[0] <= max_distance]
+                self.assertEqual([r[0] for r in result], [e[0] for e in within[:k]])
+                for distance, point, key in result:
+                    self.assertAlmostEqual(self.shapes[key].distance(Point(point)), 0.0)
+
+    def test_snap(self):
+        for pt in self.rng.uniform(-2, 22, (200, 2)):
+            p = Point(pt)
+
+            # Vertices only.
+            result = self.index.snap(tuple(pt), 0.3)
+            expected = self.brute_vertices(pt)[0]
+            if expected[0] <= 0.3:
+                self.assertAlmostEqual(result[0], expected[0])
+            else:
+                self.assertIsNone(result)
+
+            # Edges too: vertices win if close enough.
+            result = self.index.snap(tuple(pt), 0.3, edges=True)
+            edge_distance = min(geo.boundary.distance(p) if isinstance(geo, Polygon) else geo.distance(p)
+                                for geo in self.shapes.values())
+            if expected[0] <= 0.3:
+                self.assertAlmostEqual(result[0], expected[0])
+            elif edge_distance <= 0.3:
+                self.assertAlmostEqual(result[0], edge_distance)
+                geo = self.shapes[result[2]]
+                self.assertAlmostEqual(geo.boundary.distance(Point(result[1])) if isinstance(geo, Polygon)
+                                       else geo.distance(Point(result[1])), 0.0)
+            else:
+                self.assertIsNone(result)
+
+    def test_midpoints(self):
+        result = self.index.snap((9.5, 0.6), 0.2, vertices=False, midpoints=True)
+        self.assertEqual(result[1], (9.5, 0.5))
+        self.assertEqual(result[2], "trace0")
+        self.assertIsNone(self.index.snap((9.5, 0.6), 0.2))
+
+    def test_incremental(self):
+        # Cached region, then changes.
+        self.assertEqual(self.index.snap((25.1, 25.0), 0.2)[2], "point")
+
+        self.index.remove("point")
+        self.assertIsNone(self.index.snap((25.1, 25.0), 0.2))
+
+        self.index.add("square", box(24, 24, 25, 25))
+        self.assertEqual(self.index.snap((25.1, 25.0), 0.2)[1], (25.0, 25.0))
+
+        # Replaced.
+        self.index.add("square", box(26, 26, 27, 27))
+        self.assertIsNone(self.index.snap((25.1, 25.0), 0.2))
+
+        # Many changes, so the arrays are packed again.
+        for key in list(self.shapes.keys())[:150]:
+            self.index.remove(key)
+        for i in range(2000):
+            self.index.add(("new", i), Point(100 + i, 0).buffer(0.3, 4))
+        self.assertEqual(len(self.index), len(self.shapes) - 150 + 2000)
+        self.assertEqual(self.index.snap((1500.0, 0.29), 0.1)[2], ("new", 1400))
+        self.assertIsNone(self.index.snap((0.0, 0.29), 0.1))
+        self.assertEqual(self.index.nearest((0.0, 0.29))[0][2], "trace0")
+
+    def test_empty(self):
+        index = SnapIndex()
+        self.assertEqual(index.nearest((0, 0)), [])
+        self.assertIsNone(index.snap((0, 0), 1.0, midpoints=True, edges=True))
+
+        index.add("a", Point(0, 0))
+        index.remove("a")
+        self.assertIsNone(index.snap((0, 0), 1.0, midpoints=True, edges=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
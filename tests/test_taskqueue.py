@@ -0,0 +1,171 @@
+import threading
+import time
+import unittest
+
+from shapely.geometry import Polygon
+
+from camlib import Geometry
+from FlatCAMCommon import TaskQueue, CancellationToken, TaskCancelled, \
+    check_cancelled, get_current_token, set_current_token
+
+
+def run_pool(queue, n):
+    """
+    Starts n threads running tasks from the queue.
+    """
+
+    def run():
+        while True:
+            task = queue.get()
+            if task is None:
+                return
+            try:
+                if not task['token'].cancelled:
+                    task['fcn'](*task['params'])
+            except TaskCancelled:
+                pass
+            finally:
+                queue.done(task)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+class TaskQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = TaskQueue()
+        self.threads = []
+
+    def tearDown(self):
+        self.queue.close()
+        for thread in self.threads:
+            thread.join(5)
+
+    def test_priority(self):
+        order = []
+        for name, priority in [("a", 0), ("b", 5), ("c", 0), ("d", -1), ("e", 5)]:
+            self.queue.put({'fcn': order.append, 'params': [name], 'priority': priority})
+
+        self.threads = run_pool(self.queue, 1)
+        while len(order) < 5:
+            time.sleep(0.01)
+        self.assertEqual(order, ["b", "e", "a", "c", "d"])
+
+    def test_parallel(self):
+        # Would deadlock if both did not run at the same time.
+        barrier = threading.Barrier(2, timeout=5)
+        done = []
+
+        def task():
+            barrier.wait()
+            done.append(True)
+
+        self.queue.put({'fcn': task, 'params': []})
+        self.queue.put({'fcn': task, 'params': []})
+        self.threads = run_pool(self.queue, 2)
+        while len(done) < 2:
+            time.sleep(0.01)
+        self.assertFalse(barrier.broken)
+
+    def test_lock(self):
+        running = {"obj": 0, "max": 0}
+        guard = threading.Lock()
+
+        def task():
+            with guard:
+                running["obj"] += 1
+                running["max"] = max(running["max"], running["obj"])
+            time.sleep(0.02)
+            with guard:
+                running["obj"] -= 1
+
+        done = []
+        for i in range(6):
+            self.queue.put({'fcn': task, 'params': [], 'lock': "obj"})
+        self.queue.put({'fcn': done.append, 'params': [True]})
+
+        self.threads = run_pool(self.queue, 3)
+        while len(self.queue) > 0 or running["obj"] > 0:
+            time.sleep(0.01)
+
+        self.assertEqual(running["max"], 1)
+        self.assertEqual(done, [True])
+
+    def test_cancel(self):
+        started = threading.Event()
+        ran = []
+
+        def long_task(token):
+            started.set()
+            while True:
+                token.check()
+                time.sleep(0.001)
+
+        token = CancellationToken()
+        self.queue.put({'fcn': long_task, 'params': [token], 'token': token})
+        self.queue.put({'fcn': ran.append, 'params': [True]})
+        self.threads = run_pool(self.queue, 1)
+
+        started.wait(5)
+        self.queue.cancel_all()
+        self.queue.close()
+        self.threads[0].join(5)
+
+        self.assertFalse(self.threads[0].is_alive())
+        self.assertTrue(token.cancelled)
+        self.assertEqual(ran, [])
+
+    def test_token(self):
+        token = CancellationToken()
+        token.check()
+        token.cancel()
+        self.assertRaises(TaskCancelled, token.check)
+
+    def test_current_token(self):
+        # No token: never cancelled.
+        self.assertIsNone(get_current_token())
+        check_cancelled()
+
+        token = CancellationToken()
+        previous = set_current_token(token)
+        try:
+            check_cancelled()
+            token.cancel()
+            self.assertRaises(TaskCancelled, check_cancelled)
+        finally:
+            set_current_token(previous)
+
+        self.assertIsNone(get_current_token())
+        check_cancelled()
+
+    def test_current_token_thread(self):
+        token = CancellationToken()
+        token.cancel()
+        set_current_token(token)
+        try:
+            seen = []
+            thread = threading.Thread(target=lambda: seen.append(get_current_token()))
+            thread.start()
+            thread.join(5)
+            # Per thread.
+            self.assertEqual(seen, [None])
+        finally:
+            set_current_token(None)
+
+    def test_cancel_geometry(self):
+        square = Polygon([(0, 0), (10, 0), (10, 10), (0, 10)])
+        token = CancellationToken()
+        token.cancel()
+        previous = set_current_token(token)
+        try:
+            self.assertRaises(TaskCancelled, Geometry.clear_polygon, square, 0.1)
+            self.assertRaises(TaskCancelled, Geometry.clear_polygon3, square, 0.1)
+        finally:
+            set_current_token(previous)
+
+
+if __name__ == '__main__':
+    unittest.main()
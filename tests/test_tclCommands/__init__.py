@@ -16,3 +16,4 @@ from .test_TclCommandNewGeometry  import *
 from .test_TclCommandOpenExcellon import *
 from .test_TclCommandOpenGerber import *
 from .test_TclCommandPaintPolygon import *
+from .test_TclCommandWait import *
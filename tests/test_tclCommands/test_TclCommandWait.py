@@ -0,0 +1,30 @@
+from FlatCAMObj import FlatCAMGerber, FlatCAMGeometry
+
+
+def test_wait(self):
+    """
+    Test isolating two layers at the same time with -async
+    and waiting for them.
+    :param self:
+    :return:
+    """
+
+    for filename, name in [(self.copper_top_filename, self.gerber_top_name),
+                           (self.copper_bottom_filename, self.gerber_bottom_name)]:
+        self.fc.exec_command_test('open_gerber %s/%s -outname %s' % (self.gerber_files, filename, name))
+        self.assertTrue(isinstance(self.fc.collection.get_by_name(name), FlatCAMGerber))
+
+    # Returns at once with a handle.
+    top_job = self.fc.exec_command_test('isolate %s -dia %f -async 1'
+                                        % (self.gerber_top_name, self.engraver_diameter))
+    self.assertTrue(top_job in self.fc.tcl_jobs, "Expected a job handle, got %s" % top_job)
+
+    self.fc.exec_command_test('isolate %s -dia %f -async 1' % (self.gerber_bottom_name, self.engraver_diameter))
+
+    self.fc.exec_command_test('wait %s' % top_job)
+    self.assertFalse(top_job in self.fc.tcl_jobs)
+    self.assertTrue(isinstance(self.fc.collection.get_by_name(self.gerber_top_name + '_iso'), FlatCAMGeometry))
+
+    self.fc.exec_command_test('wait_all')
+    self.assertEqual(len(self.fc.tcl_jobs), 0)
+    self.assertTrue(isinstance(self.fc.collection.get_by_name(self.gerber_bottom_name + '_iso'), FlatCAMGeometry))
@@ -0,0 +1,111 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+
+from shapely.geometry import Point, LineString, Polygon, MultiPolygon
+from shapely.ops import unary_union
+import camlib
+import FlatCAMParallel
+from FlatCAMCommon import CancellationToken, TaskCancelled, set_current_token
+
+
+def mkgeometry(n, seed=0):
+    """
+    Random mix of pads and traces, some of them overlapping.
+    """
+    rnd = Random(seed)
+    geo = []
+    for i in range(n):
+        x, y = rnd.uniform(0, 50), rnd.uniform(0, 50)
+        if i % 2:
+            geo.append(Point(x, y).buffer(rnd.uniform(0.05, 0.4)))
+        else:
+            geo.append(LineString([(x, y), (x + rnd.uniform(-3, 3),
+                                            y + rnd.uniform(-3, 3))]).buffer(0.1))
+    return geo
+
+
+class TiledBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parts = mkgeometry(1200)
+        self.solid = unary_union(self.parts)
+        self.executor = ThreadPoolExecutor(max_workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def assertSameGeometry(self, result, expected):
+        self.assertTrue(result.is_valid)
+        self.assertLess(result.symmetric_difference(expected).area, 1e-9)
+        self.assertEqual(len(camlib.autolist(result)), len(camlib.autolist(expected)))
+
+    def test_matches_plain_buffer(self):
+        expected = self.solid.buffer(0.2)
+        result = camlib.buffer_tiled(self.solid, 0.2, processes=4, min_items=1,
+                                     executor=self.executor)
+        self.assertSameGeometry(result, expected)
+
+    def test_overlapping_list(self):
+        # A list is buffered as the union of its buffered parts.
+        expected = unary_union([part.buffer(0.15) for part in self.parts])
+        result = camlib.buffer_tiled(self.parts, 0.15, processes=3, min_items=1,
+                                     executor=self.executor)
+        self.assertSameGeometry(result, expected)
+
+    def test_tile_counts(self):
+        expected = self.solid.buffer(0.1)
+        for tiles in [1, 2, 7, 30]:
+            result = camlib.buffer_tiled(self.solid, 0.1, processes=2, min_items=1,
+                                         tiles_per_process=tiles,
+                                         executor=self.executor)
+            self.assertSameGeometry(result, expected)
+
+    def test_negative_offset_fallback(self):
+        expected = self.solid.buffer(-0.05)
+        result = camlib.buffer_tiled(self.solid, -0.05, processes=4, min_items=1,
+                                     executor=self.executor)
+        self.assertTrue(result.equals(expected))
+
+    def test_few_items_fallback(self):
+        poly = Polygon([(0, 0), (1, 0), (1, 1), (0, 1)])
+        result = camlib.buffer_tiled(poly, 0.5, processes=4, min_items=10)
+        self.assertTrue(result.equals(poly.buffer(0.5)))
+
+    def test_process_pool(self):
+        expected = self.solid.buffer(0.2)
+        FlatCAMParallel.defaults["worker_processes"] = 2
+        try:
+            result = camlib.buffer_tiled(self.solid, 0.2, processes=0, min_items=1)
+        finally:
+            FlatCAMParallel.shutdown()
+            FlatCAMParallel.defaults["worker_processes"] = 0
+        self.assertSameGeometry(result, expected)
+
+    def test_pool_disabled_fallback(self):
+        # No pool to buffer the tiles in.
+        for processes in [0, 4]:
+            result = camlib.buffer_tiled(self.solid, 0.2, processes=processes, min_items=1)
+            self.assertTrue(result.equals_exact(self.solid.buffer(0.2), 0))
+
+    def test_cancel(self):
+        token = CancellationToken()
+        token.cancel()
+        previous = set_current_token(token)
+        try:
+            with self.assertRaises(TaskCancelled):
+                camlib.buffer_tiled(self.solid, 0.2, processes=4, min_items=1,
+                                    executor=self.executor)
+        finally:
+            set_current_token(previous)
+
+    def test_isolation_geometry(self):
+        geo = camlib.Geometry()
+        geo.solid_geometry = self.solid
+        result = geo.isolation_geometry(0.2)
+        self.assertTrue(isinstance(result, (Polygon, MultiPolygon)))
+        self.assertLess(result.symmetric_difference(self.solid.buffer(0.2)).area, 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()